@@ -3,7 +3,8 @@
 
 Eesmärk
 -------
-- Loeb täis-CSV feedi ja ehitab kategooriapuu (ID + nimi + parent + path).
+- Loeb feedi vahemälust (vt feed_store.py) ainult unikaalsed kategooriateed ja ehitab
+  kategooriapuu (ID + nimi + parent + path).
 - Uuendab category_translation.json ja category_runlist.json faile.
 - Salvestab andmepuu faili data/category_catalog.json, et hiljem saaks
   olemasolevate toodete kategooriaid ümber map'ida (vana -> uus).
@@ -13,19 +14,23 @@ Reeglid
 - category_translation.json võtmed on kujul "All > ... > ...".
 - Olemasolevad tõlked jäetakse puutumata; lisatakse ainult uued teed.
 - category_runlist.json ei muudeta (ainult luuakse, kui puudub).
+- Kataloog ja tõlkefail kirjutatakse ainult siis, kui sisu muutus (logitakse
+  uued/eemaldatud/muutunud sõlmed).
 """
 
 from __future__ import annotations
 
 import argparse
-import csv
 import json
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Set
+
+from feed_reader import resolve_main_feed
+from feed_store import open_feed_store
+from json_codec import write_json
 
 ROOT = Path(__file__).resolve().parent
-FEED_PATH = ROOT / "data" / "feeds" / "vidaXL_ee_dropshipping" / "vidaXL_ee_dropshipping.csv"
 TRANSLATION_PATH = ROOT / "category_translation.json"
 RUNLIST_PATH = ROOT / "category_runlist.json"
 CATALOG_PATH = ROOT / "data" / "category_catalog.json"
@@ -80,8 +85,7 @@ def load_existing_translations() -> Dict[str, str]:
 def write_translations(translations: Dict[str, str]) -> None:
     ensure_parent(TRANSLATION_PATH)
     ordered = dict(sorted(translations.items(), key=lambda kv: kv[0].lower()))
-    with TRANSLATION_PATH.open("w", encoding="utf-8") as fh:
-        json.dump(ordered, fh, ensure_ascii=False, indent=2)
+    write_json(TRANSLATION_PATH, ordered, pretty=True)
 
 
 def ensure_runlist() -> None:
@@ -97,53 +101,84 @@ def _split_path(raw: str) -> List[str]:
     return parts
 
 
-def collect_categories_from_feed(feed_path: Path) -> tuple[Dict[str, Dict[str, Any]], List[str]]:
-    if not feed_path.exists():
-        raise FileNotFoundError(f"Feed not found: {feed_path}")
+def collect_categories_from_feed(feed_path: Optional[Path] = None) -> tuple[Dict[str, Dict[str, Any]], List[str]]:
+    """Kategooriasõlmed ja nimeteed feedi unikaalsetest kategooriatest.
 
+    Feedi vahemälust loetakse ainult erinevad (Category, Category_id_path)
+    paarid esmaesinemise järjekorras, nii et tulemus on sama mis ridade kaupa
+    lugedes, kuid töödeldakse tuhandeid kirjeid, mitte iga feedi rida.
+    """
     nodes: Dict[str, Dict[str, Any]] = {}
-    name_paths: List[str] = []
-
-    with feed_path.open("r", encoding="utf-8", newline="") as fh:
-        reader = csv.DictReader(fh)
-        for row in reader:
-            name_path_raw = str(row.get("Category") or "").strip()
-            if not name_path_raw:
-                continue
-            name_parts = _split_path(name_path_raw)
-            if not name_parts:
-                continue
+    name_paths: Set[str] = set()
+
+    with open_feed_store(feed_path) as store:
+        pairs = list(store.iter_distinct(("Category", "Category_id_path")))
+    seen_names: Set[str] = set()
+    for row in pairs:
+        name_path_raw = str(row.get("Category") or "").strip()
+        if not name_path_raw:
+            continue
+        name_parts = _split_path(name_path_raw)
+        if not name_parts:
+            continue
+        if name_path_raw not in seen_names:
+            seen_names.add(name_path_raw)
             for idx in range(1, len(name_parts) + 1):
-                name_path = " > ".join(name_parts[:idx])
-                name_paths.append(name_path)
+                name_paths.add(" > ".join(name_parts[:idx]))
+
+        id_path_raw = str(row.get("Category_id_path") or "").strip()
+        id_parts = _split_path(id_path_raw) if id_path_raw else []
+        if id_parts and len(id_parts) == len(name_parts):
+            for idx, cid in enumerate(id_parts):
+                if not cid:
+                    continue
+                parent_id = id_parts[idx - 1] if idx > 0 else ""
+                node = nodes.setdefault(cid, {"id": cid, "name": name_parts[idx], "parent_id": parent_id})
+                if not node.get("name"):
+                    node["name"] = name_parts[idx]
+                if parent_id and not node.get("parent_id"):
+                    node["parent_id"] = parent_id
+
+    return nodes, sorted(name_paths)
+
+
+def load_existing_catalog() -> List[Dict[str, Any]]:
+    if not CATALOG_PATH.exists():
+        return []
+    try:
+        with CATALOG_PATH.open("r", encoding="utf-8") as fh:
+            data = json.load(fh)
+            if isinstance(data, list):
+                return [item for item in data if isinstance(item, dict)]
+    except Exception as exc:  # pragma: no cover - ainult logimiseks
+        log(f"⚠️  Ei suutnud lugeda category_catalog.json: {exc}")
+    return []
 
-            id_path_raw = str(row.get("Category_id_path") or "").strip()
-            id_parts = _split_path(id_path_raw) if id_path_raw else []
-            if id_parts and len(id_parts) == len(name_parts):
-                for idx, cid in enumerate(id_parts):
-                    if not cid:
-                        continue
-                    parent_id = id_parts[idx - 1] if idx > 0 else ""
-                    node = nodes.setdefault(cid, {"id": cid, "name": name_parts[idx], "parent_id": parent_id})
-                    if not node.get("name"):
-                        node["name"] = name_parts[idx]
-                    if parent_id and not node.get("parent_id"):
-                        node["parent_id"] = parent_id
 
-    return nodes, sorted(set(name_paths))
+def diff_catalog(old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> tuple[List[str], List[str], List[str]]:
+    """Lisandunud, eemaldatud ja muutunud (nimi/parent/path) sõlmede ID-d."""
+    old_by_id = {str(item.get("id")): item for item in old}
+    new_by_id = {str(item.get("id")): item for item in new}
+    added = [cid for cid in new_by_id if cid not in old_by_id]
+    removed = [cid for cid in old_by_id if cid not in new_by_id]
+    changed = [cid for cid, item in new_by_id.items() if cid in old_by_id and old_by_id[cid] != item]
+    return added, removed, changed
 
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Ehita VidaXL feedist kategooriapuu ja uuenda tõlke/runlist faile.")
-    parser.add_argument("--feed-path", default=str(FEED_PATH), help="CSV feedi failirada")
+    parser.add_argument(
+        "--feed-path",
+        default="",
+        help="Feedi failirada (CSV või CSV ZIP); vaikimisi data/feeds main feed",
+    )
     return parser.parse_args()
 
 
 def main() -> int:
     args = parse_args()
-    feed_path = Path(args.feed_path).expanduser()
-
     try:
+        feed_path = resolve_main_feed(Path(args.feed_path).expanduser() if args.feed_path else None)
         nodes, name_paths = collect_categories_from_feed(feed_path)
     except Exception as exc:
         log(f"❌ Feedi lugemine ebaõnnestus: {exc}")
@@ -165,11 +200,18 @@ def main() -> int:
             }
         )
 
-    ensure_parent(CATALOG_PATH)
     catalog_sorted = sorted(catalog, key=lambda item: item.get("path") or "")
-    with CATALOG_PATH.open("w", encoding="utf-8") as fh:
-        json.dump(catalog_sorted, fh, ensure_ascii=False, indent=2)
-    log(f"✔ Kirjutatud category_catalog.json: {CATALOG_PATH}")
+    existing_catalog = load_existing_catalog()
+    if catalog_sorted != existing_catalog or not CATALOG_PATH.exists():
+        added, removed, changed = diff_catalog(existing_catalog, catalog_sorted)
+        ensure_parent(CATALOG_PATH)
+        write_json(CATALOG_PATH, catalog_sorted, pretty=True)
+        log(
+            f"✔ Kirjutatud category_catalog.json: {CATALOG_PATH} "
+            f"(sõlmi {len(catalog_sorted)}; uusi {len(added)}, eemaldatud {len(removed)}, muutunud {len(changed)})"
+        )
+    else:
+        log(f"✔ category_catalog.json oli juba ajakohane ({len(catalog_sorted)} sõlme)")
 
     existing = load_existing_translations()
     new_translations: Dict[str, str] = {}
@@ -177,8 +219,10 @@ def main() -> int:
         new_translations[path] = existing.get(path, "")
 
     if new_translations != existing or not TRANSLATION_PATH.exists():
+        added_paths = sum(1 for path in new_translations if path not in existing)
+        removed_paths = sum(1 for path in existing if path not in new_translations)
         write_translations(new_translations)
-        log(f"✔ Uuendatud category_translation.json: {TRANSLATION_PATH}")
+        log(f"✔ Uuendatud category_translation.json: {TRANSLATION_PATH} (uusi teid {added_paths}, eemaldatud {removed_paths})")
     else:
         log("✔ category_translation.json oli juba ajakohane")
 
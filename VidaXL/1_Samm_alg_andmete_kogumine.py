@@ -8,8 +8,14 @@ Eesmärk
 
 Reeglid
 -------
-- Main feed salvestatakse ZIP-ina ja lahti pakituna.
+- Main feed salvestatakse ZIP-ina; järgmised sammud loevad seda otse ZIP-ist
+  (vt ``feed_reader.py``). Lahtipakitud CSV on valikuline (``--extract``).
 - Offer feed salvestatakse CSV-na.
+- Feedid laetakse tingimuslikult (ETag/Last-Modified, vt ``feed_sync.py``);
+  muutumata feedi ei laeta ega pakita uuesti lahti ning JSON kokkuvõttes
+  on selle olek ``unchanged``.
+- Muutunud feedi kohta arvutatakse per-SKU delta (``feed_delta.py``), mille
+  kokkuvõte lisatakse JSON väljundisse.
 """
 
 from __future__ import annotations
@@ -18,14 +24,16 @@ import argparse
 import json
 import time
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict
 
-import requests
 from zipfile import ZipFile
 
+from feed_delta import update_feed_delta
+from feed_store import OFFER_FEED_COLUMNS
+from feed_sync import FEEDS_DIR, STATUS_UNCHANGED, download_feed
+
 
 ROOT = Path(__file__).resolve().parent
-FEEDS_DIR = ROOT / "data" / "feeds"
 
 MAIN_FEED_ZIP_URL = (
     "https://feed.vidaxl.io/api/v1/feeds/download/"
@@ -41,30 +49,27 @@ MAIN_EXTRACT_DIR = "vidaXL_ee_dropshipping"
 OFFER_NAME = "vidaXL_ee_dropshipping_offer.csv"
 
 
-def _download(url: str, target: Path) -> None:
-    target.parent.mkdir(parents=True, exist_ok=True)
-    with requests.get(url, stream=True, timeout=60) as resp:
-        resp.raise_for_status()
-        with target.open("wb") as fh:
-            for chunk in resp.iter_content(chunk_size=1024 * 1024):
-                if chunk:
-                    fh.write(chunk)
+def _download(url: str, target: Path, force: bool = False) -> Dict[str, Any]:
+    return download_feed(url, target, force=force)
 
 
-def _download_main_feed(url: str) -> Path:
+def _download_main_feed(url: str, force: bool = False, extract: bool = False) -> Dict[str, Any]:
     zip_path = FEEDS_DIR / MAIN_ZIP_NAME
-    _download(url, zip_path)
+    result = _download(url, zip_path, force=force)
     extract_dir = FEEDS_DIR / MAIN_EXTRACT_DIR
+    if not extract:
+        return result
+    if result["status"] == STATUS_UNCHANGED and extract_dir.exists():
+        return result
     extract_dir.mkdir(parents=True, exist_ok=True)
     with ZipFile(zip_path, "r") as zf:
         zf.extractall(extract_dir)
-    return zip_path
+    return result
 
 
-def _download_offer_feed(url: str) -> Path:
+def _download_offer_feed(url: str, force: bool = False) -> Dict[str, Any]:
     target = FEEDS_DIR / OFFER_NAME
-    _download(url, target)
-    return target
+    return _download(url, target, force=force)
 
 
 def parse_args() -> argparse.Namespace:
@@ -73,23 +78,44 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--offer-url", default=OFFER_FEED_URL, help="Offer feed CSV URL")
     parser.add_argument("--skip-main", action="store_true", help="Ära lae main feedi")
     parser.add_argument("--skip-offer", action="store_true", help="Ära lae offer feedi")
+    parser.add_argument(
+        "--extract",
+        action="store_true",
+        help="Paki main feed lisaks lahti (valikuline vahemälu; sammud loevad vaikimisi otse ZIP-ist)",
+    )
+    parser.add_argument("--force", action="store_true", help="Ignoreeri manifesti ja lae feedid alati uuesti")
     return parser.parse_args()
 
 
 def main() -> int:
     args = parse_args()
     started = time.time()
-    results = {}
+    results: Dict[str, Any] = {}
+    statuses = []
 
     if not args.skip_main:
-        main_zip = _download_main_feed(args.main_url)
-        results["main_zip"] = str(main_zip)
-        results["main_extract_dir"] = str(FEEDS_DIR / MAIN_EXTRACT_DIR)
+        main_result = _download_main_feed(args.main_url, force=args.force, extract=args.extract)
+        results["main_zip"] = main_result["path"]
+        if args.extract:
+            results["main_extract_dir"] = str(FEEDS_DIR / MAIN_EXTRACT_DIR)
+        results["main_status"] = main_result["status"]
+        results["main_sha256"] = main_result["sha256"]
+        if main_result["status"] != STATUS_UNCHANGED or args.force:
+            main_delta = update_feed_delta(Path(main_result["path"]))
+            results["main_delta"] = {**main_delta.counts(), "initial": main_delta.initial}
+        statuses.append(main_result["status"])
 
     if not args.skip_offer:
-        offer_path = _download_offer_feed(args.offer_url)
-        results["offer_csv"] = str(offer_path)
-
+        offer_result = _download_offer_feed(args.offer_url, force=args.force)
+        results["offer_csv"] = offer_result["path"]
+        results["offer_status"] = offer_result["status"]
+        results["offer_sha256"] = offer_result["sha256"]
+        if offer_result["status"] != STATUS_UNCHANGED or args.force:
+            offer_delta = update_feed_delta(Path(offer_result["path"]), OFFER_FEED_COLUMNS)
+            results["offer_delta"] = {**offer_delta.counts(), "initial": offer_delta.initial}
+        statuses.append(offer_result["status"])
+
+    results["unchanged"] = bool(statuses) and all(st == STATUS_UNCHANGED for st in statuses)
     results["feeds_dir"] = str(FEEDS_DIR)
     results["elapsed_seconds"] = round(time.time() - started, 2)
     print(json.dumps(results, ensure_ascii=False, indent=2))
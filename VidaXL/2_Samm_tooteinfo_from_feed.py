@@ -1,36 +1,54 @@
 #!/usr/bin/env python3
 """2. samm (DropXL feed): mapib VidaXL CSV feedi Step2 skeemile.
 
-- Loeb VidaXL main CSV feedi.
+- Loeb VidaXL main CSV feedi (feedi vahemälust, vt feed_store.py).
 - Filtreerib out-of-stock tooted.
-- Piirab esmase jooksu 100 tootega.
-- Kraabib variatsioonide SKU-d Product-Variation endpointi abil.
+- Piirab jooksu MAX_PRODUCTS tootega (kihistatud valim üle kolme feedi segmendi;
+  ``--seed`` teeb valiku korratavaks).
+- Kraabib variatsioonide SKU-d Product-Variation endpointi abil (taustal,
+  hostipõhise kiirusepiiranguga, vt variant_scraper.py).
+- Kirjutab tooted jooksu ajal JSONL päevikusse (2_samm_tooteinfo.jsonl) ja
+  liidab selle lõpus list-formaadis väljundisse (vt artifact_io.py); juba
+  olemasolevad/tõlgitud SKU-d loetakse väljundite kõrvalindeksitest (*.idx.json).
+- Hoiab jooksu kontrollpunkti (2_samm_run.json: feedi räsi, seeme, valitud
+  read, positsioon); katkenud jooks jätkub samast kohast.
 """
 
 from __future__ import annotations
 
-import csv
-import html
+import argparse
 import json
 import random
-import re
-import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 from urllib.parse import urlparse
 
-import requests
-from category_change_runner import apply_maps_to_path, DEFAULT_MAPS
+from artifact_io import JsonlJournal, artifact_skus, compact_journal, write_json_atomic, write_list_artifact
+from attribute_extractor import AttributeExtractor, clean_vidaxl
+from category_change_runner import DEFAULT_MAPPER
+from category_resolver import CategoryResolver
+from feed_reader import resolve_main_feed
+from feed_store import open_feed_store
+from variant_cache import DEFAULT_TTL_HOURS, VariantCache
+from variant_scraper import DEFAULT_BURST, VariantScraper
 
 ROOT = Path(__file__).resolve().parent
-FEED_PATH = ROOT / "data" / "feeds" / "vidaXL_ee_dropshipping" / "vidaXL_ee_dropshipping.csv"
 OUTPUT_PATH = ROOT / "2_samm_tooteinfo.json"
+JOURNAL_PATH = ROOT / "2_samm_tooteinfo.jsonl"
+RUN_MANIFEST_PATH = ROOT / "2_samm_run.json"
+RUN_STATUS_RUNNING = "running"
+RUN_STATUS_DONE = "done"
 CATEGORY_TRANSLATION_PATH = ROOT / "category_translation.json"
 TRANSLATED_GROUPED_PATH = ROOT / "data" / "tõlgitud" / "products_translated_grouped.json"
 
 MAX_PRODUCTS = 4000
-REQUEST_DELAY_SECONDS = 1.05
-VIDAXL_PATTERN = re.compile(r"\bvida\s*x[l]?\b", re.IGNORECASE)
+VARIANT_REQUESTS_PER_SECOND = 1.0  # vidaxl.ee koormus nagu vana kraapijal; tõsta --rate/--burst abil
+VARIANT_WORKERS = 8
+MAP_WORKERS = 1
+MAP_CHUNK_SIZE = 200
 EXCLUDED_CATEGORY_ROOTS = [
     "Mööbel > Diivand",
     "Mööbel > Diivanid",
@@ -59,43 +77,14 @@ def _load_category_translations() -> Dict[str, str]:
     return out
 
 
-def _load_existing_output() -> List[Dict[str, Any]]:
-    if not OUTPUT_PATH.exists():
-        return []
-    try:
-        with OUTPUT_PATH.open("r", encoding="utf-8") as fh:
-            data = json.load(fh)
-    except Exception:
-        return []
-    if not isinstance(data, list):
-        return []
-    return [item for item in data if isinstance(item, dict)]
-
-
 CATEGORY_TRANSLATIONS = _load_category_translations()
+ATTRIBUTE_EXTRACTOR = AttributeExtractor()
+CATEGORY_RESOLVER = CategoryResolver(CATEGORY_TRANSLATIONS, DEFAULT_MAPPER, EXCLUDED_CATEGORY_ROOTS)
 
 
 def _load_translated_skus() -> set[str]:
-    if not TRANSLATED_GROUPED_PATH.exists():
-        return set()
-    try:
-        with TRANSLATED_GROUPED_PATH.open("r", encoding="utf-8") as fh:
-            data = json.load(fh)
-    except Exception:
-        return set()
-    if not isinstance(data, dict):
-        return set()
-    out: set[str] = set()
-    for items in data.values():
-        if not isinstance(items, list):
-            continue
-        for item in items:
-            if not isinstance(item, dict):
-                continue
-            sku = _as_str(item.get("sku") or "").strip()
-            if sku:
-                out.add(sku)
-    return out
+    # SKU-d loetakse grupeeritud faili kõrvalindeksist (artifact_io.py), mitte kogu failist.
+    return artifact_skus(TRANSLATED_GROUPED_PATH)
 
 
 def _as_str(val: Any) -> str:
@@ -106,12 +95,6 @@ def _as_str(val: Any) -> str:
     return str(val)
 
 
-def _clean_vidaxl(text: str) -> str:
-    cleaned = VIDAXL_PATTERN.sub("", text)
-    cleaned = re.sub(r"\s{2,}", " ", cleaned)
-    return cleaned.strip()
-
-
 def _to_int(val: Any) -> int:
     try:
         return int(float(str(val).strip()))
@@ -127,47 +110,28 @@ def _to_float(val: Any) -> Optional[float]:
 
 
 def _build_category(row: Dict[str, str]) -> Dict[str, Any]:
-    path_raw = _as_str(row.get("Category") or "").strip()
-    path = path_raw if path_raw else ""
-    translated = CATEGORY_TRANSLATIONS.get(path) or path
-    translated = apply_maps_to_path(translated, DEFAULT_MAPS)
-    leaf = ""
-    if translated:
-        parts = [p.strip() for p in translated.split(">") if p.strip()]
-        if parts:
-            leaf = parts[-1]
+    resolved = CATEGORY_RESOLVER.resolve(_as_str(row.get("Category") or ""))
+    leaf = resolved.leaf_name
     return {
         "category": {
             "source_id": _as_str(row.get("Category_id") or "").strip() or None,
-            "path": path,
-            "translated_path": translated,
+            "path": resolved.path,
+            "translated_path": resolved.translated_path,
             "leaf_name": leaf,
         },
         "categories": ([{"name": leaf}] if leaf else []),
     }
 
 
-def _is_path_under(path: str, root: str) -> bool:
-    if not path or not root:
-        return False
-    return path == root or path.startswith(f"{root} >")
-
-
 def _is_excluded_category(row: Dict[str, str]) -> bool:
-    path_raw = _as_str(row.get("Category") or "").strip()
-    translated = CATEGORY_TRANSLATIONS.get(path_raw) or path_raw
-    translated = apply_maps_to_path(translated, DEFAULT_MAPS)
-    for root in EXCLUDED_CATEGORY_ROOTS:
-        if _is_path_under(path_raw, root) or _is_path_under(translated, root):
-            return True
-    return False
+    return CATEGORY_RESOLVER.resolve(_as_str(row.get("Category") or "")).excluded
 
 
 def _build_images(row: Dict[str, str]) -> List[Dict[str, Any]]:
     fields = [f"Image {i}" for i in range(1, 13)] + ["image 13", "Image 13", "Image 14"]
     seen: set[str] = set()
     images: List[Dict[str, Any]] = []
-    alt = _clean_vidaxl(_as_str(row.get("Product_title") or row.get("Title") or "").strip())
+    alt = clean_vidaxl(_as_str(row.get("Product_title") or row.get("Title") or "").strip())
     for key in fields:
         val = _as_str(row.get(key) or "").strip()
         if not val or val in seen:
@@ -177,135 +141,13 @@ def _build_images(row: Dict[str, str]) -> List[Dict[str, Any]]:
     return images
 
 
-def _strip_html(text: str) -> str:
-    return re.sub(r"<[^>]+>", "", text).strip()
-
-
-def _add_attr(attr_map: Dict[str, List[str]], name: str, value: str) -> None:
-    raw_name = name.strip()
-    raw_value = value.strip()
-    name_key = raw_name.lower().replace(" ", "_")
-    name_map = {
-        "size": "Suurus",
-        "parcel_or_pallet": "Pakkimise tüüp",
-    }
-    if name_key == "parcel_or_pallet":
-        val_key = raw_value.lower()
-        if val_key == "parcel":
-            raw_value = "pakk"
-        elif val_key == "pallet":
-            raw_value = "alus"
-    name = _clean_vidaxl(name_map.get(name_key, raw_name))
-    value = _clean_vidaxl(raw_value)
-    if value.lower() == "yes":
-        value = "Jah"
-    elif value.lower() == "no":
-        value = "Ei"
-    if not name or not value:
-        return
-    bucket = attr_map.setdefault(name, [])
-    if value not in bucket:
-        bucket.append(value)
-
-
 def _parse_properties(row: Dict[str, str]) -> List[Dict[str, Any]]:
-    attr_map: Dict[str, List[str]] = {}
-    props = _as_str(row.get("Properties") or "").strip()
-    if props:
-        for item in re.findall(r"<li>(.*?)</li>", props, flags=re.I | re.S):
-            clean = _strip_html(item)
-            if not clean:
-                continue
-            if ":" in clean:
-                key, val = clean.split(":", 1)
-                _add_attr(attr_map, key, val)
-            else:
-                _add_attr(attr_map, clean, "Yes")
-
-    for field in [
-        "Color",
-        "Gender",
-        "Diameter",
-        "Size",
-        "Parcel_or_pallet",
-        "Number_of_packages",
-        "Product_volume",
-    ]:
-        value = _as_str(row.get(field) or "").strip()
-        if value:
-            _add_attr(attr_map, field, value)
-
-    attributes: List[Dict[str, Any]] = []
-    for name, values in attr_map.items():
-        if values:
-            attributes.append({"name": name, "values": values})
-    return attributes
-
-
-def _extract_swatch_urls(page_html: str) -> List[Dict[str, str]]:
-    results: List[Dict[str, str]] = []
-    for label, url in re.findall(r'aria-label="([^"]+)"[^>]*data-url="([^"]+)"', page_html):
-        label = html.unescape(_as_str(label).strip())
-        url = html.unescape(_as_str(url).strip())
-        if not url or not label:
-            continue
-        if "Product-Variation" not in url:
-            continue
-        if " " in label:
-            attr_name, attr_value = label.split(" ", 1)
-        else:
-            attr_name, attr_value = "Variant", label
-        results.append({"attr_name": attr_name.strip(), "attr_value": attr_value.strip(), "url": url})
-    return results
-
-
-def _fetch_variation_sku(url: str, cache: Dict[str, str]) -> Optional[str]:
-    if url in cache:
-        return cache[url]
-    try:
-        resp = requests.get(url, timeout=30)
-        resp.raise_for_status()
-        data = resp.json()
-    except Exception:
-        return None
-    sku = None
-    if isinstance(data, dict):
-        product = data.get("product")
-        if isinstance(product, dict):
-            sku = _as_str(product.get("SKU") or "").strip()
-    if sku:
-        cache[url] = sku
-    return sku
-
-
-def _build_variant_skus(link: str, cache: Dict[str, str]) -> Dict[str, Dict[str, List[str]]]:
-    if not link:
-        return {}
-    try:
-        resp = requests.get(link, timeout=30)
-        resp.raise_for_status()
-        html_text = resp.text
-    except Exception:
-        return {}
-
-    variant_skus: Dict[str, Dict[str, List[str]]] = {}
-    for item in _extract_swatch_urls(html_text):
-        sku = _fetch_variation_sku(item["url"], cache)
-        if not sku:
-            continue
-        attr_name = item["attr_name"]
-        attr_value = item["attr_value"]
-        bucket = variant_skus.setdefault(attr_name, {})
-        skus = bucket.setdefault(attr_value, [])
-        if sku not in skus:
-            skus.append(sku)
-        time.sleep(REQUEST_DELAY_SECONDS)
-    return variant_skus
+    return ATTRIBUTE_EXTRACTOR.extract(row)
 
 
-def _build_product(row: Dict[str, str], variant_cache: Dict[str, str]) -> Dict[str, Any]:
+def _build_product(row: Dict[str, str]) -> Dict[str, Any]:
     sku = _as_str(row.get("SKU") or "").strip()
-    name = _clean_vidaxl(_as_str(row.get("Product_title") or row.get("Title") or "").strip())
+    name = clean_vidaxl(_as_str(row.get("Product_title") or row.get("Title") or "").strip())
     link = _as_str(row.get("Link") or "").strip()
     stock = _to_int(row.get("Stock"))
     purchase_price = _to_float(row.get("B2B price"))
@@ -313,10 +155,9 @@ def _build_product(row: Dict[str, str], variant_cache: Dict[str, str]) -> Dict[s
     description = _as_str(row.get("HTML_description") or row.get("Description") or "").strip()
 
     cat_info = _build_category(row)
-    brand_name = _clean_vidaxl(_as_str(row.get("Brand") or "").strip())
+    brand_name = clean_vidaxl(_as_str(row.get("Brand") or "").strip())
     brands = [{"name": brand_name}] if brand_name else []
 
-    variant_skus = _build_variant_skus(link, variant_cache)
     product: Dict[str, Any] = {
         "sku": sku,
         "global_unique_id": _as_str(row.get("EAN") or "").strip(),
@@ -374,12 +215,17 @@ def _build_product(row: Dict[str, str], variant_cache: Dict[str, str]) -> Dict[s
             {"key": "_bp_gtin13", "value": _as_str(row.get("EAN") or "").strip()},
             {"key": "_bp_supplier", "value": "DropXL"},
         ],
-        "variant_skus": variant_skus,
+        "variant_skus": {},
     }
 
     if brand_name:
         product["meta_data"].append({"key": "_bp_brand", "value": brand_name})
 
+    return product
+
+
+def _apply_variant_skus(product: Dict[str, Any], variant_skus: Dict[str, Dict[str, List[str]]]) -> None:
+    product["variant_skus"] = variant_skus
     color_variants = variant_skus.get("Värv") if isinstance(variant_skus, dict) else None
     if isinstance(color_variants, dict) and color_variants:
         color_skus: List[str] = []
@@ -393,49 +239,67 @@ def _build_product(row: Dict[str, str], variant_cache: Dict[str, str]) -> Dict[s
         if color_skus:
             product["meta_data"].append({"key": "_bp_color_match_sku", "value": ",".join(color_skus)})
 
-    return product
 
+CATEGORY_COUNTERS = ("hits", "misses", "evictions")
 
-def main() -> int:
-    if not FEED_PATH.exists():
-        raise SystemExit(f"Feed not found: {FEED_PATH}")
 
-    print("NOTICE: Ajutiselt ei lisata tooteid kategooriatest:")
-    for root in EXCLUDED_CATEGORY_ROOTS:
-        print(f"  - {root}")
+def _build_products_chunk(
+    chunk: List[Tuple[int, Dict[str, str]]],
+) -> Tuple[List[Tuple[int, Dict[str, Any]]], Dict[str, int]]:
+    """Mapi tükk ja tagasta ka selle tüki ``CATEGORY_RESOLVER`` loendurite juurdekasv."""
+    before = CATEGORY_RESOLVER.stats()
+    products = [(row_idx, _build_product(row)) for row_idx, row in chunk]
+    after = CATEGORY_RESOLVER.stats()
+    return products, {key: after[key] - before[key] for key in CATEGORY_COUNTERS}
 
-    def _write_partial_output(items: List[Dict[str, Any]]) -> None:
-        with OUTPUT_PATH.open("w", encoding="utf-8") as fh:
-            json.dump(items, fh, ensure_ascii=False, indent=2)
-
-    products: List[Dict[str, Any]] = _load_existing_output()
-    variant_cache: Dict[str, str] = {}
-    translated_skus = _load_translated_skus()
-    existing_skus = { _as_str(p.get("sku") or "").strip() for p in products if isinstance(p, dict) }
-    existing_skus.discard("")
-    processed = 0
-    eligible_total = 0
-    with FEED_PATH.open("r", encoding="utf-8", newline="") as fh:
-        reader = csv.DictReader(fh)
-        for row in reader:
-            if _is_excluded_category(row):
-                continue
-            sku = _as_str(row.get("SKU") or "").strip()
-            if _to_int(row.get("Stock")) > 0 and sku not in translated_skus and sku not in existing_skus:
-                eligible_total += 1
-
-    target_total = min(MAX_PRODUCTS, eligible_total)
-    if target_total == 0:
-        with OUTPUT_PATH.open("w", encoding="utf-8") as fh:
-            json.dump(products, fh, ensure_ascii=False, indent=2)
-        summary = {
-            "input_file": str(FEED_PATH),
-            "output_file": str(OUTPUT_PATH),
-            "counts": {"products_out": len(products)},
-        }
-        print(json.dumps(summary, ensure_ascii=False, indent=2))
-        return 0
 
+def _map_rows(
+    rows: Iterable[Tuple[int, Dict[str, str]]],
+    workers: int = MAP_WORKERS,
+    chunk_size: int = MAP_CHUNK_SIZE,
+    worker_stats: Optional[Dict[str, int]] = None,
+) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Mapi read toodeteks sisendi järjekorras.
+
+    ``workers > 1`` korral jagatakse read ``chunk_size`` kaupa protsessikogumile;
+    korraga on töös kuni ``workers * 2`` tükki, tulemused tagastatakse järjekorras.
+    Kategooriad lahendatakse siis töötajaprotsessides: nende vahemälu loendurid
+    liidetakse ``worker_stats`` sõnastikku.
+    """
+    if workers <= 1:
+        for row_idx, row in rows:
+            yield row_idx, _build_product(row)
+        return
+
+    def _chunks() -> Iterator[List[Tuple[int, Dict[str, str]]]]:
+        chunk: List[Tuple[int, Dict[str, str]]] = []
+        for item in rows:
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _collect(future: Future) -> List[Tuple[int, Dict[str, Any]]]:
+        products, counters = future.result()
+        if worker_stats is not None:
+            for key, value in counters.items():
+                worker_stats[key] = worker_stats.get(key, 0) + value
+        return products
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight: Deque[Future] = deque()
+        for chunk in _chunks():
+            in_flight.append(pool.submit(_build_products_chunk, chunk))
+            if len(in_flight) >= workers * 2:
+                yield from _collect(in_flight.popleft())
+        while in_flight:
+            yield from _collect(in_flight.popleft())
+
+
+def _stratified_sample(population: int, target_total: int, rng: random.Random) -> List[int]:
+    """Vali ``target_total`` positsiooni vahemikust [0, population) kolmest võrdsest segmendist."""
     segments = min(3, target_total)
     base = target_total // segments
     remainder = target_total % segments
@@ -445,48 +309,240 @@ def main() -> int:
     for idx, seg_size in enumerate(segment_sizes):
         if seg_size <= 0:
             continue
-        seg_start = (eligible_total * idx) // segments
-        seg_end = (eligible_total * (idx + 1)) // segments - 1
+        seg_start = (population * idx) // segments
+        seg_end = (population * (idx + 1)) // segments - 1
         if seg_end < seg_start:
             seg_end = seg_start
-        seg_range = list(range(seg_start, seg_end + 1))
+        seg_range = range(seg_start, seg_end + 1)
         pick_count = min(seg_size, len(seg_range))
-        chosen_indices.update(random.sample(seg_range, pick_count))
+        chosen_indices.update(rng.sample(seg_range, pick_count))
 
     remaining = target_total - len(chosen_indices)
     if remaining > 0:
-        all_indices = [idx for idx in range(eligible_total) if idx not in chosen_indices]
-        chosen_indices.update(random.sample(all_indices, min(remaining, len(all_indices))))
+        all_indices = [idx for idx in range(population) if idx not in chosen_indices]
+        chosen_indices.update(rng.sample(all_indices, min(remaining, len(all_indices))))
+
+    return sorted(chosen_indices)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Mapi VidaXL feed Step 2 skeemile.")
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Valimi juhuslikkuse seeme (vaikimisi juhuslik; kasutatud seeme on kokkuvõttes)",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=VARIANT_REQUESTS_PER_SECOND,
+        help="Variatsioonide kraapimise päringuid sekundis hosti kohta",
+    )
+    parser.add_argument(
+        "--no-resume",
+        action="store_true",
+        help="Ära jätka pooleli jäänud jooksu (2_samm_run.json); alusta uue valimiga",
+    )
+    parser.add_argument("--burst", type=int, default=DEFAULT_BURST, help="Lubatud päringute purse hosti kohta")
+    parser.add_argument("--workers", type=int, default=VARIANT_WORKERS, help="Paralleelsete kraapijate arv")
+    parser.add_argument(
+        "--map-workers",
+        type=int,
+        default=MAP_WORKERS,
+        help="Feedi ridade mappimise protsesside arv (1 = põhiprotsessis)",
+    )
+    parser.add_argument("--map-chunk-size", type=int, default=MAP_CHUNK_SIZE, help="Ridu ühes mappimise tükis")
+    parser.add_argument(
+        "--variant-cache-ttl",
+        type=float,
+        default=DEFAULT_TTL_HOURS,
+        help="Variatsioonide vahemälu kirjete kehtivus tundides (0 = kraabi alati uuesti)",
+    )
+    return parser.parse_args()
+
+
+def _load_run_manifest() -> Optional[Dict[str, Any]]:
+    if not RUN_MANIFEST_PATH.exists():
+        return None
+    try:
+        with RUN_MANIFEST_PATH.open("r", encoding="utf-8") as fh:
+            data = json.load(fh)
+    except Exception:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("rows"), list):
+        return None
+    return data
+
+
+def _save_run_manifest(run: Dict[str, Any]) -> None:
+    run["updated_at"] = datetime.now().isoformat(timespec="seconds")
+    write_json_atomic(RUN_MANIFEST_PATH, run)
 
-    selected_indices = sorted(chosen_indices)
-    selected_set = set(selected_indices)
 
-    eligible_seen = 0
-    with FEED_PATH.open("r", encoding="utf-8", newline="") as fh:
-        reader = csv.DictReader(fh)
-        for row in reader:
-            processed += 1
+def _can_resume(run: Optional[Dict[str, Any]], feed_hash: str, seed: Optional[int]) -> bool:
+    """Kas pooleli jooksu saab jätkata; põhjus logitakse, kui mitte.
+
+    Erinev ``--seed`` katkestab töö (``SystemExit``): pooleli valimi kõrvale
+    jätmiseks tuleb anda ``--no-resume``.
+    """
+    if not run or run.get("status") != RUN_STATUS_RUNNING:
+        return False
+    if run.get("feed_hash") != feed_hash:
+        print(
+            "⚠️ Pooleli jooksu ei jätkata: feed_hash erineb "
+            f"({str(run.get('feed_hash') or '-')[:12]} -> {feed_hash[:12]}); "
+            f"positsioonil {run.get('position', 0)}/{len(run.get('rows') or [])} alustan uut valimit"
+        )
+        return False
+    if seed is not None and seed != run.get("seed"):
+        raise SystemExit(
+            f"❌ Pooleli jooks (positsioon {run.get('position', 0)}/{len(run.get('rows') or [])}) kasutab "
+            f"seed={run.get('seed')}, --seed={seed} erineb. Jätkamiseks jäta --seed ära (või anna sama), "
+            "uue valimi alustamiseks lisa --no-resume."
+        )
+    return True
+
+
+def main() -> int:
+    args = parse_args()
+    try:
+        feed_path = resolve_main_feed()
+        store = open_feed_store(feed_path)
+    except FileNotFoundError as exc:
+        raise SystemExit(str(exc))
+
+    print("NOTICE: Ajutiselt ei lisata tooteid kategooriatest:")
+    for root in EXCLUDED_CATEGORY_ROOTS:
+        print(f"  - {root}")
+
+    # Eelmise (katkenud) jooksu päevik liidetakse kõigepealt väljundisse.
+    products_out = compact_journal(JOURNAL_PATH, OUTPUT_PATH)
+    existing_skus = artifact_skus(OUTPUT_PATH)
+
+    run = _load_run_manifest()
+    if args.no_resume:
+        if run and run.get("status") == RUN_STATUS_RUNNING:
+            print(
+                f"⚠️ --no-resume: pooleli jooks (seed={run.get('seed')}, positsioon "
+                f"{run.get('position', 0)}/{len(run.get('rows') or [])}) jäetakse kõrvale"
+            )
+        run = None
+    resumed = _can_resume(run, store.feed_hash, args.seed)
+    if resumed and run is not None:
+        # Jätka salvestatud valimiga: feedi ei skannita uuesti, tehtud read jäetakse vahele.
+        seed = int(run.get("seed") or 0)
+        selected_rows = [int(idx) for idx in run["rows"]]
+        start_position = min(int(run.get("position") or 0), len(selected_rows))
+        eligible_total = int(run.get("eligible") or len(selected_rows))
+        print(f"↻ Jätkan pooleli jäänud jooksu: {start_position}/{len(selected_rows)} (seed={seed})")
+    else:
+        seed = args.seed if args.seed is not None else random.SystemRandom().randrange(2**32)
+        translated_skus = _load_translated_skus()
+
+        # Üks läbimine: kogu sobivate ridade indeksid (feedi järjekorras).
+        eligible_rows: List[int] = []
+        for row_idx, row in store.iter_indexed(("SKU", "Stock", "Category")):
             if _to_int(row.get("Stock")) <= 0:
                 continue
-            if _is_excluded_category(row):
-                continue
             sku = _as_str(row.get("SKU") or "").strip()
             if sku in translated_skus or sku in existing_skus:
                 continue
-            if eligible_seen in selected_set:
-                products.append(_build_product(row, variant_cache))
-                _write_partial_output(products)
-                print(f"✔ Töödeldud: {processed} rida | valimis: {len(products)}/{target_total}")
-                if len(products) >= target_total:
-                    break
-            eligible_seen += 1
-
-    _write_partial_output(products)
+            if _is_excluded_category(row):
+                continue
+            eligible_rows.append(row_idx)
+        eligible_total = len(eligible_rows)
+
+        target_total = min(MAX_PRODUCTS, eligible_total)
+        if target_total == 0:
+            if not OUTPUT_PATH.exists():
+                write_list_artifact(OUTPUT_PATH, [])
+            summary = {
+                "input_file": str(feed_path),
+                "output_file": str(OUTPUT_PATH),
+                "seed": seed,
+                "counts": {"products_out": products_out, "eligible": eligible_total},
+                "category_cache": CATEGORY_RESOLVER.stats(),
+            }
+            print(json.dumps(summary, ensure_ascii=False, indent=2))
+            return 0
+
+        selected_rows = [eligible_rows[pos] for pos in _stratified_sample(eligible_total, target_total, random.Random(seed))]
+        start_position = 0
+        run = {
+            "feed_hash": store.feed_hash,
+            "seed": seed,
+            "eligible": eligible_total,
+            "rows": selected_rows,
+            "position": 0,
+            "status": RUN_STATUS_RUNNING,
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        _save_run_manifest(run)
+
+    target_total = len(selected_rows)
+    positions = {row_idx: pos for pos, row_idx in enumerate(selected_rows)}
+
+    # Feedi ridade mapping käib põhiprotsessis (või --map-workers protsessikogumis),
+    # variatsioonide kraapimine taustalõimedes; tooted lisatakse väljundisse valiku järjekorras.
+    pending: Deque[Tuple[int, Dict[str, Any], Future]] = deque()
+    max_pending = max(1, args.workers) * 4
+
+    def _finish(row_idx: int, product: Dict[str, Any], future: Future) -> None:
+        try:
+            variant_skus = future.result()
+        except Exception:
+            variant_skus = {}
+        _apply_variant_skus(product, variant_skus)
+        # Kontrollpunkt salvestatakse päeviku fsync-i järel (on_sync), seega
+        # ``position`` ei jõua kunagi kettale kirjutatud toodetest ette.
+        run["position"] = positions[row_idx] + 1
+        journal.append(product)
+        print(f"✔ Töödeldud: {row_idx + 1} rida | valimis: {run['position']}/{target_total}")
+
+    def _pending_rows() -> Iterator[Tuple[int, Dict[str, str]]]:
+        for row_idx in selected_rows[start_position:]:
+            row = store.row(row_idx)
+            if row is None:
+                continue
+            # Katkestuse eel päevikusse jõudnud, kuid kontrollpunktist hilisemad tooted.
+            if _as_str(row.get("SKU") or "").strip() in existing_skus:
+                continue
+            yield row_idx, row
+
+    map_worker_stats: Dict[str, int] = {key: 0 for key in CATEGORY_COUNTERS}
+    cache = VariantCache(ttl_hours=args.variant_cache_ttl)
+    journal = JsonlJournal(JOURNAL_PATH, on_sync=lambda: _save_run_manifest(run))
+    with journal, VariantScraper(rate=args.rate, burst=args.burst, workers=args.workers, cache=cache) as scraper:
+        for row_idx, product in _map_rows(
+            _pending_rows(), args.map_workers, max(1, args.map_chunk_size), map_worker_stats
+        ):
+            future = scraper.submit(product["source"]["source_product_url"], product["sku"])
+            pending.append((row_idx, product, future))
+            while pending and (pending[0][2].done() or len(pending) > max_pending):
+                _finish(*pending.popleft())
+        while pending:
+            _finish(*pending.popleft())
+        scraper_stats = scraper.stats()
+
+    products_out = compact_journal(JOURNAL_PATH, OUTPUT_PATH)
+    run["position"] = target_total
+    run["status"] = RUN_STATUS_DONE
+    _save_run_manifest(run)
+
+    category_stats: Dict[str, Any] = CATEGORY_RESOLVER.stats()
+    if args.map_workers > 1:
+        # Põhiprotsess lahendab ainult valiku filtri kategooriad; mapping käis töötajates.
+        category_stats = {"main": category_stats, "map_workers": map_worker_stats}
 
     summary = {
-        "input_file": str(FEED_PATH),
+        "input_file": str(feed_path),
         "output_file": str(OUTPUT_PATH),
-        "counts": {"products_out": len(products)},
+        "seed": seed,
+        "resumed_from": start_position if resumed else None,
+        "counts": {"products_out": products_out, "eligible": eligible_total},
+        "category_cache": category_stats,
+        "variant_scraper": scraper_stats,
     }
     print(json.dumps(summary, ensure_ascii=False, indent=2))
     return 0
@@ -1,18 +1,49 @@
 import os
+import copy
 import json
 import pandas as pd
 import csv
-from openai import OpenAI
+from openai import APIConnectionError, APIStatusError, APITimeoutError, OpenAI, RateLimitError
 import re
 import html
 import requests
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 import argparse
 import time
 from datetime import datetime
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
+from adaptive_concurrency import AimdController, ThroughputMeter, run_adaptive
+from batch_jobs import (
+    BatchDeferred,
+    BatchJob,
+    custom_id as batch_custom_id,
+    download_results as batch_download_results,
+    load_results as batch_load_results,
+    new_job as new_batch_job,
+    pending_job as pending_batch_job,
+    poll as batch_poll,
+    request_body as batch_request_body,
+    submit as batch_submit,
+    write_requests as batch_write_requests,
+)
+from artifact_io import JsonlJournal, compact_grouped_journal, iter_products, load_sku_index, read_artifact_item
+from json_codec import dumps as json_dumps, write_json
+from near_duplicates import (
+    MinHasher,
+    attribute_differences,
+    cluster_signatures,
+    image_sources,
+    plain_text,
+    product_text,
+    shingles,
+    size_histogram,
+    substitute_variant,
+)
+from prompt_cache import PrefixGuard, PromptCacheStats, cached_input_tokens
+from response_cache import ResponseCache, StoredResponse, cache_key as response_cache_key
 
 # Load API key from .env (no hardcoded keys)
 try:
@@ -31,6 +62,9 @@ STEP2_INPUT = BASE / "2_samm_tooteinfo.json"
 OUT_DIR = BASE / "data" / "tõlgitud"
 OUT_DIR.mkdir(parents=True, exist_ok=True)
 OUT_FILE = OUT_DIR / "products_translated_grouped.json"
+# Jooksu ajal lisatakse tõlked päevikusse; OUT_FILE-i liidetakse need jooksu lõpus
+# (ja katkenud jooksu järel järgmise käivituse alguses), vt artifact_io.py.
+OUT_JOURNAL = OUT_DIR / "products_translated_grouped.jsonl"
 RUNLIST_FILE = BASE / "category_runlist.json"
 LOG_DIR = BASE / "data" / "logs"
 LOG_DIR.mkdir(parents=True, exist_ok=True)
@@ -39,11 +73,34 @@ LOG_FILE = LOG_DIR / f"run_{RUN_TS}.log"
 EAN_CONFLICT_FILE = LOG_DIR / f"ean_conflicts_{RUN_TS}.csv"
 EAN_LOG_LOCK = threading.Lock()
 DEBUG_DIR = BASE / "data" / "debug_traces"
+BATCH_DIR = BASE / "data" / "batch"
+RESPONSE_CACHE_DIR = BASE / "data" / "response_cache"
+RESPONSE_CACHE_MAX_MB = 512  # Vastuste vahemälu ülempiir; üle selle kustutatakse vanimad (0 = ei salvesta)
 DEBUG_DIR.mkdir(parents=True, exist_ok=True)
 ATTR_CACHE_FILE = BASE / "data" / "attribute_translations.json"
 REQUEST_TIMEOUT_SECONDS = 5400.0
 OPENAI_SERVICE_TIER = "default"  # Kasuta "auto", "default", "flex" või "priority"
 WORKERS = 1  # Paralleelselt töödeldavate toodete arv; 1 = ilma paralleelita
+ASYNC_ENGINE = True  # asyncio + adaptiivne aken (adaptive_concurrency.py); False = WORKERS järgi
+ASYNC_INITIAL_WINDOW = 2  # Korraga töös olevaid tooteid alguses
+ASYNC_MAX_WINDOW = 16  # Akna ülempiir (429 / rate-limit päised vähendavad akent automaatselt)
+ASYNC_STATUS_SECONDS = 60.0  # Kui tihti logida akna suurust ja tooteid/min
+API_CALL_ATTEMPTS = 5  # retry_api_call katsed ühe kutse kohta (SDK sisemised kordused on välja lülitatud)
+BATCH_STEP_KEYS = {"step2+3_all"}  # Partiitöös (--batch) saadetavad sammud; ülejäänud kutsed on tavalised
+BATCH_MODE: Optional[str] = None  # None | "collect" (päringud tööfaili) | "merge" (vastused partiist)
+BATCH_REQUESTS: Dict[str, Dict[str, Any]] = {}
+BATCH_RESULTS: Dict[str, Any] = {}
+BATCH_ERRORS: Dict[str, str] = {}
+RESPONSE_CACHE_HITS: Dict[str, List[str]] = {}  # SKU -> vahemälust serveeritud sammud
+PROMPT_PREFIX_GUARD = PrefixGuard()  # Sammu prompti prefiks peab kõigil toodetel olema sama
+PROMPT_CACHE_STATS = PromptCacheStats()
+NEAR_DUP_ENABLED = True  # Lähiduplikaatide klastrid: täismahus genereeritakse ainult esindaja (near_duplicates.py)
+NEAR_DUP_THRESHOLD = 0.8  # MinHash-i hinnanguline Jaccardi sarnasus (nimi + kirjeldus)
+NEAR_DUP_ADAPT_MODEL = "gpt-5-mini"  # Odav mudel variandi kohandamiseks esindaja sisust
+NEAR_DUP_REP: Dict[str, str] = {}  # Klastri liikme SKU -> esindaja SKU
+NEAR_DUP_REPS: set[str] = set()
+NEAR_DUP_OUTPUTS: Dict[str, Dict[str, Any]] = {}  # Esindaja SKU -> STEP 2+3 väljund ja algandmed
+NEAR_DUP_STATS = {"substituted": 0, "adapted": 0, "full": 0}
 USE_STEP5_FINAL_REVIEW = False  # Lülita välja, kui lõppkontrolli pole vaja
 USE_STEP7_ATTR_TRANSLATE = False  # Lülita välja, kui atribuudid on juba piisavad
 USE_STEP8_ATTR_ENRICH = False  # Lülita välja, kui olemasolevad atribuudid piisavad
@@ -76,7 +133,8 @@ def load_attr_cache() -> Dict[str, Any]:
 
 def save_attr_cache(cache: Dict[str, Any]) -> None:
     try:
-        ATTR_CACHE_FILE.write_text(json.dumps(cache, ensure_ascii=False, indent=2), encoding="utf-8")
+        # Git-is hoitav fail: loetav kuju (json_codec.py).
+        write_json(ATTR_CACHE_FILE, cache, pretty=True)
     except Exception:
         pass
 
@@ -173,10 +231,17 @@ EXCLUDED_ATTR_KEYS = {
 def is_excluded_attr(name: str) -> bool:
     return (name or "").strip().lower() in EXCLUDED_ATTR_KEYS
 
+def is_retryable_api_error(exc: BaseException) -> bool:
+    """429, ajalõpp, ühenduse viga või 5xx; muud 4xx (nt pildi invalid_value) korrata pole mõtet."""
+    if isinstance(exc, (RateLimitError, APITimeoutError, APIConnectionError)):
+        return True
+    return isinstance(exc, APIStatusError) and exc.status_code >= 500
+
 def retry_api_call(fn, attempts: int = 3, backoff: float = 2.0):
     """
     Execute fn() with retries and exponential backoff.
     backoff seconds grow as backoff * (2**(attempt-1)) between attempts.
+    Only retryable errors (is_retryable_api_error) are retried; others are re-raised at once.
     """
     last_err = None
     for i in range(1, attempts + 1):
@@ -184,6 +249,9 @@ def retry_api_call(fn, attempts: int = 3, backoff: float = 2.0):
             return fn()
         except Exception as e:
             last_err = e
+            if not is_retryable_api_error(e):
+                log(f"API call failed (not retryable): {e}")
+                raise
             if i >= attempts:
                 log(f"API call failed after {attempts} attempts: {e}")
                 raise
@@ -210,6 +278,27 @@ def create_with_retry(_step_key: str = None, _sku: str = None, **kwargs):
             save_debug_json(_sku, f"{_step_key}_input", payload)
     except Exception:
         pass
+    PROMPT_PREFIX_GUARD.check(_step_key or "unknown_step", kwargs, _sku or "")
+    cache_key = response_cache_key(kwargs)
+    cached = RESPONSE_CACHE.get(cache_key)
+    if cached is not None:
+        with GROUP_LOCK:
+            RESPONSE_CACHE_HITS.setdefault(_sku or "", []).append(_step_key or "unknown_step")
+        log(f"Vahemälust: {_step_key or 'unknown_step'} ({_sku or ''})")
+        return cached
+    if BATCH_MODE and _step_key in BATCH_STEP_KEYS:
+        cid = batch_custom_id(_sku or "", _step_key)
+        if BATCH_MODE == "collect":
+            with GROUP_LOCK:
+                BATCH_REQUESTS[cid] = batch_request_body(kwargs)
+            raise BatchDeferred(cid)
+        if cid in BATCH_RESULTS:
+            log(f"Partii vastus: {_step_key} ({_sku or ''})")
+            PROMPT_CACHE_STATS.record(_step_key, BATCH_RESULTS[cid])
+            _store_response(cache_key, BATCH_RESULTS[cid], _step_key)
+            return BATCH_RESULTS[cid]
+        # Veateade edasi, et pildi-URL-i vea korral toimiks sama varuvariant (ilma pildita).
+        raise BatchDeferred(f"{cid}: {BATCH_ERRORS.get(cid) or 'vastus puudub'}")
     start_ts = time.time()
     log(f"API call start: {_step_key or 'unknown_step'} ({_sku or ''})")
     def _do():
@@ -217,9 +306,22 @@ def create_with_retry(_step_key: str = None, _sku: str = None, **kwargs):
         to = float(t) if t else REQUEST_TIMEOUT_SECONDS
         if OPENAI_SERVICE_TIER and not kwargs.get("service_tier"):
             kwargs["service_tier"] = OPENAI_SERVICE_TIER
-        if to is None:
-            return client.responses.create(**kwargs)
-        return client.with_options(timeout=to).responses.create(**kwargs)
+        # SDK enda kordused (max_retries) peidaksid 429-d ja nende ootamise latentsusse;
+        # kordab retry_api_call ning 429 ootamise teeb CONCURRENCY.wait_ready().
+        options: Dict[str, Any] = {"max_retries": 0}
+        if to is not None:
+            options["timeout"] = to
+        api = client.with_options(**options).responses
+        # Toorvastus annab rate-limit päised adaptiivse akna jaoks.
+        CONCURRENCY.wait_ready()
+        call_start = time.time()
+        try:
+            raw = api.with_raw_response.create(**kwargs)
+        except Exception as e:
+            CONCURRENCY.on_exception(e)
+            raise
+        CONCURRENCY.on_success(time.time() - call_start, raw.headers)
+        return raw.parse()
     # Heartbeat logger every 30s while waiting
     stop_evt = threading.Event()
     def _heartbeat():
@@ -235,7 +337,7 @@ def create_with_retry(_step_key: str = None, _sku: str = None, **kwargs):
     except Exception:
         hb = None
     try:
-        resp = retry_api_call(_do)
+        resp = retry_api_call(_do, attempts=API_CALL_ATTEMPTS)
     finally:
         try:
             stop_evt.set()
@@ -245,8 +347,16 @@ def create_with_retry(_step_key: str = None, _sku: str = None, **kwargs):
             pass
     dur = time.time() - start_ts
     log(f"API call done: {_step_key or 'unknown_step'} ({_sku or ''}) in {dur:.1f}s")
+    PROMPT_CACHE_STATS.record(_step_key or "unknown_step", resp)
+    _store_response(cache_key, resp, _step_key)
     return resp
 
+def _store_response(key: str, resp: Any, step_key: Optional[str]) -> None:
+    try:
+        RESPONSE_CACHE.put(key, resp, step_key or "")
+    except Exception as e:
+        log(f"⚠️ Vastuse vahemällu salvestamine ebaõnnestus: {e}")
+
 def normalize_prefix(raw: str) -> str:
     raw = (raw or "").strip()
     if not raw:
@@ -270,23 +380,6 @@ def load_run_prefixes() -> List[str]:
     except Exception:
         return []
 
-def load_existing_grouped() -> Dict[str, List[Dict[str, Any]]]:
-    if not OUT_FILE.exists():
-        return {}
-    try:
-        return json.loads(OUT_FILE.read_text(encoding="utf-8"))
-    except Exception:
-        return {}
-
-def index_existing_skus(grouped: Dict[str, List[Dict[str, Any]]]) -> Dict[str, str]:
-    idx: Dict[str, str] = {}
-    for grp, items in grouped.items():
-        for it in items or []:
-            sku = str(it.get("sku") or "").strip()
-            if sku:
-                idx[sku] = grp
-    return idx
-
 def extract_ean(meta: Optional[List[Dict[str, Any]]] = None) -> str:
     for entry in meta or []:
         key = str((entry or {}).get("key") or "").strip()
@@ -297,15 +390,6 @@ def extract_ean(meta: Optional[List[Dict[str, Any]]] = None) -> str:
             return value
     return ""
 
-def index_existing_eans(grouped: Dict[str, List[Dict[str, Any]]]) -> Dict[str, str]:
-    idx: Dict[str, str] = {}
-    for grp, items in grouped.items():
-        for it in items or []:
-            ean = extract_ean(it.get("meta_data"))
-            if ean and ean not in idx:
-                idx[ean] = str(it.get("sku") or "").strip()
-    return idx
-
 def top_level_category(product: Dict[str, Any]) -> str:
     cats = product.get("categories") or []
     if not cats:
@@ -472,21 +556,27 @@ def ensure_meta(meta: List[Dict[str, Any]], key: str, value: str) -> List[Dict[s
     return meta
 
 run_prefixes = load_run_prefixes()
-grouped = load_existing_grouped()
-existing_idx = index_existing_skus(grouped)
-existing_eans = index_existing_eans(grouped)
+# Eelmise (katkenud) jooksu päevik liidetakse kõigepealt väljundisse. Olemasolevad
+# SKU-d/EAN-id tulevad väljundi SKU indeksist; väljundit ennast mällu ei loeta.
+try:
+    _recovered = compact_grouped_journal(OUT_JOURNAL, OUT_FILE)
+    if _recovered:
+        log(f"↻ Liitsin eelmise jooksu päevikust {_recovered} tõlget väljundisse")
+except Exception as e:
+    log(f"⚠️ Päeviku liitmise viga: {e}")
+existing_index = load_sku_index(OUT_FILE)
+existing_idx = existing_index.groups()
+existing_eans = existing_index.eans()
 
 def find_existing_translated_product(sku: str) -> Optional[Dict[str, Any]]:
-    if not sku:
+    entry = existing_index.get(sku) if sku else None
+    if entry is None:
         return None
-    for items in grouped.values():
-        for it in items or []:
-            try:
-                if str(it.get("sku") or "").strip() == sku:
-                    return it
-            except Exception:
-                continue
-    return None
+    try:
+        item = read_artifact_item(OUT_FILE, entry.offset)
+    except Exception:
+        return None
+    return item if isinstance(item, dict) else None
 
 def log_ean_conflict_for_product(new_product: Dict[str, Any], ean_code: str) -> None:
     try:
@@ -537,6 +627,12 @@ def log_ean_conflict_for_product(new_product: Dict[str, Any], ean_code: str) ->
 parser = argparse.ArgumentParser(description="Tõlgi processed tooted ja salvesta koond JSONi")
 parser.add_argument("--only-sku", action="append", default=[], help="Töötle ainult neid SKUsid (võib korrata või anda komadega)")
 parser.add_argument("--limit", type=int, default=0, help="Töötle maksimaalselt N uut tõlget (0=piiranguta)")
+parser.add_argument("--max-window", type=int, default=0, help=f"Adaptiivse akna ülempiir (0={ASYNC_MAX_WINDOW}; 1=järjest)")
+parser.add_argument("--no-dedupe", action="store_true", help="Ära klasterda lähiduplikaate (iga toode genereeritakse täismahus)")
+parser.add_argument("--no-cache", action="store_true", help="Ära loe vastuseid vahemälust (uued vastused salvestatakse)")
+parser.add_argument("--batch", action="store_true", help="Partiitöö: STEP 2+3 päringud Batch API kaudu (odavam, valmib kuni 24h)")
+parser.add_argument("--batch-base-url", default=os.getenv("OPENAI_BATCH_BASE_URL", ""), help="Batch API aadress (nt kohalik tools/batch_stub_server.py)")
+parser.add_argument("--batch-poll", type=float, default=60.0, help="Partii oleku kontrolli intervall sekundites")
 args = parser.parse_args()
 
 only_skus: set[str] = set()
@@ -602,7 +698,7 @@ def save_debug_json(sku: str, step_key: str, data: Any) -> None:
         d = DEBUG_DIR / (sku or "unknown_sku")
         d.mkdir(parents=True, exist_ok=True)
         fp = d / f"{step_key}.json"
-        fp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        fp.write_text(json_dumps(data, pretty=True), encoding="utf-8")
         # Also mirror a trimmed version into the run log for quick inspection
         try:
             log_step_output(sku, step_key, data)
@@ -613,7 +709,7 @@ def save_debug_json(sku: str, step_key: str, data: Any) -> None:
 
 def log_step_output(sku: str, step_key: str, data: Any, max_chars: int = 0) -> None:
     try:
-        raw = json.dumps(data, ensure_ascii=False)
+        raw = json_dumps(data)
     except Exception:
         raw = str(data)
     total_len = len(raw or "")
@@ -628,51 +724,236 @@ def log_step_output(sku: str, step_key: str, data: Any, max_chars: int = 0) -> N
     except Exception:
         pass
 
-products: List[Dict[str, Any]] = []
-
-# Eelistatud sisend on Step 2 väljund (universaalne skeem)
-if STEP2_INPUT.exists():
-    try:
-        data = json.loads(STEP2_INPUT.read_text(encoding="utf-8"))
-        if isinstance(data, list):
-            products = [it for it in data if isinstance(it, dict)]
-    except Exception:
-        products = []
-
-# Tagavara: vana groupitud sisend või per-toode failid
-if not products:
-    if GROUPED_PROCESSED.exists():
+def _iter_processed_files() -> Iterator[Dict[str, Any]]:
+    # Fallback: loe per-toode failid, kui need on alles
+    for fp in sorted(PROCESSED_DIR.glob("*.json")):
         try:
-            gp = json.loads(GROUPED_PROCESSED.read_text(encoding="utf-8"))
-            if isinstance(gp, dict):
-                for grp, items in gp.items():
-                    for it in (items or []):
-                        if isinstance(it, dict):
-                            products.append(it)
+            item = json.loads(fp.read_text(encoding="utf-8"))
         except Exception:
-            products = []
-    if not products:
-        # Fallback: loe per-toode failid, kui need on alles
-        for fp in sorted(PROCESSED_DIR.glob("*.json")):
-            try:
-                products.append(json.loads(fp.read_text(encoding="utf-8")))
-            except Exception:
-                continue
+            continue
+        if isinstance(item, dict):
+            yield item
+
+def iter_input_products() -> Iterator[Dict[str, Any]]:
+    """Sisendtooted voona (korraga mälus üks toode).
 
-if not products:
+    Eelistatud sisend on Step 2 väljund (universaalne skeem); tagavaraks vana
+    groupitud sisend või per-toode failid. Kasutatakse esimest allikat, kust
+    tuleb vähemalt üks toode.
+    """
+    sources = (
+        lambda: iter_products(STEP2_INPUT),
+        lambda: iter_products(GROUPED_PROCESSED),
+        _iter_processed_files,
+    )
+    for source in sources:
+        found = False
+        try:
+            for item in source():
+                found = True
+                yield item
+        except Exception as e:
+            log(f"⚠️ Sisendi lugemise viga: {e}")
+        if found:
+            return
     log("⚠️ Pole sisendkoondfaili data/processed/products_grouped.json ega per-toote faile.")
 
-log(f"Leidsin {len(products)} sisendtoodet. Eesmärk: {args.limit or 'piiranguta'} uut tõlget.")
+# Sisendtoodete arv tuleb Step 2 väljundi SKU indeksist (faili parsimata).
+input_total = len(load_sku_index(STEP2_INPUT)) if STEP2_INPUT.exists() else 0
+log(f"Leidsin {input_total or 'teadmata arv'} sisendtoodet. Eesmärk: {args.limit or 'piiranguta'} uut tõlget.")
 added = 0
 skipped_existing = 0
+processed_total = 0
+translated_journal = JsonlJournal(OUT_JOURNAL, fsync_every=1)
+CONCURRENCY = AimdController(
+    initial=ASYNC_INITIAL_WINDOW,
+    maximum=args.max_window or ASYNC_MAX_WINDOW,
+)
+THROUGHPUT = ThroughputMeter()
+RESPONSE_CACHE = ResponseCache(RESPONSE_CACHE_DIR, max_bytes=RESPONSE_CACHE_MAX_MB * 1024 * 1024, read=not args.no_cache)
+
+# --------------------------------------------------------------
+# STEP 2+3 püsiv prompti prefiks: juhised (koos näidetega) ja vastuse skeem on
+# kõigil toodetel baiditi samad, tootepõhine info on ainult input-is, et
+# teenusepakkuja prefiksi vahemälu tabaks (vt prompt_cache.py).
+# --------------------------------------------------------------
+STEP23_INSTRUCTIONS = """\
+Eesmärk:
+- Loo e-poe jaoks tootenimi, toote lühikirjeldus, SEO Title, SEO Meta kirjeldus ja detailne HTML-formaadis tootekirjeldus.
+
+1. Tootenimi ja lühikirjeldus:
+Tootenime koostamise reeglid:
+- Alusta tootenimetusega, mis on koos 1–3 võtmeomadusega. Esimesed sõnad peavad koheselt iseloomustama, mis tootega on tegemist ja mis on toote eesmärk/kasutuskoht.
+- Lisa detailseid tooteomadusi, mis pole veel nimetatud ja mis on vajalikult konkreetse toote eristamiseks (mõõt/maht/võimsus, materjal/värv, ühilduvus).
+- Tooteomadusi lisades püüa mõelda toote iseloomule, et kasutada kõige relevantsemat infot, mis on antud toote puhul tähtis ja vajalik teada.
+- Kui sisendis on mõõdud olemas, siis lisa mõõtmed ainult siis, kui need on toote eristamiseks olulised (eriti mööbel ja suuremad tooted). Kui toode on komplekt ja koosneb mitmest erinevast tootest, näiteks diivani komplekt, siis ära kuhja mitut mõõtu järjestikku.
+- Kui toode on komplekt (nt "tk", "komplekt", "set"), siis märgi see selgelt tootenimes (nt "20 tk", "komplekt").
+- Kasuta sisendnime kogu olulist infot: mõõdud, kogus, mudel/tüüp, eripärad. Ära jäta originaalnimest mainitud omadusi nimest välja.
+- Vormistus: max 200 tähemärki. Ühikud: 60 cm, 20 L, 250 ml, 65 W.
+- Väldi turundusklišeesid, jutumärke, semikoolonit ja punkti lõpus.
+
+Oluline sisendi kvaliteet:
+- Sisend on osaliselt tõlgitud ja võib sisaldada valesid tõlkeid. Ära kanna vigu edasi; paranda need loogika ja tooteinfo põhjal.
+- Näide: "terrassi vaheseinad" / "privaatsusseinad" ei ole "varikatus". Kui selline või sarnane viga ilmneb, paranda see. Kontrolli tootepilti, et kindlaks teha kas on tõlkimisel tehtud vigu.
+- Tõlkereegel: Teak/teakwood = "tiigipuu"/"tiigipuust" (mitte "tiikpuu" ega "tikkpuu").
+- Väldi väljendit "täis[puidu liik]puidust" (nt "täismännipuidust"). Kasuta "täispuidust" või "[puidu liik]puidust"; sobib ka "naturaalsest [puidu liik]puidust".
+- Väljund peab olema korrektne eesti keel; ära kasuta valesti käänatud/mitte-eestikeelseid sõnu; paranda vigased liitsõnad.
+- Väldi topelt "-ga" vormi samas fraasis; nt mitte "voodiraam liistudega põhiga", vaid "voodiraam liistudest põhjaga" (või "liistpõhjaga").
+- Kui toode on "aiasöögikomplekt", kasuta väljundis vormi "aiamööbli komplekt".
+- Eemalda ingliskeelsed jäägid; väljundis ei tohi olla ingliskeelset teksti (v.a koodid või pärisnimed).
+
+Head näited:
+- "Esikupink jalatsiriiuliga, hall, metallraamiga, 100 x 38,5 x 49 cm"
+- "Hall polsterdatud kahekohaline voodi peatsi ja puidust jalgadega, 160 x 200 cm"
+- "7-osaline aiamööbli komplekt recliner-funktsiooniga, must polürotang, akaatsiapuidust lauaplaadiga, laud 190 x 90 cm"
+- "Ühe inimese kontinentaalvoodi musta kangaga, polsterdatud peatsiga, 100 x 200 cm"
+- "Virnastatavad tiigipuust aiatoolid patjadega, 8 tk, roostevaba terasraam, pruun, 60 x 56 x 85 cm"
+
+Halvad näited:
+- "Parim nõudepesumasin ülisoodne super kvaliteetne!!!"
+- "Hamstri puur" (liiga üldine; mõõdud/eripärad puudu)
+
+Toote lühikirjelduse koostamise reeglid:
+- Kirjuta tootele lühikirjeldus eesti keeles, tuues esile toote olulisemad kasutegurid ja omadused.
+- Pikkus: 2–3 lauset (kokku umbes 250–300 tähemärki).
+- Hoia toon informatiivne ja neutraalne – väldi sisutühje hüüdlauseid või ülepaisutatud kiidusõnu.
+- Lühikirjeldus peaks andma kliendile kiire ja täpse ülevaate tootest: kus, kellele ja miks toodet kasutatakse, mis muret see lahendab ja mis on kliendi peamine kasu.
+- Võid kasutada sobivuse, kasutamise ja hoolduse rõhuasetusi, et lühikirjeldus vastaks tüüpilistele kliendiküsimustele, kuid ära korda küsimusi sõna-sõnalt.
+- Väldi klišeesid nagu "nagu pildil näha", "pildilt on nähtav" jne.
+- Ära kasuta kirjelduses semikoolonit ";". Lõpeta mõte punktiga ja alusta uue lausega.
+- Oluline: kasuta ainult seda infot, mis tuleneb algsetest tooteandmetest. Ära lisa tootenimesse ega lühikirjeldusse omadusi, mida sisendis ei olnud.
+
+2. SEO:
+- Loo olemasoleva info põhjal ka "SEO Title" ja "SEO Meta kirjeldus".
+- SEO Title: maksimaalselt 60 tähemärki (eesmärgiga 50–60), peab loomulikult sisaldama peamist otsingufraasi (toote tüüp + 1–2 võtmeomadust), olema selge ja täpne.
+- SEO Meta kirjeldus: maksimaalselt 160 tähemärki, kutsuv ja informatiivne, mitte liialt reklaamilik, kirjeldab lühidalt toote põhikasu ja omadusi.
+- Ära kasuta SEO väljundites tarnija nime ega diskreetset infot.
+- Ära kasuta semikoolonit ";" üheski väljundis (ei pealkirjades ega kirjeldustes).
+
+3. HTML-tootekirjeldus:
+- Kirjuta detailne tootekirjeldus eestikeeles HTML-formaadis.
+- Hoia sõnavara ühtlane ja kasuta loomulikku eesti keelt; väldi otsetõlget. Kasuta mõõtühikuid standardkujul.
+- Hoia toon neutraalne ja informatiivne ning väldi liigset reklaamikeelt.
+- Väldi katteta lubadusi ja ülepaisutatud väiteid.
+- Väldi sõnu nagu "kaaslane", "partner", "abiline".
+- Kontrolli sõnade käänete ja vormide õigsust.
+- Kasuta kirjelduse olulisimates märksõnades ja infotükkides boldi (<strong>); maksimaalselt 3 korda ühes lõigus (<p>) ja 1 kord ühes listi elemendis (<li>).
+- Ära lisa HTML kommentaare ega kopeeri juhenditeksti või kommentaaride sisu väljundisse.
+- Kui mõne ploki jaoks puudub usaldusväärne info, jäta see plokk (sh pealkiri) täielikult ära.
+- Ära kasuta tootekirjelduses tarnijale omaseid andmeid (tarnija nimi, URL-id, sisemised koodid/kaubandusandmed), sest see on diskreetne info.
+- Järgi eelnevalt kirjeldatud plokkide struktuuri ja järjekorda. Kui mõni tingimuslik plokk jääb ära, ära jäta tühja pealkirja, jätka ülejäänud plokkidega.
+- Väljund peab olema üks koherentne HTML-plokk. Kui algses kirjelduses olid <img>-elemendid, peavad kõik need elemendid väljundis alles olema (sama src); kui algses kirjelduses pilte ei olnud, ära lisa uusi <img>-elemente.
+- Ära lisa eraldi "Kiirvastused", "Kes/Milleks/Kuidas" ega muid küsimuspealkirju; Q&A sektsiooni käsitleb eraldi töövoo samm.
+- Ära lisa kirjeldusse lõpus toote põhiandmete/spec-tabelit – atribuudid hallatakse eraldi sammudes.
+- Ära maini, et tekst on tõlgitud või loodud AI poolt; tekst peab kõlama nagu ühtne, toimetatud eestikeelne tootekirjeldus.
+
+- Struktuur ja kohustuslikkuse reeglid:
+    - Kohustuslikud plokid:
+        1. Ava plokk: <h2> pealkiri, mis seob toote kasuteguri lahendatava probleemiga (kasuta loomulikult olulisemaid otsingufraase) + järgnevalt <p>, mis kirjeldab väärtuspakkumist.
+        2. Peamised omadused: <h2>Peamised omadused</h2> ja sellele järgnev <ul> kuni 6–8 <li>-ga, mis seovad omaduse kliendi kasuga.
+    - Tingimuslikud plokid (kasuta ainult siis, kui sisendmaterjal seda võimaldab):
+        • Algse kirjelduse ja pildiplokkide info: sinu käsutuses võib olla originaalne HTML-tootekirjeldus, mis võib sisaldada <img>-plokke. Kui originaalis on <img>-elemendid, kirjuta kirjeldus ümber loomulikuks eestikeelseks tekstiks ja SÄILITA KÕIK need <img>-elemendid (sama src). IGA lõplikus HTML-is olev <img>-element PEAB omama eestikeelset alt-attribuuti, mis lühidalt ja loomulikult kirjeldab pilti selle ümbruses oleva teksti kontekstis (ka juhul, kui algne alt oli muus keeles või puudus). Sa võid muuta, millise tekstiploki juurde konkreetne pilt paigutub, kuid ära jäta ühtegi algset <img>-elementi välja ning ära lisa uusi pilte, mida originaalis ei olnud. Kui algses kirjelduses pilte ei ole, ära lisa ise uusi <img>-elemente.
+        • Paigaldus ja kasutus: h2 + lõik või loetelu praktiliste sammudega (kasuta algkirjelduse infot, kui see on olemas).
+        • Komplektis sisalduv: h2 + loetelu või lõik, mis kirjeldab komplekti (nt mis tarvikud ja komponendid on kaasas).
+        • CTA plokk: h2 + lõik, mis võtab peamised kasutegurid kokku ja suunab ostule ilma agressiivse müügikeeleta. CTA pealkiri peab olema tegevusele suunav (nt "Miks valida [TOOTE NIMI]?", "Kas otsid [lahendust X]?", "Millal valida [TOOTE NIMI]?"). Ära kasuta meta-pealkirju nagu "Kokkuvõte", "Järeldus", "Lõppsõna" või muid sarnaseid kokkuvõttepealkirju.
+
+Väljund: Tagasta JSON, kus "translated_title" on tootenimi, "short_description" on toote lühikirjeldus, "seo_title" on SEO pealkiri, "seo_meta" on SEO meta kirjeldus ning "translated_description_html" on detailne tootekirjeldus HTML-formaadis.
+"""
+
+STEP23_TEXT: Dict[str, Any] = {
+    "verbosity": "medium",
+    "format": {
+        "type": "json_schema",
+        "name": "translated_full_schema",
+        "schema": {
+            "type": "object",
+            "properties": {
+                "translated_title": {"type": "string"},
+                "short_description": {"type": "string"},
+                "seo_title": {"type": "string"},
+                "seo_meta": {"type": "string"},
+                "translated_description_html": {"type": "string"}
+            },
+            "required": ["translated_title", "short_description", "seo_title", "seo_meta", "translated_description_html"],
+            "additionalProperties": False
+        },
+        "strict": True
+    }
+}
+
+NEAR_DUP_ADAPT_INSTRUCTIONS = """\
+Sulle antakse ühe toote valmis eestikeelne e-poe sisu (ESINDAJA_VALMIS_SISU) ning selle toote ja tema variandi algsed nimed ja erinevad atribuudid.
 
-def _atomic_write_grouped():
+Kohanda sisu variandile:
+- Muuda ainult neid kohti, mis variandi tõttu erinevad (nt värv, mõõdud, kogus, materjal); ülejäänud tekst jäta sõna-sõnalt samaks.
+- Kasuta korrektset eesti keelt ja käändeid (ka värvinimetuste puhul).
+- Kui sisendis on VARIANDI_ORIGINAALNE_HTML_KIRJELDUS, on variandi kirjeldus esindaja omast erinev: võta kõik tehnilised andmed (mõõdud, kaal, koormus, kogused jms) sealt, mitte esindaja sisust.
+- Säilita HTML-struktuur. Kui VARIANDI_ORIGINAALNE_HTML_KIRJELDUS sisaldab <img>-elemente, võta nende src väärtused sealt (sama arv ja järjekord) ja kohanda alt-tekstid variandile; muidu jäta <img>-elemendid muutmata.
+- Järgi samu piiranguid: tootenimi kuni 200 tähemärki, SEO Title kuni 60 ja SEO Meta kuni 160 tähemärki, semikoolonit ära kasuta.
+
+Väljund: sama JSON-struktuur (translated_title, short_description, seo_title, seo_meta, translated_description_html).
+"""
+
+def variant_response(prod: Dict[str, Any], sku: str) -> Optional[Any]:
+    """Klastri liikme STEP 2+3 vastus esindaja sisust; None = genereeri täismahus."""
+    rep_sku = NEAR_DUP_REP.get(sku)
+    if not rep_sku:
+        return None
+    if BATCH_MODE == "collect":
+        # Liige kohandatakse liitmisfaasis, kui esindaja partii vastus on olemas.
+        raise BatchDeferred(f"{sku}: klastri liige (esindaja {rep_sku})")
+    with GROUP_LOCK:
+        rep = NEAR_DUP_OUTPUTS.get(rep_sku)
+    if not rep:
+        log(f"Esindaja {rep_sku} sisu puudub; genereerin täismahus (SKU {sku})")
+        with GROUP_LOCK:
+            NEAR_DUP_STATS["full"] += 1
+        return None
+
+    member_name = str(prod.get("name") or "")
+    member_description = str(prod.get("description") or "")
+    same_images = image_sources(member_description) == rep["images"]
+    same_description = plain_text(member_description) == plain_text(rep["description"])
+    if same_images:
+        substituted = substitute_variant(
+            rep["name"], member_name, rep["output"], rep["description"], member_description
+        )
+        if substituted is not None:
+            log(f"STEP 2+3: esindaja {rep_sku} sisu asendusega (SKU {sku})")
+            with GROUP_LOCK:
+                NEAR_DUP_STATS["substituted"] += 1
+            return StoredResponse({"id": None, "status": "completed", "output_text": json_dumps(substituted)})
+
+    log(f"STEP 2+3: kohanda esindaja {rep_sku} sisu (SKU {sku})")
+    attr_diff = attribute_differences(rep["attributes"], prod.get("attributes"))
+    if not attr_diff and member_name != rep["name"]:
+        log(f"⚠️ Esindaja {rep_sku} ja variandi atribuudid ei erine, kuigi nimed erinevad (SKU {sku})")
+    text = (
+        f"ESINDAJA_ALGNE_TOOTENIMI: {rep['name']}\n"
+        f"VARIANDI_ALGNE_TOOTENIMI: {member_name}\n"
+        f"ERINEVAD_ATRIBUUDID: {json.dumps(attr_diff, ensure_ascii=False)}\n"
+        f"ESINDAJA_VALMIS_SISU: {json.dumps(rep['output'], ensure_ascii=False)}"
+    )
+    if not (same_images and same_description):
+        text += f"\nVARIANDI_ORIGINAALNE_HTML_KIRJELDUS: {member_description}"
     try:
-        tmp = OUT_FILE.with_suffix('.tmp')
-        tmp.write_text(json.dumps(grouped, ensure_ascii=False, indent=2), encoding="utf-8")
-        tmp.replace(OUT_FILE)
+        resp = create_with_retry(
+            _step_key="step2+3_adapt", _sku=sku,
+            model=NEAR_DUP_ADAPT_MODEL,
+            reasoning={"effort": "low"},
+            previous_response_id=None,
+            instructions=NEAR_DUP_ADAPT_INSTRUCTIONS,
+            input=[{"role": "user", "content": [{"type": "input_text", "text": text}]}],
+            text=STEP23_TEXT,
+        )
     except Exception as e:
-        log(f"⚠️ Kirjutamise viga: {e}")
+        log(f"⚠️ Variandi kohandamine ebaõnnestus ({e}); genereerin täismahus (SKU {sku})")
+        with GROUP_LOCK:
+            NEAR_DUP_STATS["full"] += 1
+        return None
+    with GROUP_LOCK:
+        NEAR_DUP_STATS["adapted"] += 1
+    return resp
 
 def process_one_product(prod: Dict[str, Any], index: int) -> Dict[str, int]:
     local_added = 0
@@ -719,7 +1000,8 @@ def process_one_product(prod: Dict[str, Any], index: int) -> Dict[str, int]:
         data["total_tokens"] = uget("total_tokens")
         data["cache_creation_input_tokens"] = uget("cache_creation_input_tokens")
         data["cache_read_input_tokens"] = uget("cache_read_input_tokens")
-        data["cached_tokens"] = uget("cached_tokens")
+        # Responses API annab vahemälust loetud sisendtokenid input_tokens_details all.
+        data["cached_tokens"] = cached_input_tokens(usage)
         return data
 
     def add_usage(resp: Any) -> None:
@@ -822,261 +1104,61 @@ def process_one_product(prod: Dict[str, Any], index: int) -> Dict[str, int]:
     # --------------------------------------------------------------
     # STEP 2+3: genereeri kõik
     # --------------------------------------------------------------
-    log(f"STEP 2+3: genereeri kõik (SKU {sku})")
-    input_content = [
-        {
-            "type": "input_text",
-            "text": (
-                "Genereeri tõlgitud andmete põhjal tootenimi, toote lühikirjeldus, SEO Title ja SEO Meta kirjeldus ning HTML-formaadis tootekirjeldus.\n\n"
-                f"ALGNE_TOOTENIMI: {product_name}\n"
-                f"ATRIBUUDID: {json.dumps(attributes, ensure_ascii=False)}\n"
-                f"ORIGINAALNE_HTML_KIRJELDUS: {product_description}"
-            )
-        }
-    ]
-    if first_image_url:
-        input_content.append({"type": "input_image", "image_url": first_image_url})
-
-    try:
-        combined_response = create_with_retry(
-            _step_key="step2+3_all", _sku=sku,
-            model="gpt-5.1",
-            reasoning={"effort": "medium"},
-            service_tier="default",
-            previous_response_id=None,
-            instructions=
-            f"""
-            Eesmärk:
-            - Loo e-poe jaoks tootenimi, toote lühikirjeldus, SEO Title, SEO Meta kirjeldus ja detailne HTML-formaadis tootekirjeldus.
-
-            1. Tootenimi ja lühikirjeldus:
-            Tootenime koostamise reeglid:
-            - Alusta tootenimetusega, mis on koos 1–3 võtmeomadusega. Esimesed sõnad peavad koheselt iseloomustama, mis tootega on tegemist ja mis on toote eesmärk/kasutuskoht.
-            - Lisa detailseid tooteomadusi, mis pole veel nimetatud ja mis on vajalikult konkreetse toote eristamiseks (mõõt/maht/võimsus, materjal/värv, ühilduvus).
-            - Tooteomadusi lisades püüa mõelda toote iseloomule, et kasutada kõige relevantsemat infot, mis on antud toote puhul tähtis ja vajalik teada.
-            - Kui sisendis on mõõdud olemas, siis lisa mõõtmed ainult siis, kui need on toote eristamiseks olulised (eriti mööbel ja suuremad tooted). Kui toode on komplekt ja koosneb mitmest erinevast tootest, näiteks diivani komplekt, siis ära kuhja mitut mõõtu järjestikku.
-            - Kui toode on komplekt (nt "tk", "komplekt", "set"), siis märgi see selgelt tootenimes (nt "20 tk", "komplekt").
-            - Kasuta sisendnime kogu olulist infot: mõõdud, kogus, mudel/tüüp, eripärad. Ära jäta originaalnimest mainitud omadusi nimest välja.
-            - Vormistus: max 200 tähemärki. Ühikud: 60 cm, 20 L, 250 ml, 65 W.
-            - Väldi turundusklišeesid, jutumärke, semikoolonit ja punkti lõpus.
-
-            Oluline sisendi kvaliteet:
-            - Sisend on osaliselt tõlgitud ja võib sisaldada valesid tõlkeid. Ära kanna vigu edasi; paranda need loogika ja tooteinfo põhjal.
-            - Näide: "terrassi vaheseinad" / "privaatsusseinad" ei ole "varikatus". Kui selline või sarnane viga ilmneb, paranda see. Kontrolli tootepilti, et kindlaks teha kas on tõlkimisel tehtud vigu.
-            - Tõlkereegel: Teak/teakwood = "tiigipuu"/"tiigipuust" (mitte "tiikpuu" ega "tikkpuu").
-            - Väldi väljendit "täis[puidu liik]puidust" (nt "täismännipuidust"). Kasuta "täispuidust" või "[puidu liik]puidust"; sobib ka "naturaalsest [puidu liik]puidust".
-            - Väljund peab olema korrektne eesti keel; ära kasuta valesti käänatud/mitte-eestikeelseid sõnu; paranda vigased liitsõnad.
-            - Väldi topelt "-ga" vormi samas fraasis; nt mitte "voodiraam liistudega põhiga", vaid "voodiraam liistudest põhjaga" (või "liistpõhjaga").
-            - Kui toode on "aiasöögikomplekt", kasuta väljundis vormi "aiamööbli komplekt".
-            - Eemalda ingliskeelsed jäägid; väljundis ei tohi olla ingliskeelset teksti (v.a koodid või pärisnimed).
-
-            Head näited:
-            - "Esikupink jalatsiriiuliga, hall, metallraamiga, 100 x 38,5 x 49 cm"
-            - "Hall polsterdatud kahekohaline voodi peatsi ja puidust jalgadega, 160 x 200 cm"
-            - "7-osaline aiamööbli komplekt recliner-funktsiooniga, must polürotang, akaatsiapuidust lauaplaadiga, laud 190 x 90 cm"
-            - "Ühe inimese kontinentaalvoodi musta kangaga, polsterdatud peatsiga, 100 x 200 cm"
-            - "Virnastatavad tiigipuust aiatoolid patjadega, 8 tk, roostevaba terasraam, pruun, 60 x 56 x 85 cm"
-
-            Halvad näited:
-            - "Parim nõudepesumasin ülisoodne super kvaliteetne!!!"
-            - "Hamstri puur" (liiga üldine; mõõdud/eripärad puudu)
-
-            Toote lühikirjelduse koostamise reeglid:
-            - Kirjuta tootele lühikirjeldus eesti keeles, tuues esile toote olulisemad kasutegurid ja omadused.
-            - Pikkus: 2–3 lauset (kokku umbes 250–300 tähemärki).
-            - Hoia toon informatiivne ja neutraalne – väldi sisutühje hüüdlauseid või ülepaisutatud kiidusõnu.
-            - Lühikirjeldus peaks andma kliendile kiire ja täpse ülevaate tootest: kus, kellele ja miks toodet kasutatakse, mis muret see lahendab ja mis on kliendi peamine kasu.
-            - Võid kasutada sobivuse, kasutamise ja hoolduse rõhuasetusi, et lühikirjeldus vastaks tüüpilistele kliendiküsimustele, kuid ära korda küsimusi sõna-sõnalt.
-            - Väldi klišeesid nagu "nagu pildil näha", "pildilt on nähtav" jne.
-            - Ära kasuta kirjelduses semikoolonit ";". Lõpeta mõte punktiga ja alusta uue lausega.
-            - Oluline: kasuta ainult seda infot, mis tuleneb algsetest tooteandmetest. Ära lisa tootenimesse ega lühikirjeldusse omadusi, mida sisendis ei olnud.
-
-            2. SEO:
-            - Loo olemasoleva info põhjal ka "SEO Title" ja "SEO Meta kirjeldus".
-            - SEO Title: maksimaalselt 60 tähemärki (eesmärgiga 50–60), peab loomulikult sisaldama peamist otsingufraasi (toote tüüp + 1–2 võtmeomadust), olema selge ja täpne.
-            - SEO Meta kirjeldus: maksimaalselt 160 tähemärki, kutsuv ja informatiivne, mitte liialt reklaamilik, kirjeldab lühidalt toote põhikasu ja omadusi.
-            - Ära kasuta SEO väljundites tarnija nime ega diskreetset infot.
-            - Ära kasuta semikoolonit ";" üheski väljundis (ei pealkirjades ega kirjeldustes).
-
-            3. HTML-tootekirjeldus:
-            - Kirjuta detailne tootekirjeldus eestikeeles HTML-formaadis.
-            - Hoia sõnavara ühtlane ja kasuta loomulikku eesti keelt; väldi otsetõlget. Kasuta mõõtühikuid standardkujul.
-            - Hoia toon neutraalne ja informatiivne ning väldi liigset reklaamikeelt.
-            - Väldi katteta lubadusi ja ülepaisutatud väiteid.
-            - Väldi sõnu nagu "kaaslane", "partner", "abiline".
-            - Kontrolli sõnade käänete ja vormide õigsust.
-            - Kasuta kirjelduse olulisimates märksõnades ja infotükkides boldi (<strong>); maksimaalselt 3 korda ühes lõigus (<p>) ja 1 kord ühes listi elemendis (<li>).
-            - Ära lisa HTML kommentaare ega kopeeri juhenditeksti või kommentaaride sisu väljundisse.
-            - Kui mõne ploki jaoks puudub usaldusväärne info, jäta see plokk (sh pealkiri) täielikult ära.
-            - Ära kasuta tootekirjelduses tarnijale omaseid andmeid (tarnija nimi, URL-id, sisemised koodid/kaubandusandmed), sest see on diskreetne info.
-            - Järgi eelnevalt kirjeldatud plokkide struktuuri ja järjekorda. Kui mõni tingimuslik plokk jääb ära, ära jäta tühja pealkirja, jätka ülejäänud plokkidega.
-            - Väljund peab olema üks koherentne HTML-plokk. Kui algses kirjelduses olid <img>-elemendid, peavad kõik need elemendid väljundis alles olema (sama src); kui algses kirjelduses pilte ei olnud, ära lisa uusi <img>-elemente.
-            - Ära lisa eraldi "Kiirvastused", "Kes/Milleks/Kuidas" ega muid küsimuspealkirju; Q&A sektsiooni käsitleb eraldi töövoo samm.
-            - Ära lisa kirjeldusse lõpus toote põhiandmete/spec-tabelit – atribuudid hallatakse eraldi sammudes.
-            - Ära maini, et tekst on tõlgitud või loodud AI poolt; tekst peab kõlama nagu ühtne, toimetatud eestikeelne tootekirjeldus.
-            
-            - Struktuur ja kohustuslikkuse reeglid:
-                - Kohustuslikud plokid:
-                    1. Ava plokk: <h2> pealkiri, mis seob toote kasuteguri lahendatava probleemiga (kasuta loomulikult olulisemaid otsingufraase) + järgnevalt <p>, mis kirjeldab väärtuspakkumist.
-                    2. Peamised omadused: <h2>Peamised omadused</h2> ja sellele järgnev <ul> kuni 6–8 <li>-ga, mis seovad omaduse kliendi kasuga.
-                - Tingimuslikud plokid (kasuta ainult siis, kui sisendmaterjal seda võimaldab):
-                    • Algse kirjelduse ja pildiplokkide info: sinu käsutuses võib olla originaalne HTML-tootekirjeldus, mis võib sisaldada <img>-plokke. Kui originaalis on <img>-elemendid, kirjuta kirjeldus ümber loomulikuks eestikeelseks tekstiks ja SÄILITA KÕIK need <img>-elemendid (sama src). IGA lõplikus HTML-is olev <img>-element PEAB omama eestikeelset alt-attribuuti, mis lühidalt ja loomulikult kirjeldab pilti selle ümbruses oleva teksti kontekstis (ka juhul, kui algne alt oli muus keeles või puudus). Sa võid muuta, millise tekstiploki juurde konkreetne pilt paigutub, kuid ära jäta ühtegi algset <img>-elementi välja ning ära lisa uusi pilte, mida originaalis ei olnud. Kui algses kirjelduses pilte ei ole, ära lisa ise uusi <img>-elemente.
-                    • Paigaldus ja kasutus: h2 + lõik või loetelu praktiliste sammudega (kasuta algkirjelduse infot, kui see on olemas).
-                    • Komplektis sisalduv: h2 + loetelu või lõik, mis kirjeldab komplekti (nt mis tarvikud ja komponendid on kaasas).
-                    • CTA plokk: h2 + lõik, mis võtab peamised kasutegurid kokku ja suunab ostule ilma agressiivse müügikeeleta. CTA pealkiri peab olema tegevusele suunav (nt "Miks valida [TOOTE NIMI]?", "Kas otsid [lahendust X]?", "Millal valida [TOOTE NIMI]?"). Ära kasuta meta-pealkirju nagu "Kokkuvõte", "Järeldus", "Lõppsõna" või muid sarnaseid kokkuvõttepealkirju.
-
-            Väljund: Tagasta JSON, kus "translated_title" on tootenimi, "short_description" on toote lühikirjeldus, "seo_title" on SEO pealkiri, "seo_meta" on SEO meta kirjeldus ning "translated_description_html" on detailne tootekirjeldus HTML-formaadis.
-        """,
-        input=[
+    combined_response = variant_response(prod, sku) if NEAR_DUP_REP else None
+    if combined_response is None:
+        log(f"STEP 2+3: genereeri kõik (SKU {sku})")
+        input_content = [
             {
-                "role": "user",
-                "content": input_content,
-            }
-        ],
-        text={
-            "verbosity": "medium",
-            "format": {
-                "type": "json_schema",
-                "name": "translated_full_schema",
-                "schema": {
-                    "type": "object",
-                    "properties": {
-                        "translated_title": {"type": "string"},
-                        "short_description": {"type": "string"},
-                        "seo_title": {"type": "string"},
-                        "seo_meta": {"type": "string"},
-                        "translated_description_html": {"type": "string"}
-                    },
-                    "required": ["translated_title", "short_description", "seo_title", "seo_meta", "translated_description_html"],
-                    "additionalProperties": False
-                },
-                "strict": True
+                "type": "input_text",
+                "text": (
+                    "Genereeri tõlgitud andmete põhjal tootenimi, toote lühikirjeldus, SEO Title ja SEO Meta kirjeldus ning HTML-formaadis tootekirjeldus.\n\n"
+                    f"ALGNE_TOOTENIMI: {product_name}\n"
+                    f"ATRIBUUDID: {json.dumps(attributes, ensure_ascii=False)}\n"
+                    f"ORIGINAALNE_HTML_KIRJELDUS: {product_description}"
+                )
             }
-        }
-    )
-    except Exception as e:
-        msg = str(e)
-        if first_image_url and ("invalid_value" in msg or "Timeout while downloading" in msg):
-            log(f"⚠️ Pildi URL ebaõnnestus; proovin ilma pildita (SKU {sku}): {first_image_url}")
-            input_no_image = [input_content[0]]
+        ]
+        if first_image_url:
+            input_content.append({"type": "input_image", "image_url": first_image_url})
+
+        try:
             combined_response = create_with_retry(
-                _step_key="step2+3_all_no_image", _sku=sku,
+                _step_key="step2+3_all", _sku=sku,
                 model="gpt-5.1",
                 reasoning={"effort": "medium"},
                 service_tier="default",
                 previous_response_id=None,
-                instructions=
-                f"""
-            Eesmärk:
-            - Loo e-poe jaoks tootenimi, toote lühikirjeldus, SEO Title, SEO Meta kirjeldus ja detailne HTML-formaadis tootekirjeldus.
-
-            1. Tootenimi ja lühikirjeldus:
-            Tootenime koostamise reeglid:
-            - Alusta tootenimetusega, mis on koos 1–3 võtmeomadusega. Esimesed sõnad peavad koheselt iseloomustama, mis tootega on tegemist ja mis on toote eesmärk/kasutuskoht.
-            - Lisa detailseid tooteomadusi, mis pole veel nimetatud ja mis on vajalikult konkreetse toote eristamiseks (mõõt/maht/võimsus, materjal/värv, ühilduvus).
-            - Tooteomadusi lisades püüa mõelda toote iseloomule, et kasutada kõige relevantsemat infot, mis on antud toote puhul tähtis ja vajalik teada.
-            - Kui sisendis on mõõdud olemas, siis lisa mõõtmed ainult siis, kui need on toote eristamiseks olulised (eriti mööbel ja suuremad tooted). Kui toode on komplekt ja koosneb mitmest erinevast tootest, näiteks diivani komplekt, siis ära kuhja mitut mõõtu järjestikku.
-            - Kui toode on komplekt (nt "tk", "komplekt", "set"), siis märgi see selgelt tootenimes (nt "20 tk", "komplekt").
-            - Kasuta sisendnime kogu olulist infot: mõõdud, kogus, mudel/tüüp, eripärad. Ära jäta originaalnimest mainitud omadusi nimest välja.
-            - Vormistus: max 200 tähemärki. Ühikud: 60 cm, 20 L, 250 ml, 65 W.
-            - Väldi turundusklišeesid, jutumärke, semikoolonit ja punkti lõpus.
-
-            Oluline sisendi kvaliteet:
-            - Sisend on osaliselt tõlgitud ja võib sisaldada valesid tõlkeid. Ära kanna vigu edasi; paranda need loogika ja tooteinfo põhjal.
-            - Näide: "terrassi vaheseinad" / "privaatsusseinad" ei ole "varikatus". Kui selline või sarnane viga ilmneb, paranda see. Kontrolli tootepilti, et kindlaks teha kas on tõlkimisel tehtud vigu.
-            - Tõlkereegel: Teak/teakwood = "tiigipuu"/"tiigipuust" (mitte "tiikpuu" ega "tikkpuu").
-            - Väldi väljendit "täis[puidu liik]puidust" (nt "täismännipuidust"). Kasuta "täispuidust" või "[puidu liik]puidust"; sobib ka "naturaalsest [puidu liik]puidust".
-            - Väljund peab olema korrektne eesti keel; ära kasuta valesti käänatud/mitte-eestikeelseid sõnu; paranda vigased liitsõnad.
-            - Väldi topelt "-ga" vormi samas fraasis; nt mitte "voodiraam liistudega põhiga", vaid "voodiraam liistudest põhjaga" (või "liistpõhjaga").
-            - Kui toode on "aiasöögikomplekt", kasuta väljundis vormi "aiamööbli komplekt".
-            - Eemalda ingliskeelsed jäägid; väljundis ei tohi olla ingliskeelset teksti (v.a koodid või pärisnimed).
-
-            Head näited:
-            - "Esikupink jalatsiriiuliga, hall, metallraamiga, 100 x 38,5 x 49 cm"
-            - "Hall polsterdatud kahekohaline voodi peatsi ja puidust jalgadega, 160 x 200 cm"
-            - "7-osaline aiamööbli komplekt recliner-funktsiooniga, must polürotang, akaatsiapuidust lauaplaadiga, laud 190 x 90 cm"
-            - "Ühe inimese kontinentaalvoodi musta kangaga, polsterdatud peatsiga, 100 x 200 cm"
-            - "Virnastatavad tiigipuust aiatoolid patjadega, 8 tk, roostevaba terasraam, pruun, 60 x 56 x 85 cm"
-
-            Halvad näited:
-            - "Parim nõudepesumasin ülisoodne super kvaliteetne!!!"
-            - "Hamstri puur" (liiga üldine; mõõdud/eripärad puudu)
-
-            Toote lühikirjelduse koostamise reeglid:
-            - Kirjuta tootele lühikirjeldus eesti keeles, tuues esile toote olulisemad kasutegurid ja omadused.
-            - Pikkus: 2–3 lauset (kokku umbes 250–300 tähemärki).
-            - Hoia toon informatiivne ja neutraalne – väldi sisutühje hüüdlauseid või ülepaisutatud kiidusõnu.
-            - Lühikirjeldus peaks andma kliendile kiire ja täpse ülevaate tootest: kus, kellele ja miks toodet kasutatakse, mis muret see lahendab ja mis on kliendi peamine kasu.
-            - Võid kasutada sobivuse, kasutamise ja hoolduse rõhuasetusi, et lühikirjeldus vastaks tüüpilistele kliendiküsimustele, kuid ära korda küsimusi sõna-sõnalt.
-            - Väldi klišeesid nagu "nagu pildil näha", "pildilt on nähtav" jne.
-            - Ära kasuta kirjelduses semikoolonit ";". Lõpeta mõte punktiga ja alusta uue lausega.
-            - Oluline: kasuta ainult seda infot, mis tuleneb algsetest tooteandmetest. Ära lisa tootenimesse ega lühikirjeldusse omadusi, mida sisendis ei olnud.
-
-            2. SEO:
-            - Loo olemasoleva info põhjal ka "SEO Title" ja "SEO Meta kirjeldus".
-            - SEO Title: maksimaalselt 60 tähemärki (eesmärgiga 50–60), peab loomulikult sisaldama peamist otsingufraasi (toote tüüp + 1–2 võtmeomadust), olema selge ja täpne.
-            - SEO Meta kirjeldus: maksimaalselt 160 tähemärki, kutsuv ja informatiivne, mitte liialt reklaamilik, kirjeldab lühidalt toote põhikasu ja omadusi.
-            - Ära kasuta SEO väljundites tarnija nime ega diskreetset infot.
-            - Ära kasuta semikoolonit ";" üheski väljundis (ei pealkirjades ega kirjeldustes).
-
-            3. HTML-tootekirjeldus:
-            - Kirjuta detailne tootekirjeldus eestikeeles HTML-formaadis.
-            - Hoia sõnavara ühtlane ja kasuta loomulikku eesti keelt; väldi otsetõlget. Kasuta mõõtühikuid standardkujul.
-            - Hoia toon neutraalne ja informatiivne ning väldi liigset reklaamikeelt.
-            - Väldi katteta lubadusi ja ülepaisutatud väiteid.
-            - Väldi sõnu nagu "kaaslane", "partner", "abiline".
-            - Kontrolli sõnade käänete ja vormide õigsust.
-            - Kasuta kirjelduse olulisimates märksõnades ja infotükkides boldi (<strong>); maksimaalselt 3 korda ühes lõigus (<p>) ja 1 kord ühes listi elemendis (<li>).
-            - Ära lisa HTML kommentaare ega kopeeri juhenditeksti või kommentaaride sisu väljundisse.
-            - Kui mõne ploki jaoks puudub usaldusväärne info, jäta see plokk (sh pealkiri) täielikult ära.
-            - Ära kasuta tootekirjelduses tarnijale omaseid andmeid (tarnija nimi, URL-id, sisemised koodid/kaubandusandmed), sest see on diskreetne info.
-            - Järgi eelnevalt kirjeldatud plokkide struktuuri ja järjekorda. Kui mõni tingimuslik plokk jääb ära, ära jäta tühja pealkirja, jätka ülejäänud plokkidega.
-            - Väljund peab olema üks koherentne HTML-plokk. Kui algses kirjelduses olid <img>-elemendid, peavad kõik need elemendid väljundis alles olema (sama src). Kui algses kirjelduses pilte ei olnud, ära lisa uusi <img>-elemente.
-            - Ära lisa eraldi "Kiirvastused", "Kes/Milleks/Kuidas" ega muid küsimuspealkirju; Q&A sektsiooni käsitleb eraldi töövoo samm.
-            - Ära lisa kirjeldusse lõpus toote põhiandmete/spec-tabelit – atribuudid hallatakse eraldi sammudes.
-            - Ära maini, et tekst on tõlgitud või loodud AI poolt; tekst peab kõlama nagu ühtne, toimetatud eestikeelne tootekirjeldus.
-            
-            - Struktuur ja kohustuslikkuse reeglid:
-                - Kohustuslikud plokid:
-                    1. Ava plokk: <h2> pealkiri, mis seob toote kasuteguri lahendatava probleemiga (kasuta loomulikult olulisemaid otsingufraase) + järgnevalt <p>, mis kirjeldab väärtuspakkumist.
-                    2. Peamised omadused: <h2>Peamised omadused</h2> ja sellele järgnev <ul> kuni 6–8 <li>-ga, mis seovad omaduse kliendi kasuga.
-                - Tingimuslikud plokid (kasuta ainult siis, kui sisendmaterjal seda võimaldab):
-                    • Algse kirjelduse ja pildiplokkide info: sinu käsutuses võib olla originaalne HTML-tootekirjeldus, mis võib sisaldada <img>-plokke. Kui originaalis on <img>-elemendid, kirjuta kirjeldus ümber loomulikuks eestikeelseks tekstiks ja SÄILITA KÕIK need <img>-elemendid (sama src). IGA lõplikus HTML-is olev <img>-element PEAB omama eestikeelset alt-attribuuti, mis lühidalt ja loomulikult kirjeldab pilti selle ümbruses oleva teksti kontekstis (ka juhul, kui algne alt oli muus keeles või puudus). Sa võid muuta, millise tekstiploki juurde konkreetne pilt paigutub, kuid ära jäta ühtegi algset <img>-elementi välja ning ära lisa uusi pilte, mida originaalis ei olnud. Kui algses kirjelduses pilte ei ole, ära lisa ise uusi <img>-elemente.
-                    • Paigaldus ja kasutus: h2 + lõik või loetelu praktiliste sammudega (kasuta algkirjelduse infot, kui see on olemas).
-                    • Komplektis sisalduv: h2 + loetelu või lõik, mis kirjeldab komplekti (nt mis tarvikud ja komponendid on kaasas).
-                    • CTA plokk: h2 + lõik, mis võtab peamised kasutegurid kokku ja suunab ostule ilma agressiivse müügikeeleta. CTA pealkiri peab olema tegevusele suunav (nt "Miks valida [TOOTE NIMI]?", "Kas otsid [lahendust X]?", "Millal valida [TOOTE NIMI]?"). Ära kasuta meta-pealkirju nagu "Kokkuvõte", "Järeldus", "Lõppsõna" või muid sarnaseid kokkuvõttepealkirju.
-
-            Väljund: Tagasta JSON, kus "translated_title" on tootenimi, "short_description" on toote lühikirjeldus, "seo_title" on SEO pealkiri, "seo_meta" on SEO meta kirjeldus ning "translated_description_html" on detailne tootekirjeldus HTML-formaadis.
-                """,
+                instructions=STEP23_INSTRUCTIONS,
                 input=[
                     {
                         "role": "user",
-                        "content": input_no_image,
+                        "content": input_content,
                     }
                 ],
-                text={
-                    "verbosity": "medium",
-                    "format": {
-                        "type": "json_schema",
-                        "name": "translated_full_schema",
-                        "schema": {
-                            "type": "object",
-                            "properties": {
-                                "translated_title": {"type": "string"},
-                                "short_description": {"type": "string"},
-                                "seo_title": {"type": "string"},
-                                "seo_meta": {"type": "string"},
-                                "translated_description_html": {"type": "string"}
-                            },
-                            "required": ["translated_title", "short_description", "seo_title", "seo_meta", "translated_description_html"],
-                            "additionalProperties": False
-                        },
-                        "strict": True
-                    }
-                }
+                text=STEP23_TEXT
             )
-        else:
-            raise
+        except Exception as e:
+            msg = str(e)
+            if first_image_url and ("invalid_value" in msg or "Timeout while downloading" in msg):
+                log(f"⚠️ Pildi URL ebaõnnestus; proovin ilma pildita (SKU {sku}): {first_image_url}")
+                input_no_image = [input_content[0]]
+                combined_response = create_with_retry(
+                    _step_key="step2+3_all_no_image", _sku=sku,
+                    model="gpt-5.1",
+                    reasoning={"effort": "medium"},
+                    service_tier="default",
+                    previous_response_id=None,
+                    instructions=STEP23_INSTRUCTIONS,
+                    input=[
+                        {
+                            "role": "user",
+                            "content": input_no_image,
+                        }
+                    ],
+                    text=STEP23_TEXT
+                )
+            else:
+                raise
     add_usage(combined_response)
     record_usage("STEP 2+3: genereeri kõik", combined_response)
 
@@ -1091,6 +1173,16 @@ def process_one_product(prod: Dict[str, Any], index: int) -> Dict[str, int]:
         seo_meta = clean_double_asterisks(desc_data.get("seo_meta", "").strip())
         raw_html_desc = str(desc_data.get("translated_description_html", "")).strip()
         translated_description = clean_double_asterisks(raw_html_desc)
+        if sku in NEAR_DUP_REPS:
+            with GROUP_LOCK:
+                NEAR_DUP_OUTPUTS[sku] = {
+                    "output": desc_data,
+                    "name": product_name,
+                    "description": product_description,
+                    "images": image_sources(product_description),
+                    # Koopia: hilisemad sammud nimetavad atribuute kohapeal ümber.
+                    "attributes": copy.deepcopy(attributes),
+                }
     except (json.JSONDecodeError, KeyError):
         translated_title = "ERROR: Could not parse translated description"
         short_description = ""
@@ -1634,6 +1726,11 @@ def process_one_product(prod: Dict[str, Any], index: int) -> Dict[str, int]:
         "totals": {k: int(v) for k, v in token_usage.items() if v and isinstance(v, int)},
         "steps": token_steps,
     }
+    with GROUP_LOCK:
+        cache_hits = RESPONSE_CACHE_HITS.pop(sku, [])
+    if cache_hits:
+        # Vahemälust serveeritud sammude kulu pole totals/steps all (kutset ei tehtud).
+        prod["token_usage"]["cache_hits"] = cache_hits
     meta = list(prod.get("meta_data") or [])
     try:
         _main_q = main_query if 'main_query' in locals() and main_query else ""
@@ -1651,8 +1748,8 @@ def process_one_product(prod: Dict[str, Any], index: int) -> Dict[str, int]:
 
     grp = top_level_category(prod)
     with GROUP_LOCK:
-        grouped.setdefault(grp, [])
-        grouped[grp].append(prod)
+        # Persist after each product to avoid data loss (päevik, fsync iga kirje järel)
+        translated_journal.append({"group": grp, "product": prod})
         existing_idx[sku] = grp
         local_added += 1
 
@@ -1665,34 +1762,176 @@ def process_one_product(prod: Dict[str, Any], index: int) -> Dict[str, int]:
     print("Description (ET):", prod.get("description")[:80] + "..." if len(prod.get("description") or "") > 80 else prod.get("description"))
     print("-" * 100)
 
-    # Persist after each product to avoid data loss
-    with GROUP_LOCK:
-        _atomic_write_grouped()
-
     return {"added": local_added, "skipped_existing": local_skipped}
 
-# Run sequentially or with workers
-if WORKERS and WORKERS > 1:
-    log(f"Paralleelne töö: {WORKERS} workerit")
-    futures = []
-    with ThreadPoolExecutor(max_workers=WORKERS) as ex:
-        for index, prod in enumerate(products):
-            futures.append(ex.submit(process_one_product, prod, index))
-        for fut in as_completed(futures):
+def build_near_duplicate_clusters() -> None:
+    """MinHash/LSH eelsamm: klastri liikmed genereeritakse esindaja sisust (vt near_duplicates.py)."""
+    hasher = MinHasher()
+    signatures = []
+    for prod in iter_input_products():
+        sku = str(prod.get("sku") or "").strip()
+        if not sku or sku in existing_idx or (only_skus and sku not in only_skus):
+            continue
+        signatures.append((sku, hasher.signature(shingles(product_text(prod)))))
+    clusters = cluster_signatures(signatures, threshold=NEAR_DUP_THRESHOLD)
+    for members in clusters:
+        NEAR_DUP_REPS.add(members[0])
+        for member in members[1:]:
+            NEAR_DUP_REP[member] = members[0]
+    log(
+        f"Lähiduplikaadid: {len(signatures)} tootest {len(clusters)} klastrit, "
+        f"{len(NEAR_DUP_REP)} varianti esindaja sisust (suurus×arv: {size_histogram(clusters)})"
+    )
+
+def iter_phases() -> Iterator[Iterator[Dict[str, Any]]]:
+    """Sisend faasidena: enne esindajad ja üksiktooted, siis klastrite liikmed."""
+    if not NEAR_DUP_REP:
+        yield iter_input_products()
+        return
+    for members in (False, True):
+        yield (
+            prod for prod in iter_input_products()
+            if (str(prod.get("sku") or "").strip() in NEAR_DUP_REP) == members
+        )
+
+def _collect_result(fut: Any) -> None:
+    global added, skipped_existing
+    try:
+        res = fut.result() or {}
+        with GROUP_LOCK:
+            added += int(res.get("added") or 0)
+            skipped_existing += int(res.get("skipped_existing") or 0)
+        THROUGHPUT.mark(int(res.get("added") or 0))
+    except Exception as e:
+        log(f"Worker viga: {e}")
+
+def _batch_phase(mode: str, only_ids: Optional[set] = None) -> None:
+    """Käi sisend läbi partiitöö kogumis- või liitmisfaasis (järjest, API ootamiseta)."""
+    global BATCH_MODE, added, skipped_existing, processed_total
+    BATCH_MODE = mode
+    try:
+        for index, prod in enumerate(prod for phase in iter_phases() for prod in phase):
+            sku = str(prod.get("sku") or "").strip()
+            # Klastri liige liidetakse, kui tema esindajal on partii vastus.
+            result_sku = NEAR_DUP_REP.get(sku, sku)
+            if only_ids is not None and not any(batch_custom_id(result_sku, key) in only_ids for key in BATCH_STEP_KEYS):
+                continue
+            processed_total += 1
             try:
-                res = fut.result() or {}
-                with GROUP_LOCK:
-                    added += int(res.get("added") or 0)
-                    skipped_existing += int(res.get("skipped_existing") or 0)
+                res = process_one_product(prod, index)
+            except BatchDeferred as e:
+                if mode == "merge":
+                    log(f"⚠️ Partii vastuseta, jätan vahele: {e}")
+                continue
             except Exception as e:
                 log(f"Worker viga: {e}")
-else:
-    for index, prod in enumerate(products):
-        res = process_one_product(prod, index)
-        added += int(res.get("added") or 0)
-        skipped_existing += int(res.get("skipped_existing") or 0)
+                continue
+            added += int(res.get("added") or 0)
+            skipped_existing += int(res.get("skipped_existing") or 0)
+            THROUGHPUT.mark(int(res.get("added") or 0))
+    finally:
+        BATCH_MODE = None
+
+def run_batch_mode() -> None:
+    """Partiitöö: kogu päringud -> saada -> oota -> liida tulemused (või jätka pooleli tööd)."""
+    global processed_total
+    batch_client = OpenAI(base_url=args.batch_base_url) if args.batch_base_url else client
+    job: Optional[BatchJob] = pending_batch_job(BATCH_DIR)
+    if job:
+        log(f"↻ Jätkan pooleli partiitööd: {job.path.name} (staatus {job.state.get('status') or '-'})")
+    else:
+        _batch_phase("collect")
+        processed_total = 0
+        if not BATCH_REQUESTS:
+            log("Partiitöösse pole uusi päringuid.")
+            return
+        job = new_batch_job(BATCH_DIR)
+        count = batch_write_requests(job, BATCH_REQUESTS)
+        log(f"✔ Tööfail: {job.requests_path} ({count} päringut)")
+    if not job.state.get("batch_id"):
+        batch_id = batch_submit(batch_client, job)
+        log(f"✔ Partii saadetud: {batch_id}")
+    status = batch_poll(batch_client, job, args.batch_poll, log)
+    if not job.state.get("output_file_id") and not job.state.get("error_file_id"):
+        log(f"❌ Partii lõppes staatusega {status}, tulemusi pole")
+        job.state["merged"] = True
+        job.save()
+        return
+    if not job.results_path.exists():
+        lines = batch_download_results(batch_client, job)
+        log(f"✔ Tulemused alla laaditud: {lines} rida")
+    results, errors = batch_load_results(job)
+    BATCH_RESULTS.update(results)
+    BATCH_ERRORS.update(errors)
+    log(f"Partii {status}: vastuseid {len(results)}, vigu {len(errors)}")
+    _batch_phase("merge", set(results) | set(errors))
+    job.state["merged"] = True
+    job.save()
+
+def run_products(products: Iterator[Dict[str, Any]]) -> None:
+    """Töötle sisend asünkroonselt (adaptiivne aken), workeritega või järjest."""
+    global added, skipped_existing, processed_total
+    if ASYNC_ENGINE and CONCURRENCY.maximum > 1:
+        log(f"Asünkroonne töö: aken {CONCURRENCY.limit}, ülempiir {CONCURRENCY.maximum}")
+        processed_total += run_adaptive(
+            products,
+            process_one_product,
+            _collect_result,
+            CONCURRENCY,
+            THROUGHPUT,
+            log,
+            status_every=ASYNC_STATUS_SECONDS,
+        )
+    elif WORKERS and WORKERS > 1:
+        log(f"Paralleelne töö: {WORKERS} workerit")
+        # Korraga on töös kuni WORKERS * 2 toodet, et sisend püsiks voona.
+        in_flight: set = set()
+        with ThreadPoolExecutor(max_workers=WORKERS) as ex:
+            for index, prod in enumerate(products):
+                processed_total += 1
+                in_flight.add(ex.submit(process_one_product, prod, index))
+                if len(in_flight) >= WORKERS * 2:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        _collect_result(fut)
+            for fut in as_completed(in_flight):
+                _collect_result(fut)
+    else:
+        for index, prod in enumerate(products):
+            processed_total += 1
+            res = process_one_product(prod, index)
+            added += int(res.get("added") or 0)
+            skipped_existing += int(res.get("skipped_existing") or 0)
+            THROUGHPUT.mark(int(res.get("added") or 0))
 
-log(f"Valmis. Kokku sisendeid: {len(products)}, lisatud uusi tõlkeid: {added}, juba olemas: {skipped_existing}")
+# Lähiduplikaatide klastrid, siis partiitöö või tavajooks (esindajad enne liikmeid)
+try:
+    if NEAR_DUP_ENABLED and not args.no_dedupe:
+        build_near_duplicate_clusters()
+    if args.batch:
+        run_batch_mode()
+    else:
+        for phase in iter_phases():
+            run_products(phase)
+finally:
+    translated_journal.close()
+    try:
+        compact_grouped_journal(OUT_JOURNAL, OUT_FILE)
+    except Exception as e:
+        log(f"⚠️ Kirjutamise viga: {e}")
+
+log(f"Valmis. Kokku sisendeid: {processed_total}, lisatud uusi tõlkeid: {added}, juba olemas: {skipped_existing}")
+log(f"Läbilase: {THROUGHPUT.overall_per_minute():.1f} toodet/min; {CONCURRENCY.summary()}")
+for line in PROMPT_CACHE_STATS.report():
+    log(f"Prompti prefiksi vahemälu – {line}")
+if NEAR_DUP_REP:
+    saved = NEAR_DUP_STATS["substituted"] + NEAR_DUP_STATS["adapted"]
+    log(
+        f"Lähiduplikaadid: {len(NEAR_DUP_REPS)} klastrit, {len(NEAR_DUP_REP)} varianti – asendusega {NEAR_DUP_STATS['substituted']}, "
+        f"kohandatud {NEAR_DUP_STATS['adapted']} ({NEAR_DUP_ADAPT_MODEL}), täismahus {NEAR_DUP_STATS['full']}; "
+        f"säästetud STEP 2+3 täiskutseid {saved} (neist {NEAR_DUP_STATS['substituted']} ilma API kutseta)"
+    )
+log(f"Vastuste vahemälu{' (lugemine välja lülitatud)' if args.no_cache else ''}: {RESPONSE_CACHE.summary()}")
 
 # WooCommerce'iga kattunud EAN-id (_bp_gtin13 meta järgi), mida selles jooksus leidsime
 if WOO_EAN_MATCHED_IN_WOO:
@@ -17,7 +17,8 @@ from pathlib import Path
 from datetime import datetime
 from dotenv import load_dotenv
 from bs4 import BeautifulSoup
-from category_change_runner import apply_maps_to_path, DEFAULT_MAPS
+from artifact_io import load_sku_index, read_artifact_items
+from category_change_runner import DEFAULT_MAPPER
 
 # Load environment variables
 load_dotenv()
@@ -914,7 +915,7 @@ class WooCommerceUploader:
         translated_path = self._norm(cat_obj.get('translated_path'))
         target_path = translated_path or self._norm(self.category_translation.get(raw_path) or '') or raw_path
         if target_path:
-            target_path = apply_maps_to_path(target_path, DEFAULT_MAPS)
+            target_path = DEFAULT_MAPPER.apply(target_path)
             cat_id = self.ensure_category_path(target_path)
             if cat_id:
                 payload['categories'].append({"id": cat_id})
@@ -1001,35 +1002,32 @@ class WooCommerceUploader:
     def upload_products_from_file(self, input_file, only_skus=None, limit: int = 0, status: str = 'publish', update_images: bool = False, dry_run: bool = False, sku_suffix: str = ""):
         """Upload products from grouped translated JSON file"""
         print(f"[INFO] Loading products from: {input_file}")
+        # Tooteid ei loeta korraga mällu: valik tehakse SKU indeksi põhjal
+        # (artifact_io.py) ja iga toode loetakse failist tema baidinihke järgi.
+        input_path = Path(input_file)
+        if not input_path.exists():
+            print(f"❌ Error loading file: {input_file} not found")
+            return
         try:
-            with open(input_file, 'r', encoding='utf-8') as f:
-                grouped = json.load(f)
+            index = load_sku_index(input_path)
         except Exception as e:
             print(f"❌ Error loading file: {e}")
             return
 
-        # Flatten grouped dict {grp: [products]}
-        products = []
-        if isinstance(grouped, dict):
-            for grp, items in grouped.items():
-                for it in (items or []):
-                    if isinstance(it, dict):
-                        products.append(it)
-        elif isinstance(grouped, list):
-            products = grouped
-
+        entries = index.entries
         if only_skus:
             only = set([str(x).strip() for x in only_skus])
-            products = [p for p in products if str(p.get('sku') or '').strip() in only]
+            entries = [e for e in entries if e.sku in only]
 
         # Töötle kõige uuemad tõlked esimesena
-        if products:
-            products.reverse()
+        entries = list(reversed(entries))
 
         if limit and limit > 0:
-            products = products[:limit]
+            entries = entries[:limit]
 
-        print(f"[INFO] Starting upload of {len(products)} products to WooCommerce...")
+        total = len(entries)
+        products = read_artifact_items(input_path, [e.offset for e in entries])
+        print(f"[INFO] Starting upload of {total} products to WooCommerce...")
 
         results = {
             'successful': [],
@@ -1040,7 +1038,7 @@ class WooCommerceUploader:
         
         for i, product in enumerate(products, 1):
             title_dbg = (product.get('name') or product.get('original_name') or 'Unknown')[:60]
-            print(f"\n[INFO] [{i}/{len(products)}] Processing: {title_dbg}...")
+            print(f"\n[INFO] [{i}/{total}] Processing: {title_dbg}...")
 
             sku = str(product.get('sku') or '').strip()
             if not sku:
@@ -1085,7 +1083,7 @@ class WooCommerceUploader:
                 results['failed'].append(result)
             
             # Rate limiting - be nice to the API
-            if i < len(products):
+            if i < total:
                 print("   ⏳ Waiting 2 seconds...")
                 time.sleep(2)
         
@@ -6,18 +6,22 @@ Kasutus:
     python DropXL_stock_loop_runner.py --interval 900  # loop iga 900s järel
     python DropXL_stock_loop_runner.py --only-sku ABC123 --dry-run
     python DropXL_stock_loop_runner.py --no-update-prices  # ära uuenda hindasid
+    python DropXL_stock_loop_runner.py --changed-only  # ainult feedi delta SKU-d
 
 Reeglid:
 - Võtab aluseks WooCommerce'i toodete nimekirja.
 - Uuendab ainult Woo tooteid, mille meta `_bp_supplier` == "DropXL".
 - Eeldab, et Woo SKU == DropXL CSV feedi SKU.
 - Kui Woo DropXL SKU puudub feedis, pannakse laoseis 0 + outofstock (toode jääb alles).
+- Iga offer feedi versiooni kohta arvutatakse per-SKU delta (feed_delta.py);
+  --changed-only korral töödeldakse ainult lisatud/eemaldatud/muutunud SKU-sid.
+  Runneril on oma delta kursor (``STOCK_DELTA_CONSUMER``), mis liigub edasi
+  alles siis, kui Woo sync lõpetas kõik SKU-d vigadeta.
 """
 
 from __future__ import annotations
 
 import argparse
-import csv
 import json
 import math
 import os
@@ -28,12 +32,17 @@ from typing import Any, Dict, Iterable, Optional, Tuple
 import requests
 from dotenv import find_dotenv, load_dotenv
 
+from feed_delta import FeedDelta, commit_feed_delta, update_feed_delta
+from feed_store import OFFER_FEED_COLUMNS, open_feed_store
+from feed_sync import STATUS_UNCHANGED, download_feed
+
 ROOT = Path(__file__).resolve().parent
 OFFER_FEED_URL = (
     "https://feed.vidaxl.io/api/v1/feeds/download/"
     "e8eb166c-2dd3-4930-8c18-0ae5abb33245/EE/vidaXL_ee_dropshipping_offer.csv"
 )
 OFFER_FEED_PATH = ROOT / "data" / "feeds" / "vidaXL_ee_dropshipping_offer.csv"
+STOCK_DELTA_CONSUMER = "stock_runner"  # Runneri oma feed delta kursor (vt feed_delta.py)
 
 PRICE_MARKUP_RATE = 0.10
 PRICE_VAT_RATE = 0.24
@@ -44,26 +53,23 @@ def log(msg: str) -> None:
     print(f"[{ts}] {msg}")
 
 
-def download_offer_feed() -> bool:
+_FEED_INDEX_CACHE: Dict[str, Any] = {}
+
+
+def download_offer_feed() -> Optional[str]:
+    """Lae offer feed tingimuslikult; tagastab oleku (downloaded/unchanged) või None vea korral."""
     try:
-        OFFER_FEED_PATH.parent.mkdir(parents=True, exist_ok=True)
-        with requests.get(OFFER_FEED_URL, stream=True, timeout=60) as resp:
-            resp.raise_for_status()
-            with OFFER_FEED_PATH.open("wb") as fh:
-                for chunk in resp.iter_content(chunk_size=1024 * 1024):
-                    if chunk:
-                        fh.write(chunk)
-        size_bytes = 0
-        try:
-            size_bytes = OFFER_FEED_PATH.stat().st_size
-        except Exception:
-            size_bytes = 0
+        result = download_feed(OFFER_FEED_URL, OFFER_FEED_PATH)
+        size_bytes = int(result.get("size") or 0)
         size_mb = size_bytes / (1024 * 1024) if size_bytes else 0
-        log(f"✔ Offer feed downloaded: {OFFER_FEED_PATH} ({size_mb:.2f} MB)")
-        return True
+        if result["status"] == STATUS_UNCHANGED:
+            log(f"✔ Offer feed unchanged: {OFFER_FEED_PATH} ({size_mb:.2f} MB)")
+        else:
+            log(f"✔ Offer feed downloaded: {OFFER_FEED_PATH} ({size_mb:.2f} MB)")
+        return str(result["status"])
     except Exception as exc:
         log(f"⚠️ Offer feed download failed: {exc}")
-        return False
+        return None
 
 
 def wc_site_and_auth() -> Tuple[Optional[str], Optional[Tuple[str, str]]]:
@@ -260,9 +266,8 @@ def load_feed_index() -> Dict[str, Dict[str, Any]]:
         log(f"⚠️ Offer feed not found: {OFFER_FEED_PATH}")
         return index
     try:
-        with OFFER_FEED_PATH.open("r", encoding="utf-8", newline="") as fh:
-            reader = csv.DictReader(fh)
-            for row in reader:
+        with open_feed_store(OFFER_FEED_PATH, OFFER_FEED_COLUMNS) as store:
+            for row in store.iter_rows():
                 sku = str((row.get("SKU") or "")).strip()
                 if not sku:
                     continue
@@ -287,10 +292,41 @@ def run_once(
     limit: int = 0,
     dry_run: bool = False,
     update_prices: bool = True,
+    changed_only: bool = False,
 ) -> None:
     load_dotenv(find_dotenv(), override=False)
-    download_offer_feed()
-    feed_index = load_feed_index()
+    feed_status = download_offer_feed()
+    if feed_status == STATUS_UNCHANGED and _FEED_INDEX_CACHE.get("index"):
+        feed_index = _FEED_INDEX_CACHE["index"]
+        log(f"Offer feed muutumata; kasutan eelmist indeksit ({len(feed_index)} SKU-d)")
+    else:
+        feed_index = load_feed_index()
+        _FEED_INDEX_CACHE["index"] = feed_index
+
+    changed_skus: Optional[set[str]] = None
+    delta: Optional[FeedDelta] = None
+    try:
+        delta = update_feed_delta(
+            OFFER_FEED_PATH,
+            OFFER_FEED_COLUMNS,
+            consumer=STOCK_DELTA_CONSUMER,
+            commit=False,
+        )
+        counts = delta.counts()
+        log(
+            f"Feed delta: added={counts['added']}, removed={counts['removed']}, "
+            f"changed={counts['changed']}{' (esimene hetktõmmis)' if delta.initial else ''}"
+        )
+        if changed_only and not delta.initial:
+            changed_skus = delta.touched_skus()
+    except Exception as exc:
+        log(f"⚠️ Feed delta arvutamine ebaõnnestus: {exc}")
+
+    if changed_skus is not None and not changed_skus:
+        log("Feedis muudatusi pole (--changed-only); Woo sync jäetakse vahele.")
+        if delta is not None and not dry_run:
+            commit_feed_delta(delta)
+        return
 
     updated = 0
     skipped_not_dropxl = 0
@@ -303,6 +339,7 @@ def run_once(
     feed_out_of_stock = 0
     missing_in_feed = 0
     ean_mismatch = 0
+    complete = True
 
     for entry in feed_index.values():
         try:
@@ -324,6 +361,8 @@ def run_once(
             continue
         if only_skus and sku not in only_skus:
             continue
+        if changed_skus is not None and sku not in changed_skus:
+            continue
 
         meta_data = woo_prod.get("meta_data") or []
         if not has_dropxl_supplier(meta_data):
@@ -332,6 +371,7 @@ def run_once(
 
         processed += 1
         if limit and limit > 0 and processed > limit:
+            complete = False
             break
 
         woo_id = woo_prod.get("id")
@@ -448,6 +488,17 @@ def run_once(
     log(f"Updated={updated}, Skipped_not_dropxl={skipped_not_dropxl}, Skipped_no_sku={skipped_no_sku}, Errors={errors}")
     log(f"All Woo DropXL SKUs present in feed: {'YES' if all_woo_in_feed else 'NO'}")
 
+    # Delta kursor liigub ainult täielikult ja vigadeta lõppenud sync'i järel.
+    if delta is not None and delta.pending is not None:
+        if dry_run or only_skus or not complete or errors:
+            log("Feed delta kursorit ei liigutata (dry-run, osaline või vigadega sync); delta töödeldakse järgmisel korral uuesti.")
+        else:
+            try:
+                commit_feed_delta(delta)
+                log("✔ Feed delta kursor liigutatud")
+            except Exception as exc:
+                log(f"⚠️ Feed delta kursori salvestamine ebaõnnestus: {exc}")
+
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="DropXL stock/price sync WooCommerce'i jaoks")
@@ -471,6 +522,11 @@ def parse_args() -> argparse.Namespace:
         default=1800,
         help="Kui >0, jookseb loop iga N sekundi järel (default: 1800)",
     )
+    parser.add_argument(
+        "--changed-only",
+        action="store_true",
+        help="Töötle ainult SKU-sid, mis offer feedis eelmisest versioonist muutusid (feed delta)",
+    )
     return parser.parse_args()
 
 
@@ -493,6 +549,7 @@ def main() -> int:
                 limit=int(args.limit or 0),
                 dry_run=bool(args.dry_run),
                 update_prices=bool(args.update_prices),
+                changed_only=bool(args.changed_only),
             )
             log(f"⏳ Waiting {interval} seconds...")
             try:
@@ -506,6 +563,7 @@ def main() -> int:
             limit=int(args.limit or 0),
             dry_run=bool(args.dry_run),
             update_prices=bool(args.update_prices),
+            changed_only=bool(args.changed_only),
         )
     return 0
 
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""Adaptiivne paralleelsus (AIMD) API-põhistele sammudele.
+
+4. samm teeb iga toote kohta 1–4 pikka ``responses.create`` kutset; ühe toote
+kaupa töötades piirab läbilaset ühe kutse latentsus. Siin on kolm osa:
+
+- ``AimdController`` – aken ehk mitu toodet korraga töös. Iga eduka kutse järel
+  kasvab aken aditiivselt (ühe võrra iga täis akna kohta), 429 vastuse korral
+  kahaneb multiplikatiivselt (``decrease``) ja uued kutsed ootavad
+  ``retry-after`` pausi lõpuni. Aken ei kasva, kui latentsus on tõusnud üle
+  ``latency_factor`` korra madalaimast nähtud tasemest või rate-limit päised
+  (``x-ratelimit-remaining-*``) näitavad, et limiidist on alles alla
+  ``headroom`` osa; limiidi ammendumisel aken kahaneb.
+- ``ThroughputMeter`` – valminud tooteid minutis (viimaste minutite ja kogu
+  jooksu kohta).
+- ``run_adaptive()`` – asyncio tsükkel, mis hoiab töös kuni ``controller.limit``
+  toodet. Tootetöötlus ise on sünkroonne (OpenAI klient, WooCommerce päringud),
+  seega jookseb iga toode eraldi lõimes; asyncio juhib akent ja logib olekut.
+
+Kontroller on lõimekindel: kutsed raporteerivad tulemuse töölõimedest.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Iterable, Mapping, Optional, Set
+
+DEFAULT_COOLDOWN_SECONDS = 1.0
+LATENCY_ALPHA = 0.2
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: Any) -> Optional[float]:
+    """``"1.5"``, ``"20ms"``, ``"6m0s"`` -> sekundid (tundmatu kuju -> None)."""
+    text = str(value or "").strip()
+    if not text:
+        return None
+    try:
+        return max(0.0, float(text))
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(text)
+    if not parts:
+        return None
+    return sum(float(num) * _DURATION_UNITS[unit] for num, unit in parts)
+
+
+def _header(headers: Optional[Mapping[str, Any]], name: str) -> Optional[str]:
+    if not headers:
+        return None
+    try:
+        value = headers.get(name)
+    except Exception:
+        return None
+    return str(value) if value is not None else None
+
+
+def _int_header(headers: Optional[Mapping[str, Any]], name: str) -> Optional[int]:
+    try:
+        value = _header(headers, name)
+        return int(float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def retry_after(headers: Optional[Mapping[str, Any]]) -> Optional[float]:
+    """Paus sekundites ``retry-after-ms`` / ``retry-after`` päisest."""
+    ms = _header(headers, "retry-after-ms")
+    if ms is not None:
+        try:
+            return max(0.0, float(ms) / 1000.0)
+        except ValueError:
+            pass
+    return parse_duration(_header(headers, "retry-after"))
+
+
+def remaining_fraction(headers: Optional[Mapping[str, Any]]) -> Optional[float]:
+    """Väikseim ``remaining / limit`` päringute ja tokenite rate-limit päistest."""
+    fractions = []
+    for kind in ("requests", "tokens"):
+        limit = _int_header(headers, f"x-ratelimit-limit-{kind}")
+        remaining = _int_header(headers, f"x-ratelimit-remaining-{kind}")
+        if limit and remaining is not None:
+            fractions.append(max(0.0, remaining / limit))
+    return min(fractions) if fractions else None
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status == 429 or type(exc).__name__ == "RateLimitError"
+
+
+class AimdController:
+    """Korraga töös olevate toodete aken (additive increase, multiplicative decrease)."""
+
+    def __init__(
+        self,
+        initial: int = 2,
+        minimum: int = 1,
+        maximum: int = 16,
+        decrease: float = 0.5,
+        latency_factor: float = 2.0,
+        headroom: float = 0.1,
+    ) -> None:
+        self.minimum = max(1, int(minimum))
+        self.maximum = max(self.minimum, int(maximum))
+        self.window = float(min(self.maximum, max(self.minimum, int(initial))))
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.headroom = headroom
+        self.latency_ewma: Optional[float] = None
+        self.latency_floor: Optional[float] = None
+        self.successes = 0
+        self.throttles = 0
+        self.errors = 0
+        self._cooldown_until = 0.0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        return max(self.minimum, min(self.maximum, int(self.window)))
+
+    def wait_ready(self) -> None:
+        """Oota (töölõimes), kuni 429 järgne paus on läbi."""
+        while True:
+            with self._lock:
+                delay = self._cooldown_until - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(min(delay, 5.0))
+
+    def on_success(self, latency: float, headers: Optional[Mapping[str, Any]] = None) -> None:
+        with self._lock:
+            self.successes += 1
+            latency = max(0.0, float(latency))
+            if self.latency_ewma is None:
+                self.latency_ewma = latency
+            else:
+                self.latency_ewma += LATENCY_ALPHA * (latency - self.latency_ewma)
+            if self.latency_floor is None or self.latency_ewma < self.latency_floor:
+                self.latency_floor = self.latency_ewma
+
+            fraction = remaining_fraction(headers)
+            if fraction is not None and fraction <= 0.0:
+                self._cool_down(retry_after(headers))
+                self._decrease()
+                return
+            if fraction is not None and fraction < self.headroom:
+                return
+            if self.latency_floor and self.latency_ewma > self.latency_floor * self.latency_factor:
+                return
+            self.window = min(float(self.maximum), self.window + 1.0 / max(1.0, self.window))
+
+    def on_exception(self, exc: BaseException) -> None:
+        with self._lock:
+            if is_rate_limited(exc):
+                self.throttles += 1
+                self._cool_down(retry_after(getattr(getattr(exc, "response", None), "headers", None)))
+                self._decrease()
+            else:
+                self.errors += 1
+
+    def _cool_down(self, seconds: Optional[float]) -> None:
+        until = time.monotonic() + (seconds if seconds is not None else DEFAULT_COOLDOWN_SECONDS)
+        self._cooldown_until = max(self._cooldown_until, until)
+
+    def _decrease(self) -> None:
+        # Üks vähendus korraga töös olevate kutsete "ringi" kohta: samaaegsed
+        # 429-d ei tohi akent kohe miinimumini kukutada.
+        now = time.monotonic()
+        if now - self._last_decrease < max(DEFAULT_COOLDOWN_SECONDS, self.latency_ewma or 0.0):
+            return
+        self._last_decrease = now
+        self.window = max(float(self.minimum), self.window * self.decrease)
+
+    def summary(self) -> str:
+        latency = f"{self.latency_ewma:.1f}s" if self.latency_ewma is not None else "-"
+        return (
+            f"aken {self.limit}/{self.maximum}, latentsus {latency}, "
+            f"õnnestunud kutseid {self.successes}, 429: {self.throttles}, vigu {self.errors}"
+        )
+
+
+class ThroughputMeter:
+    """Valminud tooted minutis."""
+
+    def __init__(self, horizon: float = 300.0) -> None:
+        self.horizon = horizon
+        self.started = time.monotonic()
+        self.total = 0
+        self._marks: Deque[float] = deque()
+        self._lock = threading.Lock()
+
+    def mark(self, count: int = 1) -> None:
+        if count <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self.total += count
+            self._marks.extend([now] * count)
+            self._trim(now)
+
+    def _trim(self, now: float) -> None:
+        while self._marks and now - self._marks[0] > self.horizon:
+            self._marks.popleft()
+
+    def per_minute(self) -> float:
+        """Viimase ``horizon`` sekundi kiirus."""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            span = min(self.horizon, now - self.started)
+            return len(self._marks) * 60.0 / span if span > 0 else 0.0
+
+    def overall_per_minute(self) -> float:
+        span = time.monotonic() - self.started
+        return self.total * 60.0 / span if span > 0 else 0.0
+
+
+def run_adaptive(
+    items: Iterable[Any],
+    worker: Callable[[Any, int], Any],
+    on_done: Callable[[Any], None],
+    controller: AimdController,
+    meter: ThroughputMeter,
+    log: Callable[[str], None],
+    status_every: float = 60.0,
+) -> int:
+    """Töötle ``items`` kuni ``controller.limit`` kaupa korraga; tagastab sisendite arvu.
+
+    ``worker(item, index)`` jookseb lõimes; ``on_done(future)`` kutsutakse
+    iga valminud töö kohta (``future.result()`` annab tulemuse või tõstab vea).
+    """
+    return asyncio.run(_run_adaptive(items, worker, on_done, controller, meter, log, status_every))
+
+
+async def _run_adaptive(
+    items: Iterable[Any],
+    worker: Callable[[Any, int], Any],
+    on_done: Callable[[Any], None],
+    controller: AimdController,
+    meter: ThroughputMeter,
+    log: Callable[[str], None],
+    status_every: float,
+) -> int:
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=controller.maximum, thread_name_prefix="aimd")
+    source = enumerate(items)
+    pending: Set[asyncio.Future] = set()
+    submitted = 0
+    exhausted = False
+    next_status = time.monotonic() + status_every
+    try:
+        while True:
+            while not exhausted and len(pending) < controller.limit:
+                try:
+                    index, item = next(source)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending.add(loop.run_in_executor(executor, worker, item, index))
+                submitted += 1
+            if not pending:
+                break
+            timeout = max(0.1, next_status - time.monotonic())
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for fut in done:
+                on_done(fut)
+            if time.monotonic() >= next_status:
+                next_status = time.monotonic() + status_every
+                log(
+                    f"↻ Töös {len(pending)} toodet ({controller.summary()}); "
+                    f"tooteid/min {meter.per_minute():.1f} (keskmine {meter.overall_per_minute():.1f}, kokku {meter.total})"
+                )
+    finally:
+        executor.shutdown(wait=True)
+    return submitted
@@ -0,0 +1,595 @@
+#!/usr/bin/env python3
+"""Töövoo artefaktide (JSON väljundite) kirjutamine.
+
+``JsonlJournal`` on lisamisega (append-only) JSONL päevik: iga kirje on üks
+rida, ``fsync`` tehakse iga ``fsync_every`` kirje järel ja sulgemisel. Nii on
+kirjutatud baitide hulk jooksu jooksul lineaarne (mitte O(n²) nagu kogu
+JSON faili ülekirjutamisel pärast iga toodet).
+
+``compact_journal`` liidab päeviku olemasoleva list-formaadis JSON failiga
+(SKU järgi, duplikaadid jäetakse vahele), kirjutab tulemuse atomaarselt ja
+kustutab päeviku; ``compact_grouped_journal`` teeb sama grupeeritud failiga.
+Katkenud jooksu järel piisab sama funktsiooni käivitamisest: päeviku poolik
+viimane rida jäetakse lihtsalt vahele.
+
+Suured artefaktid (2. sammu list-formaadis väljund ja 4. sammu grupeeritud
+``products_translated_grouped.json``) kirjutatakse ``write_list_artifact`` /
+``write_grouped_artifact`` kaudu: vaikimisi kompaktselt, iga toode eraldi
+real; ``DROPXL_JSON_PRETTY=1`` korral baidihaaval sama, mis
+``json.dump(..., indent=2)`` (vt json_codec.py). Kirjutamise käigus
+salvestatakse kõrvale väike indeks ``<fail>.idx.json``: iga toote SKU, EAN, grupp ja baidinihe
+failis. ``load_sku_index`` loeb SKU-de kontrolliks ainult indeksi; kui see
+puudub või ei vasta faili suurusele/muutmisajale (fail kirjutati mujal üle),
+ehitatakse indeks faili voogedastusega lugedes uuesti.
+
+Lugemiseks on ``iter_products`` (tooted ükshaaval, mõlemast formaadist),
+``iter_groups`` (grupp + toodete iteraator) ja ``read_artifact_items``
+(tooted indeksi baidinihete järgi). Fail loetakse puhvrina
+(``READ_CHUNK`` märki korraga) ``json.JSONDecoder.raw_decode`` abil, seega
+mälus on korraga üks toode, mitte kogu fail.
+
+Kasutavad ``2_Samm_tooteinfo_from_feed.py``, ``4_samm_CHATGPT_katsetus.py``,
+``5_Samm_toodete_yleslaadimine.py``, ``category_change_runner.py`` ja
+``cleanup_translated_products.py``.
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Set, TextIO, Tuple, Union
+
+from json_codec import dumps, dumps_bytes, pretty_default, write_json
+
+FSYNC_EVERY = 25
+INDEX_SUFFIX = ".idx.json"
+INDEX_VERSION = 1
+READ_CHUNK = 1 << 16
+INDENT_BYTES = b"  "
+EAN_META_KEY = "_bp_gtin13"
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_DECODER = json.JSONDecoder()
+
+
+class JsonlJournal:
+    """Append-only JSONL päevik partiidena tehtava ``fsync``-iga.
+
+    ``on_sync`` kutsutakse pärast iga ``fsync``-i, nt jooksu kontrollpunkti
+    salvestamiseks alles siis, kui kirjed on kettal.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        fsync_every: int = FSYNC_EVERY,
+        on_sync: Optional[Callable[[], None]] = None,
+    ) -> None:
+        self.path = path
+        self.fsync_every = max(1, int(fsync_every))
+        self.on_sync = on_sync
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh: Optional[TextIO] = self.path.open("a", encoding="utf-8")
+        self._pending = 0
+        self.written = 0
+
+    def __enter__(self) -> "JsonlJournal":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def append(self, record: Dict[str, Any]) -> None:
+        if self._fh is None:
+            raise ValueError(f"Journal is closed: {self.path}")
+        self._fh.write(dumps(record) + "\n")
+        self._fh.flush()
+        self.written += 1
+        self._pending += 1
+        if self._pending >= self.fsync_every:
+            self.sync()
+
+    def sync(self) -> None:
+        if self._fh is None:
+            return
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._pending = 0
+        if self.on_sync is not None:
+            self.on_sync()
+
+    def close(self) -> None:
+        if self._fh is None:
+            return
+        self.sync()
+        self._fh.close()
+        self._fh = None
+
+
+def iter_journal(path: Path) -> Iterator[Dict[str, Any]]:
+    """Päeviku kirjed; vigased/poolikud read (nt katkestuse järel) jäetakse vahele."""
+    if not path.exists():
+        return
+    with path.open("r", encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict):
+                yield record
+
+
+def load_list_json(path: Path) -> List[Dict[str, Any]]:
+    if not path.exists():
+        return []
+    try:
+        with path.open("r", encoding="utf-8") as fh:
+            data = json.load(fh)
+    except Exception:
+        return []
+    if not isinstance(data, list):
+        return []
+    return [item for item in data if isinstance(item, dict)]
+
+
+def write_json_atomic(path: Path, data: Any) -> None:
+    """Väike inimloetav JSON (nt jooksu manifest), ``fsync``-iga."""
+    write_json(path, data, pretty=True, fsync=True)
+
+
+def compact_journal(journal_path: Path, output_path: Path) -> int:
+    """Liida päevik list-formaadis väljundisse ja kustuta päevik.
+
+    Olemasolevad SKU-d võetakse väljundi indeksist ning väljund kirjutatakse
+    ümber voona (kogu faili ei loeta mällu). Tagastab väljundi kirjete arvu.
+    """
+    index = load_sku_index(output_path)
+    if not journal_path.exists():
+        return len(index)
+    seen = index.skus()
+    added: List[Dict[str, Any]] = []
+    for record in iter_journal(journal_path):
+        sku = str(record.get("sku") or "").strip()
+        if sku and sku in seen:
+            continue
+        seen.add(sku)
+        added.append(record)
+    count = len(index)
+    if added or not output_path.exists():
+        existing = (item for _, _, item in _scan_artifact(output_path) if isinstance(item, dict))
+        count = write_list_artifact(output_path, _chain(existing, added))
+    journal_path.unlink()
+    return count
+
+
+def compact_grouped_journal(journal_path: Path, output_path: Path) -> int:
+    """Liida päevik (kirjed ``{"group": ..., "product": ...}``) grupeeritud väljundisse.
+
+    Uued tooted lisatakse oma grupi lõppu (uued grupid faili lõppu), juba
+    olemas olevad SKU-d jäetakse vahele. Väljund kirjutatakse ümber voona.
+    Tagastab lisatud toodete arvu.
+    """
+    if not journal_path.exists():
+        return 0
+    seen = load_sku_index(output_path).skus()
+    added: Dict[str, List[Dict[str, Any]]] = {}
+    count = 0
+    for record in iter_journal(journal_path):
+        product = record.get("product")
+        if not isinstance(product, dict):
+            continue
+        sku = str(product.get("sku") or "").strip()
+        if sku and sku in seen:
+            continue
+        seen.add(sku)
+        added.setdefault(str(record.get("group") or ""), []).append(product)
+        count += 1
+
+    def _groups() -> Iterator[Tuple[str, Iterable[Dict[str, Any]]]]:
+        for group, items in iter_groups(output_path):
+            yield group, _chain(items, added.pop(group, []))
+        yield from added.items()
+
+    if count or not output_path.exists():
+        write_grouped_artifact(output_path, _groups())
+    journal_path.unlink()
+    return count
+
+
+def _chain(*parts: Iterable[Any]) -> Iterator[Any]:
+    for part in parts:
+        yield from part
+
+
+@dataclass(frozen=True)
+class IndexEntry:
+    sku: str
+    ean: str
+    group: str
+    offset: int
+
+
+class SkuIndex:
+    """Artefakti kõrvalindeks: SKU -> ``IndexEntry`` (EAN, grupp, baidinihe)."""
+
+    def __init__(self, entries: Iterable[IndexEntry] = ()) -> None:
+        self.entries: List[IndexEntry] = list(entries)
+        self.by_sku: Dict[str, IndexEntry] = {entry.sku: entry for entry in self.entries if entry.sku}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, sku: object) -> bool:
+        return sku in self.by_sku
+
+    def get(self, sku: str) -> Optional[IndexEntry]:
+        return self.by_sku.get(sku)
+
+    def skus(self) -> Set[str]:
+        return set(self.by_sku)
+
+    def groups(self) -> Dict[str, str]:
+        """SKU -> grupp (nagu 4. sammu ``index_existing_skus``)."""
+        return {sku: entry.group for sku, entry in self.by_sku.items()}
+
+    def eans(self) -> Dict[str, str]:
+        """EAN -> SKU; sama EAN-i korral jääb esimene (nagu 4. sammu ``index_existing_eans``)."""
+        out: Dict[str, str] = {}
+        for entry in self.entries:
+            if entry.ean and entry.ean not in out:
+                out[entry.ean] = entry.sku
+        return out
+
+    def offsets_by_group(self) -> Dict[str, List[int]]:
+        """Grupp -> toodete baidinihked failis (faili järjekorras)."""
+        out: Dict[str, List[int]] = {}
+        for entry in self.entries:
+            out.setdefault(entry.group, []).append(entry.offset)
+        return out
+
+
+def index_path(path: Path) -> Path:
+    return path.with_name(path.name + INDEX_SUFFIX)
+
+
+def _item_ean(item: Mapping[str, Any]) -> str:
+    for entry in item.get("meta_data") or []:
+        if isinstance(entry, dict) and str(entry.get("key") or "").strip() == EAN_META_KEY:
+            value = str(entry.get("value") or "").strip()
+            if value:
+                return value
+    return str(item.get("global_unique_id") or "").strip()
+
+
+def _index_entry(item: Any, group: str, offset: int) -> Optional[IndexEntry]:
+    if not isinstance(item, dict):
+        return None
+    return IndexEntry(str(item.get("sku") or "").strip(), _item_ean(item), group, offset)
+
+
+class _OffsetWriter:
+    """Kirjutab UTF-8 baite ja peab arvet baidinihke üle."""
+
+    def __init__(self, fh: BinaryIO) -> None:
+        self.fh = fh
+        self.offset = 0
+
+    def write(self, data: bytes) -> None:
+        self.fh.write(data)
+        self.offset += len(data)
+
+
+def _write_value(out: _OffsetWriter, value: Any, depth: int, pretty: bool) -> None:
+    data = dumps_bytes(value, pretty)
+    if pretty and depth:
+        data = data.replace(b"\n", b"\n" + INDENT_BYTES * depth)
+    out.write(data)
+
+
+def _write_items(
+    out: _OffsetWriter,
+    items: Iterable[Any],
+    depth: int,
+    group: str,
+    entries: List[IndexEntry],
+    pretty: bool,
+) -> int:
+    """JSON massiiv sügavusel ``depth``; tagastab elementide arvu.
+
+    Loetav kuju on sama mis ``json.dump(indent=2)``; kompaktses kujus on iga
+    element eraldi real ilma taandeta.
+    """
+    count = 0
+    pad = b"\n" + INDENT_BYTES * (depth + 1) if pretty else b"\n"
+    out.write(b"[")
+    for item in items:
+        out.write(pad if count == 0 else b"," + pad)
+        entry = _index_entry(item, group, out.offset)
+        if entry is not None:
+            entries.append(entry)
+        _write_value(out, item, depth + 1, pretty)
+        count += 1
+    if count == 0:
+        out.write(b"]")
+    else:
+        out.write(b"\n" + (INDENT_BYTES * depth if pretty else b"") + b"]")
+    return count
+
+
+def _write_artifact(path: Path, kind: str, write_body: Callable[[_OffsetWriter, List[IndexEntry]], int]) -> int:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    entries: List[IndexEntry] = []
+    with tmp.open("wb") as fh:
+        count = write_body(_OffsetWriter(fh), entries)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+    _write_index(path, kind, entries)
+    return count
+
+
+def write_list_artifact(path: Path, items: Iterable[Any], pretty: Optional[bool] = None) -> int:
+    """Kirjuta list-formaadis artefakt atomaarselt koos SKU indeksiga; tagastab kirjete arvu.
+
+    ``pretty=None`` korral valib kuju ``json_codec.pretty_default()``.
+    """
+    pretty = pretty_default() if pretty is None else pretty
+    return _write_artifact(path, "list", lambda out, entries: _write_items(out, items, 0, "", entries, pretty))
+
+
+def write_grouped_artifact(
+    path: Path,
+    groups: Union[Mapping[str, Any], Iterable[Tuple[str, Any]]],
+    pretty: Optional[bool] = None,
+) -> int:
+    """Kirjuta grupeeritud (grupp -> tooted) artefakt atomaarselt koos SKU indeksiga.
+
+    ``groups`` võib olla dict või (grupp, toodete iteraator) paaride voog; voo
+    korral ei pea tooted korraga mälus olema.
+    """
+    pretty = pretty_default() if pretty is None else pretty
+    pairs = groups.items() if isinstance(groups, Mapping) else groups
+    key_prefix = b"\n" + INDENT_BYTES if pretty else b"\n"
+    key_sep = b": " if pretty else b":"
+
+    def body(out: _OffsetWriter, entries: List[IndexEntry]) -> int:
+        count = 0
+        written = 0
+        out.write(b"{")
+        for group, items in pairs:
+            out.write((key_prefix if written == 0 else b"," + key_prefix) + dumps_bytes(str(group)) + key_sep)
+            if isinstance(items, (dict, str, int, float, bool)) or items is None:
+                _write_value(out, items, 1, pretty)
+            else:
+                count += _write_items(out, items, 1, str(group), entries, pretty)
+            written += 1
+        out.write(b"}" if written == 0 else b"\n}")
+        return count
+
+    return _write_artifact(path, "grouped", body)
+
+
+def _write_index(path: Path, kind: str, entries: List[IndexEntry]) -> None:
+    stat = path.stat()
+    payload = {
+        "version": INDEX_VERSION,
+        "format": kind,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "entries": [[e.sku, e.ean, e.group, e.offset] for e in entries],
+    }
+    write_json(index_path(path), payload, pretty=False)
+
+
+def _read_index(path: Path) -> Optional[SkuIndex]:
+    target = index_path(path)
+    if not target.exists():
+        return None
+    try:
+        data = json.loads(target.read_text(encoding="utf-8"))
+        stat = path.stat()
+    except Exception:
+        return None
+    if not isinstance(data, dict) or data.get("version") != INDEX_VERSION:
+        return None
+    if data.get("size") != stat.st_size or data.get("mtime_ns") != stat.st_mtime_ns:
+        return None
+    try:
+        return SkuIndex(IndexEntry(str(sku), str(ean), str(group), int(offset)) for sku, ean, group, offset in data["entries"])
+    except Exception:
+        return None
+
+
+def load_sku_index(path: Path) -> SkuIndex:
+    """Artefakti SKU indeks kõrvalfailist; aegunud/puuduva indeksi korral ehitatakse see uuesti."""
+    if not path.exists():
+        return SkuIndex()
+    index = _read_index(path)
+    if index is not None:
+        return index
+    entries: List[IndexEntry] = []
+    kind = "list"
+    try:
+        for group, offset, item in _scan_artifact(path):
+            if group is not None:
+                kind = "grouped"
+            entry = _index_entry(item, group or "", offset)
+            if entry is not None:
+                entries.append(entry)
+    except Exception:
+        return SkuIndex()
+    try:
+        _write_index(path, kind, entries)
+    except OSError:
+        pass
+    return SkuIndex(entries)
+
+
+def artifact_skus(path: Path) -> Set[str]:
+    """Artefakti kõik SKU-d (indeksi kaudu, ilma tooteid parsimata)."""
+    return load_sku_index(path).skus()
+
+
+class _Scanner:
+    """JSON teksti järkjärguline lugeja, mis teab iga väärtuse baidinihet."""
+
+    def __init__(self, fh: TextIO, offset: int = 0) -> None:
+        self.fh = fh
+        self.buf = ""
+        self.pos = 0
+        self.offset = offset  # buf[pos] baidinihe failis
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.fh.read(max(READ_CHUNK, len(self.buf) - self.pos))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _advance(self, end: int) -> None:
+        segment = self.buf[self.pos:end]
+        self.offset += len(segment) if segment.isascii() else len(segment.encode("utf-8"))
+        self.pos = end
+
+    def peek(self) -> str:
+        """Järgmine mitte-tühik märk (seda tarbimata); faili lõpus ``""``."""
+        while True:
+            self._advance(_WHITESPACE.match(self.buf, self.pos).end())
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def take(self) -> str:
+        ch = self.peek()
+        if ch:
+            self._advance(self.pos + 1)
+        return ch
+
+    def expect(self, ch: str) -> None:
+        got = self.take()
+        if got != ch:
+            raise ValueError(f"Expected {ch!r}, got {got!r} at byte {self.offset}")
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # Puhvri lõppu ulatuv number võib olla poolik.
+            if end == len(self.buf) and self._fill():
+                continue
+            self._advance(end)
+            return value
+
+    def items(self) -> Iterator[Tuple[int, Any]]:
+        """JSON massiivi elemendid kujul (baidinihe, väärtus); ``[`` on juba loetud."""
+        if self.peek() == "]":
+            self.take()
+            return
+        while True:
+            self.peek()
+            offset = self.offset
+            yield offset, self.value()
+            ch = self.take()
+            if ch == "]":
+                return
+            if ch != ",":
+                raise ValueError(f"Expected ',' or ']', got {ch!r} at byte {self.offset}")
+
+
+def _scan_groups(path: Path) -> Iterator[Tuple[Optional[str], Iterator[Tuple[int, Any]]]]:
+    """Artefakti grupid kujul (grupp, elementide iteraator).
+
+    List-formaadi korral on üks grupp ``None``. Kui tarbija grupi elemente
+    lõpuni ei loe, loetakse need enne järgmist gruppi vahele.
+    """
+    if not path.exists():
+        return
+    with path.open("r", encoding="utf-8", newline="") as fh:
+        scanner = _Scanner(fh)
+        head = scanner.take()
+        if head == "[":
+            yield None, scanner.items()
+            return
+        if head != "{":
+            raise ValueError(f"{path}: expected a JSON list or object")
+        if scanner.peek() == "}":
+            return
+        while True:
+            group = str(scanner.value())
+            scanner.expect(":")
+            if scanner.peek() == "[":
+                scanner.take()
+                items = scanner.items()
+                yield group, items
+                for _ in items:
+                    pass
+            else:
+                # Grupi väärtus, mis pole list, jäetakse vahele.
+                scanner.value()
+            ch = scanner.take()
+            if ch == "}":
+                return
+            if ch != ",":
+                raise ValueError(f"Expected ',' or '}}', got {ch!r} at byte {scanner.offset}")
+
+
+def _scan_artifact(path: Path) -> Iterator[Tuple[Optional[str], int, Any]]:
+    """Artefakti elemendid kujul (grupp, baidinihe, toode); list-formaadis on grupp ``None``."""
+    for group, items in _scan_groups(path):
+        for offset, item in items:
+            yield group, offset, item
+
+
+def iter_products(path: Path) -> Iterator[Dict[str, Any]]:
+    """Tooted ükshaaval nii list- kui grupeeritud formaadist.
+
+    Mälus on korraga ainult lugemispuhver ja parajasti loetav toode.
+    """
+    for _, _, item in _scan_artifact(path):
+        if isinstance(item, dict):
+            yield item
+
+
+def iter_groups(path: Path) -> Iterator[Tuple[str, Iterator[Dict[str, Any]]]]:
+    """Grupeeritud artefakti grupid (ka tühjad) koos toodete iteraatoriga."""
+    for group, items in _scan_groups(path):
+        yield group or "", (item for _, item in items if isinstance(item, dict))
+
+
+def read_artifact_items(path: Path, offsets: Iterable[int]) -> Iterator[Any]:
+    """Loe artefaktist tooted indeksi baidinihete järgi (fail avatakse üks kord)."""
+    with path.open("rb") as raw:
+        for offset in offsets:
+            raw.seek(offset)
+            fh = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+            try:
+                yield _Scanner(fh, offset).value()
+            finally:
+                fh.detach()
+
+
+def read_artifact_item(path: Path, offset: int) -> Any:
+    """Loe artefaktist üks toode indeksi baidinihke järgi."""
+    for item in read_artifact_items(path, (offset,)):
+        return item
+    return None
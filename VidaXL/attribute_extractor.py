@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Feedi atribuutide (``Properties`` HTML + lisaveerud) kiire eraldamine.
+
+``AttributeExtractor`` teeb sama, mida varem ``_parse_properties``/``_add_attr``
+2. sammus, kuid:
+
+- regulaaravaldised on eelkompileeritud ja sildita ``<li>`` sisu ei lähe
+  HTML-i puhastusest läbi;
+- nimede ümbernimetamine ja jah/ei, pakk/alus väärtused on tabelites;
+- normaliseeritud nimed ja väärtused hoitakse internitud vahemälus, sest
+  samad nimed ("Värv", "Materjal") ja väärtused korduvad feedis tuhandeid
+  kordi ning ``clean_vidaxl`` jookseb iga erineva stringi kohta üks kord.
+
+Kasutab ``2_Samm_tooteinfo_from_feed.py``.
+"""
+
+from __future__ import annotations
+
+import re
+import sys
+from typing import Any, Dict, Iterable, List, Mapping, Tuple
+
+VIDAXL_PATTERN = re.compile(r"\bvida\s*x[l]?\b", re.IGNORECASE)
+WHITESPACE_PATTERN = re.compile(r"\s{2,}")
+LI_PATTERN = re.compile(r"<li>(.*?)</li>", re.IGNORECASE | re.DOTALL)
+TAG_PATTERN = re.compile(r"<[^>]+>")
+
+FIELD_COLUMNS: Tuple[str, ...] = (
+    "Color",
+    "Gender",
+    "Diameter",
+    "Size",
+    "Parcel_or_pallet",
+    "Number_of_packages",
+    "Product_volume",
+)
+NAME_MAP: Dict[str, str] = {
+    "size": "Suurus",
+    "parcel_or_pallet": "Pakkimise tüüp",
+}
+PARCEL_KEY = "parcel_or_pallet"
+PARCEL_VALUES: Dict[str, str] = {"parcel": "pakk", "pallet": "alus"}
+BOOLEAN_VALUES: Dict[str, str] = {"yes": "Jah", "no": "Ei"}
+CACHE_LIMIT = 200_000
+
+
+def clean_vidaxl(text: str) -> str:
+    cleaned = VIDAXL_PATTERN.sub("", text)
+    cleaned = WHITESPACE_PATTERN.sub(" ", cleaned)
+    return cleaned.strip()
+
+
+class AttributeExtractor:
+    """Rea atribuudid kujul ``[{"name": ..., "values": [...]}, ...]``."""
+
+    def __init__(self, fields: Iterable[str] = FIELD_COLUMNS, cache_limit: int = CACHE_LIMIT) -> None:
+        self.fields = tuple(fields)
+        self.cache_limit = cache_limit
+        # toores nimi -> (nime võti, normaliseeritud nimi)
+        self._names: Dict[str, Tuple[str, str]] = {}
+        # (kas pakkimise tüüp, toores väärtus) -> normaliseeritud väärtus
+        self._values: Dict[Tuple[bool, str], str] = {}
+
+    def _name(self, raw: str) -> Tuple[str, str]:
+        cached = self._names.get(raw)
+        if cached is not None:
+            return cached
+        raw_name = raw.strip()
+        key = raw_name.lower().replace(" ", "_")
+        result = (key, sys.intern(clean_vidaxl(NAME_MAP.get(key, raw_name))))
+        if len(self._names) < self.cache_limit:
+            self._names[raw] = result
+        return result
+
+    def _value(self, parcel: bool, raw: str) -> str:
+        cache_key = (parcel, raw)
+        cached = self._values.get(cache_key)
+        if cached is not None:
+            return cached
+        raw_value = raw.strip()
+        if parcel:
+            raw_value = PARCEL_VALUES.get(raw_value.lower(), raw_value)
+        value = clean_vidaxl(raw_value)
+        value = sys.intern(BOOLEAN_VALUES.get(value.lower(), value))
+        if len(self._values) < self.cache_limit:
+            self._values[cache_key] = value
+        return value
+
+    def _add(self, attr_map: Dict[str, List[str]], raw_name: str, raw_value: str) -> None:
+        key, name = self._name(raw_name)
+        value = self._value(key == PARCEL_KEY, raw_value)
+        if not name or not value:
+            return
+        bucket = attr_map.setdefault(name, [])
+        if value not in bucket:
+            bucket.append(value)
+
+    def extract(self, row: Mapping[str, Any]) -> List[Dict[str, Any]]:
+        attr_map: Dict[str, List[str]] = {}
+        props = row.get("Properties")
+        if props:
+            for item in LI_PATTERN.findall(str(props)):
+                clean = TAG_PATTERN.sub("", item).strip() if "<" in item else item.strip()
+                if not clean:
+                    continue
+                key, sep, val = clean.partition(":")
+                if sep:
+                    self._add(attr_map, key, val)
+                else:
+                    self._add(attr_map, clean, "Yes")
+
+        for field in self.fields:
+            value = row.get(field)
+            if not value:
+                continue
+            value = str(value).strip()
+            if value:
+                self._add(attr_map, field, value)
+
+        return [{"name": name, "values": values} for name, values in attr_map.items() if values]
+
+    def cache_stats(self) -> Dict[str, int]:
+        return {"names": len(self._names), "values": len(self._values)}
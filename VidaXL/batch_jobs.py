@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""Partiitöö (OpenAI Batch API) režiim 4. sammu jaoks.
+
+Suure tööjärjekorra puhul pole interaktiivset latentsust vaja: STEP 2+3
+päringud kirjutatakse tööfaili, saadetakse Batch API-sse (umbes poole
+odavam, valmib kuni 24h jooksul) ja tulemused liidetakse hiljem sama
+järeltöötlusega nagu tavajooksus.
+
+Töö kaust ``data/batch/<töö>/``:
+
+- ``requests.jsonl`` – üks päring rea kohta (``custom_id`` = ``<sku>::<samm>``);
+- ``job.json`` – olek: partii ID, sisend-/väljundfailide ID-d, staatus,
+  kas tulemused on liidetud;
+- ``results.jsonl`` – allalaaditud väljund- ja veafaili read.
+
+Liitmata töö jätkub järgmisel käivitusel (päringuid uuesti ei koguta).
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Mapping, Optional, Tuple
+
+from json_codec import dumps, write_json
+from response_cache import StoredResponse
+
+ENDPOINT = "/v1/responses"
+COMPLETION_WINDOW = "24h"
+JOB_FILE = "job.json"
+REQUESTS_FILE = "requests.jsonl"
+RESULTS_FILE = "results.jsonl"
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+# Batch API-s määrab teenustaseme partii ise; ajalõpp on kliendi seade.
+DROPPED_KEYS = {"timeout", "service_tier"}
+
+
+class BatchDeferred(Exception):
+    """Kutse lükati partiitöösse (kogumisel) või partiil pole sellele vastust (liitmisel)."""
+
+
+def custom_id(sku: str, step_key: str) -> str:
+    return f"{sku}::{step_key}"
+
+
+def request_body(kwargs: Mapping[str, Any]) -> Dict[str, Any]:
+    """``responses.create`` argumendid Batch API päringu kehaks."""
+    return {key: value for key, value in kwargs.items() if value is not None and key not in DROPPED_KEYS}
+
+
+class BatchJob:
+    """Ühe partiitöö kaust ja olek."""
+
+    def __init__(self, path: Path, state: Optional[Dict[str, Any]] = None) -> None:
+        self.path = path
+        self.state: Dict[str, Any] = state or {}
+
+    @property
+    def requests_path(self) -> Path:
+        return self.path / REQUESTS_FILE
+
+    @property
+    def results_path(self) -> Path:
+        return self.path / RESULTS_FILE
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["BatchJob"]:
+        try:
+            with (path / JOB_FILE).open("r", encoding="utf-8") as fh:
+                state = json.load(fh)
+        except Exception:
+            return None
+        return cls(path, state) if isinstance(state, dict) else None
+
+    def save(self) -> None:
+        write_json(self.path / JOB_FILE, self.state, pretty=True)
+
+
+def new_job(root: Path, prefix: str = "step4") -> BatchJob:
+    path = root / f"{prefix}_{datetime.now().strftime('%Y-%m-%d_%H%M%S')}"
+    path.mkdir(parents=True, exist_ok=True)
+    return BatchJob(path, {"created_at": datetime.now().isoformat(timespec="seconds"), "merged": False})
+
+
+def pending_job(root: Path) -> Optional[BatchJob]:
+    """Viimane liitmata töö (kui on)."""
+    if not root.exists():
+        return None
+    for path in sorted((p for p in root.iterdir() if p.is_dir()), reverse=True):
+        job = BatchJob.load(path)
+        if job and not job.state.get("merged"):
+            return job
+    return None
+
+
+def write_requests(job: BatchJob, requests: Mapping[str, Mapping[str, Any]]) -> int:
+    count = 0
+    with job.requests_path.open("w", encoding="utf-8") as fh:
+        for cid, body in requests.items():
+            fh.write(dumps({"custom_id": cid, "method": "POST", "url": ENDPOINT, "body": body}) + "\n")
+            count += 1
+    job.state["requests"] = count
+    job.save()
+    return count
+
+
+def submit(client: Any, job: BatchJob) -> str:
+    """Lae tööfail üles ja loo partii; tagastab partii ID."""
+    with job.requests_path.open("rb") as fh:
+        uploaded = client.files.create(file=fh, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=uploaded.id,
+        endpoint=ENDPOINT,
+        completion_window=COMPLETION_WINDOW,
+    )
+    job.state.update({"input_file_id": uploaded.id, "batch_id": batch.id, "status": batch.status})
+    job.save()
+    return batch.id
+
+
+def _counts(batch: Any) -> str:
+    counts = getattr(batch, "request_counts", None)
+    if not counts:
+        return ""
+    return f" ({getattr(counts, 'completed', 0)}/{getattr(counts, 'total', 0)}, vigu {getattr(counts, 'failed', 0)})"
+
+
+def poll(client: Any, job: BatchJob, interval: float, log: Callable[[str], None]) -> str:
+    """Oota, kuni partii jõuab lõppolekusse; tagastab staatuse."""
+    last = None
+    while True:
+        batch = client.batches.retrieve(job.state["batch_id"])
+        status = str(batch.status)
+        progress = f"{status}{_counts(batch)}"
+        if progress != last:
+            log(f"↻ Partii {job.state['batch_id']}: {progress}")
+            last = progress
+        job.state.update({
+            "status": status,
+            "output_file_id": getattr(batch, "output_file_id", None),
+            "error_file_id": getattr(batch, "error_file_id", None),
+        })
+        job.save()
+        if status in TERMINAL_STATUSES:
+            return status
+        time.sleep(max(1.0, interval))
+
+
+def download_results(client: Any, job: BatchJob) -> int:
+    """Lae väljund- ja veafail ``results.jsonl``-i; tagastab ridade arvu."""
+    lines = 0
+    tmp = job.results_path.with_name(job.results_path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as out:
+        for key in ("output_file_id", "error_file_id"):
+            file_id = job.state.get(key)
+            if not file_id:
+                continue
+            text = client.files.content(file_id).text
+            for line in text.splitlines():
+                if line.strip():
+                    out.write(line.strip() + "\n")
+                    lines += 1
+    tmp.replace(job.results_path)
+    return lines
+
+
+def _iter_results(job: BatchJob) -> Iterator[Dict[str, Any]]:
+    if not job.results_path.exists():
+        return
+    with job.results_path.open("r", encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and record.get("custom_id"):
+                yield record
+
+
+def load_results(job: BatchJob) -> Tuple[Dict[str, StoredResponse], Dict[str, str]]:
+    """``custom_id`` -> vastus ja ``custom_id`` -> veateade."""
+    responses: Dict[str, StoredResponse] = {}
+    errors: Dict[str, str] = {}
+    for record in _iter_results(job):
+        cid = str(record["custom_id"])
+        response = record.get("response") or {}
+        body = response.get("body") if isinstance(response, dict) else None
+        if isinstance(body, dict) and response.get("status_code") == 200 and not record.get("error"):
+            responses[cid] = StoredResponse(body)
+            continue
+        error = record.get("error") or (body or {}).get("error") or {}
+        message = error.get("message") if isinstance(error, dict) else str(error)
+        errors[cid] = str(message or f"HTTP {response.get('status_code')}")
+    return responses, errors
@@ -21,11 +21,21 @@ import argparse
 import json
 import os
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 import requests
 from dotenv import find_dotenv, load_dotenv
 
+from artifact_io import (
+    iter_groups,
+    iter_products,
+    load_sku_index,
+    read_artifact_items,
+    write_grouped_artifact,
+    write_list_artifact,
+)
+from json_codec import write_json
+
 ROOT = Path(__file__).resolve().parent
 CATEGORY_TRANSLATION_PATH = ROOT / "category_translation.json"
 CATEGORY_CATALOG_PATH = ROOT / "data" / "category_catalog.json"
@@ -83,6 +93,9 @@ DEFAULT_MAPS: List[Tuple[str, str]] = [
     ("Tervis ja ilu", "Sport ja vaba aeg > Tervis ja ilu"),
 ]
 
+PATH_SEP = " > "
+MapsLike = Union[Iterable[Tuple[str, str]], "CategoryMapper"]
+
 
 def log(msg: str) -> None:
     print(msg)
@@ -121,16 +134,95 @@ def replace_prefix(path: str, old: str, new: str) -> str:
     return path
 
 
-def apply_maps_to_path(path: str, maps: List[Tuple[str, str]]) -> str:
-    # Sort by old-path length descending so more specific paths match first
-    sorted_maps = sorted(maps, key=lambda m: len(m[0]), reverse=True)
-    updated = path
-    for old, new in sorted_maps:
-        updated = replace_prefix(updated, old, new)
-    return updated
+class _MapNode:
+    __slots__ = ("children", "rules")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, "_MapNode"] = {}
+        # (rank, new) pairs for maps whose old path ends at this node
+        self.rules: List[Tuple[int, str]] = []
+
+
+class CategoryMapper:
+    """Compiled (old, new) category maps.
+
+    The maps are stored in a segment trie keyed on ``" > "`` path parts, so a
+    rewrite costs O(path depth) instead of O(len(maps)). Semantics match the
+    original linear pass: maps are tried longest-old-path first (stable for
+    ties) and a rewritten path is still subject to the remaining, shorter maps.
+    """
+
+    def __init__(self, maps: Iterable[Tuple[str, str]]) -> None:
+        self.maps: List[Tuple[str, str]] = [(str(old), str(new)) for old, new in maps]
+        self._root = _MapNode()
+        ordered = sorted(self.maps, key=lambda m: len(m[0]), reverse=True)
+        for rank, (old, new) in enumerate(ordered):
+            node = self._root
+            for part in old.split(PATH_SEP):
+                node = node.children.setdefault(part, _MapNode())
+            node.rules.append((rank, new))
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        return iter(self.maps)
+
+    def __len__(self) -> int:
+        return len(self.maps)
+
+    def _next_rule(self, parts: List[str], after: int) -> Optional[Tuple[int, int, str]]:
+        best: Optional[Tuple[int, int, str]] = None
+        node = self._root
+        for depth, part in enumerate(parts, start=1):
+            node = node.children.get(part)
+            if node is None:
+                break
+            for rank, new in node.rules:
+                if rank > after and (best is None or rank < best[0]):
+                    best = (rank, depth, new)
+        return best
+
+    def apply(self, path: str) -> str:
+        if not path:
+            return path
+        updated = path
+        after = -1
+        while True:
+            parts = updated.split(PATH_SEP)
+            found = self._next_rule(parts, after)
+            if found is None:
+                return updated
+            after, depth, new = found
+            updated = PATH_SEP.join([new] + parts[depth:])
+
+
+_COMPILED_MAPS: Dict[Tuple[Tuple[str, str], ...], CategoryMapper] = {}
+
+
+def compile_maps(maps: MapsLike) -> CategoryMapper:
+    """Return a (cached) ``CategoryMapper`` for the given map list."""
+    if isinstance(maps, CategoryMapper):
+        return maps
+    key = tuple((str(old), str(new)) for old, new in maps)
+    mapper = _COMPILED_MAPS.get(key)
+    if mapper is None:
+        mapper = CategoryMapper(key)
+        _COMPILED_MAPS[key] = mapper
+    return mapper
+
+
+def apply_maps_to_path(path: str, maps: MapsLike) -> str:
+    return compile_maps(maps).apply(path)
+
+
+DEFAULT_MAPPER = compile_maps(DEFAULT_MAPS)
 
 
-def update_category_translation(maps: List[Tuple[str, str]], dry_run: bool) -> int:
+def _path_prefixes(path: str) -> Iterator[str]:
+    parts = path.split(PATH_SEP)
+    for depth in range(1, len(parts) + 1):
+        yield PATH_SEP.join(parts[:depth])
+
+
+def update_category_translation(maps: MapsLike, dry_run: bool) -> int:
     if not CATEGORY_TRANSLATION_PATH.exists():
         log(f"⚠️ {CATEGORY_TRANSLATION_PATH} not found")
         return 0
@@ -162,31 +254,36 @@ def update_category_translation(maps: List[Tuple[str, str]], dry_run: bool) -> i
             continue
         new_data[old] = new
         changed += 1
+    # Keys by path prefix, so each map only visits keys under its new path
+    keys_by_prefix: Dict[str, List[str]] = {}
+    for key in new_data:
+        for prefix in _path_prefixes(key):
+            keys_by_prefix.setdefault(prefix, []).append(key)
     for old, new in maps:
         if old == new:
             continue
-        new_prefix = f"{new} > "
-        for key, val in list(new_data.items()):
-            if key == new or key.startswith(new_prefix):
-                suffix = key[len(new):]
-                old_key = f"{old}{suffix}"
-                if new_data.get(old_key):
-                    continue
-                new_data[old_key] = key
-                changed += 1
+        for key in list(keys_by_prefix.get(new, [])):
+            suffix = key[len(new):]
+            old_key = f"{old}{suffix}"
+            if new_data.get(old_key):
+                continue
+            if old_key not in new_data:
+                for prefix in _path_prefixes(old_key):
+                    keys_by_prefix.setdefault(prefix, []).append(old_key)
+            new_data[old_key] = key
+            changed += 1
     for key, val in list(new_data.items()):
         if val == key:
             new_data[key] = ""
             changed += 1
     if not dry_run and changed:
         ordered = dict(sorted(new_data.items(), key=lambda kv: kv[0].lower()))
-        with CATEGORY_TRANSLATION_PATH.open("w", encoding="utf-8") as fh:
-            json.dump(ordered, fh, ensure_ascii=False, indent=2)
+        write_json(CATEGORY_TRANSLATION_PATH, ordered, pretty=True)
     log(f"category_translation.json: changed={changed}")
     return changed
 
 
-def update_category_catalog(maps: List[Tuple[str, str]], dry_run: bool) -> int:
+def update_category_catalog(maps: MapsLike, dry_run: bool) -> int:
     if not CATEGORY_CATALOG_PATH.exists():
         log(f"⚠️ {CATEGORY_CATALOG_PATH} not found")
         return 0
@@ -209,13 +306,12 @@ def update_category_catalog(maps: List[Tuple[str, str]], dry_run: bool) -> int:
                 item["name"] = parts[-1]
                 item["level"] = len(parts)
     if not dry_run and changed:
-        with CATEGORY_CATALOG_PATH.open("w", encoding="utf-8") as fh:
-            json.dump(data, fh, ensure_ascii=False, indent=2)
+        write_json(CATEGORY_CATALOG_PATH, data, pretty=True)
     log(f"category_catalog.json: changed={changed}")
     return changed
 
 
-def _update_product_category_fields(cat_obj: Dict[str, Any], maps: List[Tuple[str, str]]) -> bool:
+def _update_product_category_fields(cat_obj: Dict[str, Any], maps: MapsLike) -> bool:
     changed = False
     path = str(cat_obj.get("path") or "")
     translated = str(cat_obj.get("translated_path") or "")
@@ -237,79 +333,91 @@ def _update_product_category_fields(cat_obj: Dict[str, Any], maps: List[Tuple[st
     return changed
 
 
-def update_products_grouped(maps: List[Tuple[str, str]], dry_run: bool) -> int:
+def _update_product_item(item: Dict[str, Any], maps: MapsLike) -> int:
+    """Uuenda toote ``category`` ja ``categories[0].name``; tagastab muudatuste arvu."""
+    changed = 0
+    cat_obj = item.get("category") or {}
+    if isinstance(cat_obj, dict):
+        if _update_product_category_fields(cat_obj, maps):
+            changed += 1
+        item["category"] = cat_obj
+    categories = item.get("categories")
+    if isinstance(categories, list) and categories:
+        leaf = (cat_obj.get("leaf_name") or "") if isinstance(cat_obj, dict) else ""
+        if leaf:
+            try:
+                if isinstance(categories[0], dict) and categories[0].get("name") != leaf:
+                    categories[0]["name"] = leaf
+                    changed += 1
+            except Exception:
+                pass
+    return changed
+
+
+def _mapped_items(items: Iterable[Dict[str, Any]], maps: MapsLike) -> Iterator[Dict[str, Any]]:
+    for item in items:
+        _update_product_item(item, maps)
+        yield item
+
+
+def update_products_grouped(maps: MapsLike, dry_run: bool) -> int:
+    """Uuenda grupeeritud tõlgete faili kategooriad voona.
+
+    Esimene läbimine loeb muudatused kokku ja jätab meelde uute gruppide
+    järjekorra; kui midagi muutub, kirjutatakse fail teisel läbimisel ümber,
+    lugedes tooted SKU indeksi baidinihete järgi (ümbernimetatud grupid võivad
+    kokku sulada), nii et kogu fail pole korraga mälus.
+    """
     if not PRODUCTS_TRANSLATED_GROUPED_PATH.exists():
         log(f"⚠️ {PRODUCTS_TRANSLATED_GROUPED_PATH} not found")
         return 0
-    with PRODUCTS_TRANSLATED_GROUPED_PATH.open("r", encoding="utf-8") as fh:
-        data = json.load(fh)
-    if not isinstance(data, dict):
+    changed = 0
+    sources_by_group: Dict[str, List[str]] = {}
+    try:
+        for group_key, items in iter_groups(PRODUCTS_TRANSLATED_GROUPED_PATH):
+            new_group_key = apply_maps_to_path(str(group_key), maps)
+            sources_by_group.setdefault(new_group_key, []).append(group_key)
+            if new_group_key != group_key:
+                changed += 1
+            for item in items:
+                changed += _update_product_item(item, maps)
+    except ValueError:
         log("⚠️ products_translated_grouped.json is not a dict")
         return 0
-    changed = 0
-    new_groups: Dict[str, List[Dict[str, Any]]] = {}
-    for group_key, items in data.items():
-        new_group_key = apply_maps_to_path(str(group_key), maps)
-        group_list = new_groups.setdefault(new_group_key, [])
-        if new_group_key != group_key:
-            changed += 1
-        for item in items or []:
-            if not isinstance(item, dict):
-                continue
-            cat_obj = item.get("category") or {}
-            if isinstance(cat_obj, dict):
-                if _update_product_category_fields(cat_obj, maps):
-                    changed += 1
-                item["category"] = cat_obj
-            categories = item.get("categories")
-            if isinstance(categories, list) and categories:
-                leaf = (cat_obj.get("leaf_name") or "") if isinstance(cat_obj, dict) else ""
-                if leaf:
-                    try:
-                        if isinstance(categories[0], dict) and categories[0].get("name") != leaf:
-                            categories[0]["name"] = leaf
-                            changed += 1
-                    except Exception:
-                        pass
-            group_list.append(item)
     if not dry_run and changed:
-        with PRODUCTS_TRANSLATED_GROUPED_PATH.open("w", encoding="utf-8") as fh:
-            json.dump(new_groups, fh, ensure_ascii=False, indent=2)
+        offsets = load_sku_index(PRODUCTS_TRANSLATED_GROUPED_PATH).offsets_by_group()
+        new_groups = (
+            (
+                new_group_key,
+                _mapped_items(
+                    read_artifact_items(
+                        PRODUCTS_TRANSLATED_GROUPED_PATH,
+                        [offset for group_key in group_keys for offset in offsets.get(group_key, [])],
+                    ),
+                    maps,
+                ),
+            )
+            for new_group_key, group_keys in sources_by_group.items()
+        )
+        write_grouped_artifact(PRODUCTS_TRANSLATED_GROUPED_PATH, new_groups)
     log(f"products_translated_grouped.json: changed={changed}")
     return changed
 
 
-def update_step2_output(maps: List[Tuple[str, str]], dry_run: bool) -> int:
+def update_step2_output(maps: MapsLike, dry_run: bool) -> int:
     if not STEP2_OUTPUT_PATH.exists():
         log(f"⚠️ {STEP2_OUTPUT_PATH} not found")
         return 0
-    with STEP2_OUTPUT_PATH.open("r", encoding="utf-8") as fh:
-        data = json.load(fh)
-    if not isinstance(data, list):
+    changed = 0
+    try:
+        for item in iter_products(STEP2_OUTPUT_PATH):
+            changed += _update_product_item(item, maps)
+    except ValueError:
         log("⚠️ 2_samm_tooteinfo.json is not a list")
         return 0
-    changed = 0
-    for item in data:
-        if not isinstance(item, dict):
-            continue
-        cat_obj = item.get("category") or {}
-        if isinstance(cat_obj, dict):
-            if _update_product_category_fields(cat_obj, maps):
-                changed += 1
-            item["category"] = cat_obj
-        categories = item.get("categories")
-        if isinstance(categories, list) and categories:
-            leaf = (cat_obj.get("leaf_name") or "") if isinstance(cat_obj, dict) else ""
-            if leaf:
-                try:
-                    if isinstance(categories[0], dict) and categories[0].get("name") != leaf:
-                        categories[0]["name"] = leaf
-                        changed += 1
-                except Exception:
-                    pass
     if not dry_run and changed:
-        with STEP2_OUTPUT_PATH.open("w", encoding="utf-8") as fh:
-            json.dump(data, fh, ensure_ascii=False, indent=2)
+        # Teine läbimine: voog failist tagasi samasse faili (kirjutamine käib ajutisse faili).
+        write_list_artifact(STEP2_OUTPUT_PATH, _mapped_items(iter_products(STEP2_OUTPUT_PATH), maps))
     log(f"2_samm_tooteinfo.json: changed={changed}")
     return changed
 
@@ -540,7 +648,7 @@ def ensure_category_path(site: str, auth: Tuple[str, str], path: str, cat_by_pat
     return current_parent
 
 
-def update_woo_categories(maps: List[Tuple[str, str]], dry_run: bool) -> None:
+def update_woo_categories(maps: MapsLike, dry_run: bool) -> None:
     site, auth = wc_site_and_auth()
     if not site or not auth:
         log("⚠️ Woo auth missing, skipping Woo updates")
@@ -630,7 +738,7 @@ def parse_args() -> argparse.Namespace:
 def main() -> int:
     load_dotenv(find_dotenv(), override=False)
     args = parse_args()
-    maps = parse_maps(args.map) if args.map else DEFAULT_MAPS
+    maps = compile_maps(parse_maps(args.map) if args.map else DEFAULT_MAPS)
     dry_run = bool(args.dry_run)
 
     if not args.skip_translation:
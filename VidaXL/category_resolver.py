@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Feedi kategooriate tõlge ja välistamine, vahemäluga.
+
+Feedis on ~100k rida, kuid erinevaid ``Category`` väärtusi vaid mõni tuhat.
+``CategoryResolver`` arvutab iga erineva toore raja kohta ühe korra välja
+tõlgitud raja (``category_translation.json`` + ``DEFAULT_MAPS``), lehe nime
+ja välistamise lipu ning hoiab tulemust piiratud suurusega LRU vahemälus.
+Tabamuste ja möödalaskmiste loendurid on ``stats()`` kaudu nähtavad.
+
+Kasutab ``2_Samm_tooteinfo_from_feed.py``.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Mapping
+
+from category_change_runner import MapsLike, compile_maps
+
+CACHE_SIZE = 8192
+
+
+@dataclass(frozen=True)
+class ResolvedCategory:
+    path: str
+    translated_path: str
+    leaf_name: str
+    excluded: bool
+
+
+def _is_path_under(path: str, root: str) -> bool:
+    if not path or not root:
+        return False
+    return path == root or path.startswith(f"{root} >")
+
+
+class CategoryResolver:
+    """Toore feedi kategooria -> ``ResolvedCategory`` (LRU vahemäluga)."""
+
+    def __init__(
+        self,
+        translations: Mapping[str, str],
+        maps: MapsLike,
+        excluded_roots: Iterable[str] = (),
+        maxsize: int = CACHE_SIZE,
+    ) -> None:
+        self.translations = translations
+        self.mapper = compile_maps(maps)
+        self.excluded_roots = list(excluded_roots)
+        self.maxsize = max(1, int(maxsize))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._cache: "OrderedDict[str, ResolvedCategory]" = OrderedDict()
+
+    def _compute(self, path: str) -> ResolvedCategory:
+        translated = self.translations.get(path) or path
+        translated = self.mapper.apply(translated)
+        leaf = ""
+        if translated:
+            parts = [p.strip() for p in translated.split(">") if p.strip()]
+            if parts:
+                leaf = parts[-1]
+        excluded = any(
+            _is_path_under(path, root) or _is_path_under(translated, root) for root in self.excluded_roots
+        )
+        return ResolvedCategory(path=path, translated_path=translated, leaf_name=leaf, excluded=excluded)
+
+    def resolve(self, raw_path: str) -> ResolvedCategory:
+        path = str(raw_path or "").strip()
+        cached = self._cache.get(path)
+        if cached is not None:
+            self.hits += 1
+            self._cache.move_to_end(path)
+            return cached
+        self.misses += 1
+        resolved = self._compute(path)
+        self._cache[path] = resolved
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+        return resolved
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._cache),
+        }
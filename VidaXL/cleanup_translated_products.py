@@ -1,6 +1,8 @@
 import json
 from pathlib import Path
 
+from artifact_io import artifact_skus, write_grouped_artifact
+
 BASE = Path(__file__).resolve().parent
 INPUT_FILE = BASE / "2_samm_tooteinfo.json"
 TRANSLATED_FILE = BASE / "data" / "tõlgitud" / "products_translated_grouped.json"
@@ -12,10 +14,7 @@ def main() -> None:
     if not TRANSLATED_FILE.exists():
         raise FileNotFoundError(f"Missing translated file: {TRANSLATED_FILE}")
 
-    with INPUT_FILE.open("r", encoding="utf-8") as f:
-        products = json.load(f)
-
-    skus = {str(p.get("sku")) for p in products if p.get("sku")}
+    skus = artifact_skus(INPUT_FILE)
 
     with TRANSLATED_FILE.open("r", encoding="utf-8") as f:
         grouped = json.load(f)
@@ -30,8 +29,7 @@ def main() -> None:
             cleaned[cat] = kept_items
             kept += len(kept_items)
 
-    with TRANSLATED_FILE.open("w", encoding="utf-8") as f:
-        json.dump(cleaned, f, ensure_ascii=False, indent=2)
+    write_grouped_artifact(TRANSLATED_FILE, cleaned)
 
     print(f"Kept products: {kept}")
     print(f"Categories left: {len(cleaned)}")
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""Per-SKU muudatused kahe järjestikuse feedi versiooni vahel.
+
+Iga feedi ja tarbija (``consumer``, nt 1. samm või stock runner) kohta
+hoitakse viimati töödeldud versiooni hetktõmmist
+(``data/feeds/snapshots/<feed>.<tarbija>.json``): SKU -> ülejäänud veergude räsi,
+laoseis, B2B hind ja e-poe hind. Uue versiooni järel arvutatakse delta (lisatud, eemaldatud ja
+muutunud SKU-d koos muutunud veergude nimedega) ning kirjutatakse see faili
+``data/feeds/deltas/<feed>.<tarbija>.json``. Nii saavad Woo sync ja mapingu samm
+töödelda ainult muutunud SKU-sid; iga tarbija kursor liigub eraldi, seega ei
+"tarbi" üks teise deltat ära.
+
+``commit=False`` korral jäetakse hetktõmmis (kursor) kirjutamata, kuni tarbija
+kutsub pärast edukat töötlust ``commit_feed_delta(delta)``; katkenud töö
+korral saab järgmine käivitus sama delta uuesti.
+
+Laoseisu ja hindade muutused nimetatakse alati; muude veergude muutused
+nimetatakse täpselt, kui eelmise versiooni feedi vahemälu (``feed_store.py``)
+on veel alles, muidu märgitakse need ``OTHER_COLUMNS`` abil.
+
+Kasutus:
+    delta = update_feed_delta(OFFER_FEED_PATH, OFFER_FEED_COLUMNS, consumer="stock_runner", commit=False)
+    for sku in delta.touched_skus(): ...
+    commit_feed_delta(delta)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from feed_reader import FEEDS_DIR, resolve_main_feed
+from feed_store import MAIN_FEED_COLUMNS, SKU_COLUMN, FeedStore, feed_name, open_feed_store
+
+SNAPSHOT_DIR = FEEDS_DIR / "snapshots"
+DELTA_DIR = FEEDS_DIR / "deltas"
+
+TRACKED_COLUMNS: List[str] = ["Stock", "B2B price", "Webshop price"]
+OTHER_COLUMNS = "other"
+DEFAULT_CONSUMER = "step1"
+
+
+@dataclass
+class FeedDelta:
+    feed: str
+    from_hash: str
+    to_hash: str
+    initial: bool = False
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    changed: Dict[str, List[str]] = field(default_factory=dict)
+    created_at: str = ""
+    # Kirjutamata hetktõmmis (fail, sisu), kui delta arvutati ``commit=False`` korral.
+    pending: Optional[Tuple[Path, Dict[str, Any]]] = field(default=None, repr=False, compare=False)
+
+    @property
+    def unchanged(self) -> bool:
+        return not self.initial and not (self.added or self.removed or self.changed)
+
+    def touched_skus(self) -> Set[str]:
+        return set(self.added) | set(self.removed) | set(self.changed)
+
+    def counts(self) -> Dict[str, int]:
+        return {"added": len(self.added), "removed": len(self.removed), "changed": len(self.changed)}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "feed": self.feed,
+            "from_hash": self.from_hash,
+            "to_hash": self.to_hash,
+            "initial": self.initial,
+            "created_at": self.created_at,
+            "counts": self.counts(),
+            "added": self.added,
+            "removed": self.removed,
+            "changed": self.changed,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FeedDelta":
+        return cls(
+            feed=str(data.get("feed") or ""),
+            from_hash=str(data.get("from_hash") or ""),
+            to_hash=str(data.get("to_hash") or ""),
+            initial=bool(data.get("initial")),
+            added=[str(s) for s in data.get("added") or []],
+            removed=[str(s) for s in data.get("removed") or []],
+            changed={str(k): list(v) for k, v in (data.get("changed") or {}).items()},
+            created_at=str(data.get("created_at") or ""),
+        )
+
+
+def _row_hash(row: Dict[str, str], columns: Sequence[str]) -> str:
+    joined = "\x1f".join(row.get(c, "") for c in columns)
+    return hashlib.sha1(joined.encode("utf-8")).hexdigest()[:16]
+
+
+def build_snapshot(store: FeedStore) -> Dict[str, List[str]]:
+    """SKU -> [ülejäänud veergude räsi, laoseis, B2B hind, e-poe hind]."""
+    columns = [c for c in store.columns if c not in TRACKED_COLUMNS]
+    skus: Dict[str, List[str]] = {}
+    for row in store.iter_rows():
+        sku = row.get(SKU_COLUMN, "")
+        if not sku:
+            continue
+        skus[sku] = [_row_hash(row, columns)] + [row.get(c, "") for c in TRACKED_COLUMNS]
+    return skus
+
+
+def _snapshot_path(feed: str, snapshot_dir: Path, consumer: str = DEFAULT_CONSUMER) -> Path:
+    return snapshot_dir / f"{feed}.{consumer}.json"
+
+
+def delta_path(feed: str, delta_dir: Path = DELTA_DIR, consumer: str = DEFAULT_CONSUMER) -> Path:
+    return delta_dir / f"{feed}.{consumer}.json"
+
+
+def load_snapshot(
+    feed: str,
+    snapshot_dir: Path = SNAPSHOT_DIR,
+    consumer: str = DEFAULT_CONSUMER,
+) -> Optional[Dict[str, Any]]:
+    path = _snapshot_path(feed, snapshot_dir, consumer)
+    if not path.exists():
+        return None
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+    return data if isinstance(data, dict) and isinstance(data.get("skus"), dict) else None
+
+
+def _write_json(path: Path, data: Any) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    tmp.replace(path)
+
+
+def _previous_store(snapshot: Dict[str, Any]) -> Optional[FeedStore]:
+    path = Path(str(snapshot.get("store_path") or ""))
+    if not path.name or not path.exists():
+        return None
+    try:
+        return FeedStore(path)
+    except Exception:
+        return None
+
+
+def compute_delta(
+    previous: Optional[Dict[str, Any]],
+    current: Dict[str, List[str]],
+    store: FeedStore,
+    feed: str,
+) -> FeedDelta:
+    delta = FeedDelta(
+        feed=feed,
+        from_hash=str((previous or {}).get("feed_hash") or ""),
+        to_hash=store.feed_hash,
+        created_at=datetime.now().isoformat(timespec="seconds"),
+    )
+    if previous is None:
+        delta.initial = True
+        delta.added = sorted(current)
+        return delta
+
+    old_skus: Dict[str, List[str]] = previous["skus"]
+    delta.added = sorted(sku for sku in current if sku not in old_skus)
+    delta.removed = sorted(sku for sku in old_skus if sku not in current)
+    old_store = _previous_store(previous)
+    try:
+        for sku, entry in current.items():
+            old = old_skus.get(sku)
+            if old is None or old == entry:
+                continue
+            cols = [c for i, c in enumerate(TRACKED_COLUMNS, start=1) if old[i] != entry[i]]
+            if old[0] != entry[0]:
+                old_row = old_store.get(sku) if old_store else None
+                if old_row is None:
+                    cols.append(OTHER_COLUMNS)
+                else:
+                    new_row = store.get(sku) or {}
+                    cols.extend(
+                        c
+                        for c in store.columns
+                        if c not in TRACKED_COLUMNS and old_row.get(c, "") != new_row.get(c, "")
+                    )
+            delta.changed[sku] = cols
+    finally:
+        if old_store:
+            old_store.close()
+    return delta
+
+
+def update_feed_delta(
+    feed_path: Optional[Path] = None,
+    columns: Sequence[str] = MAIN_FEED_COLUMNS,
+    snapshot_dir: Path = SNAPSHOT_DIR,
+    delta_dir: Path = DELTA_DIR,
+    consumer: str = DEFAULT_CONSUMER,
+    commit: bool = True,
+) -> FeedDelta:
+    """Võrdle feedi praegust versiooni tarbija viimase hetktõmmisega ja salvesta delta.
+
+    Kui feedi räsi pole tarbija eelmisest korrast muutunud, tagastatakse tühi
+    delta ning hetktõmmist ega delta faili ei kirjutata üle. ``commit=False``
+    korral kirjutatakse hetktõmmis alles ``commit_feed_delta()`` kutsel.
+    """
+    path = resolve_main_feed(feed_path)
+    feed = feed_name(path)
+    previous = load_snapshot(feed, snapshot_dir, consumer)
+    with open_feed_store(path, columns) as store:
+        if previous and previous.get("feed_hash") == store.feed_hash:
+            return FeedDelta(
+                feed=feed,
+                from_hash=store.feed_hash,
+                to_hash=store.feed_hash,
+                created_at=datetime.now().isoformat(timespec="seconds"),
+            )
+        current = build_snapshot(store)
+        delta = compute_delta(previous, current, store, feed)
+        _write_json(delta_path(feed, delta_dir, consumer), delta.to_dict())
+        delta.pending = (
+            _snapshot_path(feed, snapshot_dir, consumer),
+            {
+                "feed": feed,
+                "consumer": consumer,
+                "feed_hash": store.feed_hash,
+                "store_path": str(store.path),
+                "created_at": delta.created_at,
+                "skus": current,
+            },
+        )
+    if commit:
+        commit_feed_delta(delta)
+    return delta
+
+
+def commit_feed_delta(delta: FeedDelta) -> bool:
+    """Liiguta tarbija kursor delta feedi versioonile (kirjuta hetktõmmis)."""
+    if delta.pending is None:
+        return False
+    path, snapshot = delta.pending
+    _write_json(path, snapshot)
+    delta.pending = None
+    return True
+
+
+def load_latest_delta(
+    feed: str,
+    delta_dir: Path = DELTA_DIR,
+    consumer: str = DEFAULT_CONSUMER,
+) -> Optional[FeedDelta]:
+    path = delta_path(feed, delta_dir, consumer)
+    if not path.exists():
+        return None
+    try:
+        return FeedDelta.from_dict(json.loads(path.read_text(encoding="utf-8")))
+    except Exception:
+        return None
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""VidaXL CSV feedi lugemine otse ZIP-ist.
+
+Main feed loetakse ``vidaXL_ee_dropshipping.csv.zip`` failist voona
+(``ZipFile.open`` + ``io.TextIOWrapper``), ilma et CSV-d oleks vaja kettale
+lahti pakkida. Lahtipakitud koopia (``1_Samm ... --extract``) on ainult
+valikuline vahemälu: kui ZIP puudub, kasutatakse seda.
+
+Kasutavad ``0_Samm_kategooriad.py`` ja ``2_Samm_tooteinfo_from_feed.py``.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional, TextIO
+from zipfile import ZipFile
+
+ROOT = Path(__file__).resolve().parent
+FEEDS_DIR = ROOT / "data" / "feeds"
+MAIN_ZIP_PATH = FEEDS_DIR / "vidaXL_ee_dropshipping.csv.zip"
+MAIN_EXTRACTED_CSV = FEEDS_DIR / "vidaXL_ee_dropshipping" / "vidaXL_ee_dropshipping.csv"
+
+
+def resolve_main_feed(path: Optional[Path] = None) -> Path:
+    """Leia main feedi fail: antud rada, ZIP või lahtipakitud CSV (selles järjekorras)."""
+    if path is not None:
+        if not path.exists():
+            raise FileNotFoundError(f"Feed not found: {path}")
+        return path
+    for candidate in (MAIN_ZIP_PATH, MAIN_EXTRACTED_CSV):
+        if candidate.exists():
+            return candidate
+    raise FileNotFoundError(f"Feed not found: {MAIN_ZIP_PATH}")
+
+
+def _zip_csv_member(zf: ZipFile, path: Path) -> str:
+    members = [name for name in zf.namelist() if name.lower().endswith(".csv")]
+    if not members:
+        raise FileNotFoundError(f"No CSV member in {path}")
+    preferred = path.name[: -len(".zip")] if path.name.lower().endswith(".zip") else ""
+    for name in members:
+        if Path(name).name == preferred:
+            return name
+    return members[0]
+
+
+@contextmanager
+def open_feed_text(path: Path) -> Iterator[TextIO]:
+    """Ava feed tekstivoona; ZIP-i puhul loetakse CSV liiget otse arhiivist."""
+    if path.suffix.lower() == ".zip":
+        with ZipFile(path, "r") as zf:
+            member = _zip_csv_member(zf, path)
+            with zf.open(member, "r") as raw:
+                with io.TextIOWrapper(raw, encoding="utf-8", newline="") as fh:
+                    yield fh
+        return
+    with path.open("r", encoding="utf-8", newline="") as fh:
+        yield fh
+
+
+def iter_feed_rows(path: Optional[Path] = None) -> Iterator[Dict[str, str]]:
+    """Tagasta feedi read ``csv.DictReader`` sõnastikena."""
+    feed_path = resolve_main_feed(path)
+    with open_feed_text(feed_path) as fh:
+        yield from csv.DictReader(fh)
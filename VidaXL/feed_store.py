@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""Indekseeritud feedi vahemälu (üks SQLite fail feedi versiooni kohta).
+
+Iga allalaetud feedi versioon teisendatakse üks kord kompaktseks SQLite
+failiks ``data/feeds/store/<feed>-<räsi>-<veerud>.sqlite``. Failis on ainult need
+veerud, mida töövoog kasutab (``MAIN_FEED_COLUMNS``/``OFFER_FEED_COLUMNS``),
+ning indeksid SKU, EAN-i ja kategooria järgi. Räsi tuleb feedi manifestist
+(``feed_sync.py``), nii et sama feedi korduval lugemisel CSV-d enam ei parsita.
+
+Kasutavad ``0_Samm_kategooriad.py``, ``2_Samm_tooteinfo_from_feed.py`` ja
+``DropXL_stock_loop_runner.py``.
+"""
+
+from __future__ import annotations
+
+import csv
+import hashlib
+import os
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from feed_reader import FEEDS_DIR, open_feed_text, resolve_main_feed
+from feed_sync import file_sha256, load_manifest
+
+STORE_DIR = FEEDS_DIR / "store"
+KEEP_VERSIONS = 2
+
+SKU_COLUMN = "SKU"
+EAN_COLUMN = "EAN"
+CATEGORY_COLUMN = "Category"
+
+MAIN_FEED_COLUMNS: List[str] = [
+    "SKU",
+    "EAN",
+    "Stock",
+    "B2B price",
+    "Webshop price",
+    "Product_title",
+    "Title",
+    "Link",
+    "HTML_description",
+    "Description",
+    "Category",
+    "Category_id",
+    "Category_id_path",
+    "Brand",
+    "Weight",
+    "Properties",
+    "Color",
+    "Gender",
+    "Diameter",
+    "Size",
+    "Parcel_or_pallet",
+    "Number_of_packages",
+    "Product_volume",
+] + [f"Image {i}" for i in range(1, 15)] + ["image 13"]
+
+OFFER_FEED_COLUMNS: List[str] = ["SKU", "EAN", "Stock", "B2B price", "Webshop price"]
+
+
+def feed_hash(path: Path) -> str:
+    """Feedi SHA-256: manifestist, kui kirje klapib failiga, muidu arvutatakse."""
+    try:
+        size = path.stat().st_size
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Feed not found: {path}")
+    for entry in load_manifest().values():
+        if str(entry.get("path") or "") != str(path):
+            continue
+        if int(entry.get("size") or -1) == size and entry.get("sha256"):
+            return str(entry["sha256"])
+    return file_sha256(path)
+
+
+def feed_name(path: Path) -> str:
+    name = path.name
+    for suffix in (".zip", ".csv"):
+        if name.lower().endswith(suffix):
+            name = name[: -len(suffix)]
+    return name
+
+
+class FeedStore:
+    """Ühe feedi versiooni kirjutuskaitstud vaade.
+
+    Read tagastatakse sõnastikena (veerunimi -> väärtus), nagu ``csv.DictReader``;
+    tühjad väärtused jäetakse välja.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        meta = dict(self.conn.execute("SELECT key, value FROM meta"))
+        self.feed_hash = meta.get("feed_hash", "")
+        self.source = meta.get("source", "")
+        self.columns: List[str] = [
+            name for (name,) in self.conn.execute("SELECT name FROM columns ORDER BY pos")
+        ]
+        self._col_sql = {name: f"c{pos}" for pos, name in enumerate(self.columns)}
+
+    def __enter__(self) -> "FeedStore":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __len__(self) -> int:
+        return int(self.conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0])
+
+    def _select(self, columns: Optional[Sequence[str]]) -> tuple[List[str], str]:
+        names = [c for c in (columns or self.columns) if c in self._col_sql]
+        cols_sql = ", ".join(["idx"] + [self._col_sql[c] for c in names])
+        return names, cols_sql
+
+    def _rows(self, names: List[str], cursor: Iterable[tuple]) -> Iterator[Dict[str, str]]:
+        for record in cursor:
+            yield {name: val for name, val in zip(names, record[1:]) if val}
+
+    def iter_rows(self, columns: Optional[Sequence[str]] = None) -> Iterator[Dict[str, str]]:
+        """Kõik read feedi järjekorras; ``columns`` piirab loetavaid veerge."""
+        names, cols_sql = self._select(columns)
+        yield from self._rows(names, self.conn.execute(f"SELECT {cols_sql} FROM rows ORDER BY idx"))
+
+    def iter_indexed(self, columns: Optional[Sequence[str]] = None) -> Iterator[tuple[int, Dict[str, str]]]:
+        """Nagu ``iter_rows``, kuid koos rea indeksiga (0-põhine, feedi järjekord)."""
+        names, cols_sql = self._select(columns)
+        for record in self.conn.execute(f"SELECT {cols_sql} FROM rows ORDER BY idx"):
+            yield int(record[0]), {name: val for name, val in zip(names, record[1:]) if val}
+
+    def iter_distinct(self, columns: Sequence[str]) -> Iterator[Dict[str, str]]:
+        """Veergude erinevad väärtuskombinatsioonid esmaesinemise järjekorras.
+
+        Grupeerimine tehakse SQLite-is, Pythonisse tuuakse ainult unikaalsed
+        kombinatsioonid (nt kategooriateede jaoks tuhanded, mitte kõik read).
+        """
+        names = [c for c in columns if c in self._col_sql]
+        if not names:
+            return
+        group_sql = ", ".join(self._col_sql[c] for c in names)
+        cursor = self.conn.execute(
+            f"SELECT MIN(idx) AS first, {group_sql} FROM rows GROUP BY {group_sql} ORDER BY first"
+        )
+        yield from self._rows(names, cursor)
+
+    def row(self, idx: int) -> Optional[Dict[str, str]]:
+        names, cols_sql = self._select(None)
+        found = list(self._rows(names, self.conn.execute(f"SELECT {cols_sql} FROM rows WHERE idx = ?", (idx,))))
+        return found[0] if found else None
+
+    def get(self, sku: str) -> Optional[Dict[str, str]]:
+        """Rida SKU järgi (indeksiga, ilma feedi läbi lugemata)."""
+        col = self._col_sql.get(SKU_COLUMN)
+        if not col or not sku:
+            return None
+        names, cols_sql = self._select(None)
+        cursor = self.conn.execute(f"SELECT {cols_sql} FROM rows WHERE {col} = ? ORDER BY idx LIMIT 1", (sku,))
+        found = list(self._rows(names, cursor))
+        return found[0] if found else None
+
+    def find_by_ean(self, ean: str) -> List[Dict[str, str]]:
+        col = self._col_sql.get(EAN_COLUMN)
+        if not col or not ean:
+            return []
+        names, cols_sql = self._select(None)
+        return list(self._rows(names, self.conn.execute(f"SELECT {cols_sql} FROM rows WHERE {col} = ? ORDER BY idx", (ean,))))
+
+    def iter_category(self, category: str, columns: Optional[Sequence[str]] = None) -> Iterator[Dict[str, str]]:
+        col = self._col_sql.get(CATEGORY_COLUMN)
+        if not col:
+            return
+        names, cols_sql = self._select(columns)
+        yield from self._rows(names, self.conn.execute(f"SELECT {cols_sql} FROM rows WHERE {col} = ? ORDER BY idx", (category,)))
+
+
+def _build_store(feed_path: Path, target: Path, digest: str, columns: Sequence[str]) -> None:
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(target.name + ".tmp")
+    if tmp.exists():
+        tmp.unlink()
+    conn = sqlite3.connect(str(tmp))
+    try:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        with open_feed_text(feed_path) as fh:
+            reader = csv.reader(fh)
+            header = next(reader, [])
+            positions = {name: i for i, name in enumerate(header)}
+            used = [c for c in columns if c in positions]
+            col_defs = ", ".join(f"c{i} TEXT" for i in range(len(used)))
+            conn.execute(f"CREATE TABLE rows (idx INTEGER PRIMARY KEY{', ' + col_defs if col_defs else ''})")
+            conn.execute("CREATE TABLE columns (pos INTEGER PRIMARY KEY, name TEXT)")
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.executemany("INSERT INTO columns VALUES (?, ?)", list(enumerate(used)))
+            src = [positions[c] for c in used]
+            width = len(header)
+            placeholders = ", ".join("?" for _ in range(len(used) + 1))
+
+            def records() -> Iterator[tuple]:
+                for idx, raw in enumerate(reader):
+                    if len(raw) < width:
+                        raw = raw + [""] * (width - len(raw))
+                    yield (idx, *[(raw[p].strip() or None) for p in src])
+
+            conn.executemany(f"INSERT INTO rows VALUES ({placeholders})", records())
+        for name in (SKU_COLUMN, EAN_COLUMN, CATEGORY_COLUMN):
+            if name in used:
+                conn.execute(f"CREATE INDEX ix_{name.lower()} ON rows (c{used.index(name)})")
+        conn.executemany(
+            "INSERT INTO meta VALUES (?, ?)",
+            [
+                ("feed_hash", digest),
+                ("source", str(feed_path)),
+                ("built_at", datetime.now().isoformat(timespec="seconds")),
+            ],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp, target)
+
+
+def _prune_old_versions(store_dir: Path, name: str, keep: Path) -> None:
+    others = [p for p in store_dir.glob(f"{name}-*.sqlite") if p != keep]
+    others.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+    for path in others[KEEP_VERSIONS - 1 :]:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+def _columns_tag(columns: Sequence[str]) -> str:
+    return hashlib.sha1("\x1f".join(columns).encode("utf-8")).hexdigest()[:8]
+
+
+def open_feed_store(
+    feed_path: Optional[Path] = None,
+    columns: Sequence[str] = MAIN_FEED_COLUMNS,
+    store_dir: Path = STORE_DIR,
+) -> FeedStore:
+    """Ava feedi versiooni vahemälu; ehitab selle, kui antud räsiga faili veel pole."""
+    path = resolve_main_feed(feed_path)
+    digest = feed_hash(path)
+    name = feed_name(path)
+    target = store_dir / f"{name}-{digest[:16]}-{_columns_tag(columns)}.sqlite"
+    if not target.exists():
+        _build_store(path, target, digest, columns)
+        _prune_old_versions(store_dir, name, target)
+    return FeedStore(target)
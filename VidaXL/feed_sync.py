@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""VidaXL feedide allalaadimine manifesti ja tingimuslike päringutega.
+
+Manifest (``data/feeds/feed_manifest.json``) hoiab iga feedi URL-i kohta
+serveri ``ETag``/``Last-Modified`` päiseid, faili suurust ja SHA-256 räsi.
+Järgmisel allalaadimisel saadetakse ``If-None-Match``/``If-Modified-Since``
+päised; kui server vastab 304 (või sisu räsi ei muutunud), märgitakse feed
+olekuga ``unchanged`` ja hilisemad sammud saavad töö vahele jätta.
+
+Allalaadimine käib ajutisse ``<nimi>.part`` faili. Katkenud ühenduse korral
+jätkatakse HTTP ``Range`` päringuga (``If-Range`` kaitseb vahepeal muutunud
+feedi eest) ning alles pärast suuruse ja ZIP-i CRC kontrolli nimetatakse fail
+atomaarselt ``data/feeds/`` alla ümber. Pooleli fail ei jõua seega kunagi
+2. sammu ega stock runneri kätte.
+
+Päringud saadavad ``Accept-Encoding: identity``: ``Content-Length`` ja
+``Range`` nihked kehtivad siis kettale kirjutatud baitidele. Kui server
+ikkagi kodeeritud (nt gzip) vastuse saadab, jäetakse suuruse kontroll ja
+jätkamine vahele ning katkenud allalaadimine alustatakse otsast.
+
+Kasutavad ``1_Samm_alg_andmete_kogumine.py`` ja ``DropXL_stock_loop_runner.py``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from zipfile import BadZipFile, ZipFile
+
+import requests
+
+ROOT = Path(__file__).resolve().parent
+FEEDS_DIR = ROOT / "data" / "feeds"
+MANIFEST_PATH = FEEDS_DIR / "feed_manifest.json"
+
+CHUNK_SIZE = 1024 * 1024
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF_SECONDS = 2.0
+
+STATUS_DOWNLOADED = "downloaded"
+STATUS_UNCHANGED = "unchanged"
+
+
+class FeedVerificationError(RuntimeError):
+    """Allalaetud feed ei läbinud suuruse või CRC kontrolli."""
+
+
+def load_manifest(path: Path = MANIFEST_PATH) -> Dict[str, Dict[str, Any]]:
+    if not path.exists():
+        return {}
+    try:
+        with path.open("r", encoding="utf-8") as fh:
+            data = json.load(fh)
+    except Exception:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {str(k): v for k, v in data.items() if isinstance(v, dict)}
+
+
+def save_manifest(manifest: Dict[str, Dict[str, Any]], path: Path = MANIFEST_PATH) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with tmp.open("w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, ensure_ascii=False, indent=2)
+    tmp.replace(path)
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def feed_entry(url: str, manifest_path: Path = MANIFEST_PATH) -> Optional[Dict[str, Any]]:
+    """Tagasta manifesti kirje antud URL-i kohta (või None)."""
+    return load_manifest(manifest_path).get(url)
+
+
+def _local_copy_matches(entry: Dict[str, Any], target: Path) -> bool:
+    if not target.exists():
+        return False
+    try:
+        return int(entry.get("size") or -1) == target.stat().st_size
+    except Exception:
+        return False
+
+
+def _content_encoded(resp: requests.Response) -> bool:
+    return (resp.headers.get("Content-Encoding") or "identity").strip().lower() != "identity"
+
+
+def _if_range_validator(part_meta: Dict[str, Any]) -> str:
+    """Tugev ETag või Last-Modified; nõrka (``W/``) ETagi If-Range ei luba."""
+    etag = str(part_meta.get("etag") or "").strip()
+    if etag and not etag.startswith("W/"):
+        return etag
+    return str(part_meta.get("last_modified") or "").strip()
+
+
+def _conditional_headers(entry: Optional[Dict[str, Any]], target: Path) -> Dict[str, str]:
+    headers: Dict[str, str] = {}
+    if not entry or not _local_copy_matches(entry, target):
+        return headers
+    etag = str(entry.get("etag") or "").strip()
+    last_modified = str(entry.get("last_modified") or "").strip()
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return headers
+
+
+def _part_paths(target: Path) -> Tuple[Path, Path]:
+    return target.with_name(target.name + ".part"), target.with_name(target.name + ".part.json")
+
+
+def _load_part_meta(meta_path: Path) -> Dict[str, Any]:
+    if not meta_path.exists():
+        return {}
+    try:
+        data = json.loads(meta_path.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _discard_partial(part_path: Path, meta_path: Path) -> None:
+    for path in (part_path, meta_path):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _total_from_response(resp: requests.Response, offset: int) -> Optional[int]:
+    content_range = resp.headers.get("Content-Range") or ""
+    match = re.match(r"bytes\s+\d+-\d+/(\d+)", content_range)
+    if match:
+        return int(match.group(1))
+    length = resp.headers.get("Content-Length")
+    if length and length.isdigit():
+        return offset + int(length)
+    return None
+
+
+def verify_feed_file(path: Path, expected_size: Optional[int]) -> None:
+    """Kontrolli faili suurust ja ZIP-i puhul iga liikme CRC-d."""
+    size = path.stat().st_size
+    if expected_size is not None and size != expected_size:
+        raise FeedVerificationError(f"{path.name}: suurus {size} != oodatud {expected_size}")
+    if path.name.lower().endswith(".zip") or path.name.lower().endswith(".zip.part"):
+        try:
+            with ZipFile(path, "r") as zf:
+                bad_member = zf.testzip()
+        except BadZipFile as exc:
+            raise FeedVerificationError(f"{path.name}: vigane ZIP ({exc})") from exc
+        if bad_member:
+            raise FeedVerificationError(f"{path.name}: CRC viga liikmes {bad_member}")
+
+
+def download_feed(
+    url: str,
+    target: Path,
+    manifest_path: Path = MANIFEST_PATH,
+    force: bool = False,
+    timeout: int = 60,
+    max_attempts: int = MAX_ATTEMPTS,
+) -> Dict[str, Any]:
+    """Lae feed alla ainult siis, kui see serveris muutunud on.
+
+    Katkenud allalaadimist jätkatakse Range päringuga kuni ``max_attempts``
+    korda. Tagastab kirje väljadega ``status`` (``downloaded``/``unchanged``),
+    ``path``, ``size``, ``sha256``, ``etag``, ``last_modified`` ja ``resumed``
+    (mitu korda katkenud allalaadimist jätkati).
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(manifest_path)
+    previous = manifest.get(url)
+    part_path, meta_path = _part_paths(target)
+    part_meta = _load_part_meta(meta_path)
+    if part_meta.get("url") != url or part_meta.get("encoded") or not part_path.exists():
+        _discard_partial(part_path, meta_path)
+        part_meta = {}
+
+    resumed = 0
+    attempt = 0
+    while True:
+        attempt += 1
+        offset = part_path.stat().st_size if part_meta and part_path.exists() else 0
+        headers: Dict[str, str] = {}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            validator = _if_range_validator(part_meta)
+            if validator:
+                headers["If-Range"] = validator
+        elif not force:
+            headers = _conditional_headers(previous, target)
+        headers["Accept-Encoding"] = "identity"
+        try:
+            with requests.get(url, stream=True, timeout=timeout, headers=headers) as resp:
+                if resp.status_code == 304 and previous:
+                    _discard_partial(part_path, meta_path)
+                    entry = dict(previous)
+                    entry["checked_at"] = datetime.now().isoformat(timespec="seconds")
+                    manifest[url] = entry
+                    save_manifest(manifest, manifest_path)
+                    return {**entry, "status": STATUS_UNCHANGED, "path": str(target), "resumed": 0}
+                if resp.status_code == 416:
+                    _discard_partial(part_path, meta_path)
+                    part_meta = {}
+                    if attempt >= max_attempts:
+                        resp.raise_for_status()
+                    continue
+                resp.raise_for_status()
+                if resp.status_code == 206 and offset:
+                    mode = "ab"
+                    resumed += 1
+                else:
+                    mode = "wb"
+                    offset = 0
+                    encoded = _content_encoded(resp)
+                    part_meta = {
+                        "url": url,
+                        "etag": resp.headers.get("ETag") or "",
+                        "last_modified": resp.headers.get("Last-Modified") or "",
+                        # Kodeeritud vastuse pikkus ei vasta dekodeeritud baitidele.
+                        "total": None if encoded else _total_from_response(resp, 0),
+                        "encoded": encoded,
+                    }
+                    meta_path.write_text(json.dumps(part_meta, ensure_ascii=False), encoding="utf-8")
+                if part_meta.get("total") is None and not part_meta.get("encoded"):
+                    part_meta["total"] = _total_from_response(resp, offset)
+                with part_path.open(mode) as fh:
+                    for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+                        if chunk:
+                            fh.write(chunk)
+            total = part_meta.get("total")
+            if total is not None and part_path.stat().st_size < int(total):
+                raise requests.exceptions.ChunkedEncodingError(
+                    f"ühendus katkes: {part_path.stat().st_size}/{total} baiti"
+                )
+            break
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.ChunkedEncodingError):
+            if attempt >= max_attempts:
+                raise
+            if part_meta.get("encoded"):
+                # Dekodeeritud baitide pealt Range nihet arvutada ei saa.
+                _discard_partial(part_path, meta_path)
+                part_meta = {}
+            time.sleep(RETRY_BACKOFF_SECONDS * attempt)
+
+    total = part_meta.get("total")
+    try:
+        verify_feed_file(part_path, int(total) if total is not None else None)
+    except FeedVerificationError:
+        _discard_partial(part_path, meta_path)
+        raise
+
+    sha256 = file_sha256(part_path)
+    size = part_path.stat().st_size
+    os.replace(part_path, target)
+    _discard_partial(part_path, meta_path)
+
+    now = datetime.now().isoformat(timespec="seconds")
+    unchanged = bool(previous) and not force and previous.get("sha256") == sha256
+    entry = {
+        "url": url,
+        "path": str(target),
+        "etag": part_meta.get("etag") or "",
+        "last_modified": part_meta.get("last_modified") or "",
+        "size": size,
+        "sha256": sha256,
+        "checked_at": now,
+        "changed_at": (previous or {}).get("changed_at", now) if unchanged else now,
+    }
+    manifest[url] = entry
+    save_manifest(manifest, manifest_path)
+    return {**entry, "status": STATUS_UNCHANGED if unchanged else STATUS_DOWNLOADED, "resumed": resumed}
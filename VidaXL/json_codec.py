@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""JSON serialiseerimine töövoo artefaktidele.
+
+Kaks kuju:
+
+- kompaktne (``pretty=False``) – masinloetavad suured artefaktid (2. sammu
+  väljund, tõlgete grupeeritud fail, päevikud): ilma taande ja tühikuteta;
+- loetav (``pretty=True``) – inimese vaadatavad/git-is hoitavad failid
+  (``category_translation.json``, ``data/category_catalog.json``, debug
+  jäljed): sama väljund mis ``json.dumps(..., ensure_ascii=False, indent=2)``.
+
+Kui ``orjson`` on paigaldatud, kasutatakse seda (mitu korda kiirem); muidu
+standardset ``json`` moodulit. Väljund on mõlemal juhul sama (UTF-8, mitte-ASCII
+märgid escape'imata); erineda võib vaid ujukomaarvu eksponendi kuju (``1e16``
+vs ``1e+16``). Kui ``orjson`` väärtust ei toeta (nt üle 64-bitine täisarv),
+tehakse sama kutse ``json`` mooduliga.
+
+Suurte artefaktide kuju valib ``pretty_default()``: vaikimisi kompaktne,
+keskkonnamuutujaga ``DROPXL_JSON_PRETTY=1`` loetav.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - valikuline sõltuvus
+    orjson = None
+
+PRETTY_ENV = "DROPXL_JSON_PRETTY"
+
+_ORJSON_COMPACT = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+_ORJSON_PRETTY = (orjson.OPT_NON_STR_KEYS | orjson.OPT_INDENT_2) if orjson is not None else 0
+
+
+def backend() -> str:
+    return "orjson" if orjson is not None else "json"
+
+
+def pretty_default() -> bool:
+    """Kas suured artefaktid kirjutada loetavalt (``DROPXL_JSON_PRETTY``)."""
+    return os.getenv(PRETTY_ENV, "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _stdlib_dumps(obj: Any, pretty: bool) -> str:
+    if pretty:
+        return json.dumps(obj, ensure_ascii=False, indent=2)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def dumps_bytes(obj: Any, pretty: bool = False) -> bytes:
+    """Serialiseeri UTF-8 baitideks."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=_ORJSON_PRETTY if pretty else _ORJSON_COMPACT)
+        except TypeError:
+            pass
+    return _stdlib_dumps(obj, pretty).encode("utf-8")
+
+
+def dumps(obj: Any, pretty: bool = False) -> str:
+    if orjson is not None:
+        return dumps_bytes(obj, pretty).decode("utf-8")
+    return _stdlib_dumps(obj, pretty)
+
+
+def write_json(path: Path, obj: Any, pretty: bool = True, fsync: bool = False) -> None:
+    """Kirjuta JSON fail atomaarselt (ajutine fail + ``os.replace``).
+
+    Ajutise faili nimes on protsessi ja lõime id, et sama faili samaaegsed
+    kirjutajad (nt vastuste vahemälu sama võti) ei kirjutaks ühte faili.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with tmp.open("wb") as fh:
+            fh.write(dumps_bytes(obj, pretty))
+            if fsync:
+                fh.flush()
+                os.fsync(fh.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            tmp.unlink()
+        except FileNotFoundError:
+            pass
+        raise
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""Lähiduplikaatide (värvi-/suurusvariandid) klasterdamine MinHash/LSH abil.
+
+VidaXL-i feedis on palju SKU-sid, mis erinevad ainult värvi või mõõdu poolest
+ning mille nimi ja ``HTML_description`` on peaaegu samad. 4. samm genereerib
+igast klastrist täismahus ainult esindaja; ülejäänud liikmed saavad sisu
+esindaja omast (``substitute_variant``) või odava kohandamiskutsega.
+
+- ``product_text`` / ``shingles`` – nimi + HTML-ita kirjeldus, väiketähtedes
+  sõnade 3-grammid.
+- ``MinHasher`` – ``NUM_PERM`` permutatsiooniga MinHash signatuur
+  (``numpy`` olemasolul vektoriseeritud, muidu puhas Python).
+- ``cluster_signatures`` – LSH (``BANDS`` riba) kandidaadipaarid, mille
+  hinnanguline Jaccardi sarnasus on vähemalt ``threshold``; klastrid
+  ühendatakse union-find'iga. Esindaja on klastri esimene toode sisendi järjekorras.
+- ``substitute_variant`` – deterministlik asendus, kui variandi nimi erineb
+  esindaja omast ainult keelest sõltumatute tokenite poolest (arvud, mõõdud)
+  ja samad asendused esindaja HTML-ita kirjelduses annavad täpselt variandi
+  kirjelduse (muidu võiks variant pärida esindaja kaalu, koormuse vms).
+"""
+
+from __future__ import annotations
+
+import html
+import re
+import zlib
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:  # pragma: no cover - valikuline sõltuvus
+    np = None
+
+NUM_PERM = 64
+BANDS = 16
+SHINGLE_SIZE = 3
+DEFAULT_THRESHOLD = 0.8
+MAX_SUBSTITUTIONS = 3
+_PRIME = (1 << 31) - 1
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_IMG_SRC_RE = re.compile(r"<img\b[^>]*\bsrc\s*=\s*[\"']([^\"']+)[\"']", re.IGNORECASE)
+# Keelest sõltumatu token: arv koos valikulise ühikuga (nt 100, 2,5, 60cm, 20L, 3tk).
+_LANGUAGE_NEUTRAL_RE = re.compile(r"\d+(?:[.,]\d+)?(?:mm|cm|m|ml|l|kg|g|w|v|tk|pcs)?", re.IGNORECASE)
+_EDGE_PUNCT = ",;:()[]\"'"
+
+
+def strip_html(value: str) -> str:
+    return html.unescape(_TAG_RE.sub(" ", value or ""))
+
+
+def plain_text(value: str) -> str:
+    """HTML-ita ja tühikute järgi normaliseeritud kirjeldus võrdlemiseks."""
+    return " ".join(strip_html(value).split())
+
+
+def image_sources(description_html: str) -> Tuple[str, ...]:
+    return tuple(_IMG_SRC_RE.findall(description_html or ""))
+
+
+def product_text(product: Mapping[str, Any]) -> str:
+    return f"{product.get('name') or ''} {strip_html(str(product.get('description') or ''))}"
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> List[int]:
+    """Sõnade ``size``-grammide 32-bitised räsid (unikaalsed)."""
+    words = _WORD_RE.findall((text or "").lower())
+    if len(words) < size:
+        grams = [" ".join(words)] if words else []
+    else:
+        grams = [" ".join(words[pos:pos + size]) for pos in range(len(words) - size + 1)]
+    return list({zlib.crc32(gram.encode("utf-8")) % _PRIME for gram in grams})
+
+
+class MinHasher:
+    """MinHash signatuur ``(a * x + b) mod p`` permutatsioonidega (fikseeritud seeme)."""
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1) -> None:
+        self.num_perm = num_perm
+        params = []
+        state = seed
+        for _ in range(num_perm * 2):
+            # LCG: deterministlik ja sõltumatu Pythoni random-moodulist.
+            state = (state * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+            params.append(state % (_PRIME - 1) + 1)
+        self.a = params[:num_perm]
+        self.b = params[num_perm:]
+        if np is not None:
+            self._a = np.array(self.a, dtype=np.uint64)[:, None]
+            self._b = np.array(self.b, dtype=np.uint64)[:, None]
+
+    def signature(self, hashes: Sequence[int]) -> Tuple[int, ...]:
+        if not hashes:
+            return tuple([_PRIME] * self.num_perm)
+        if np is not None:
+            values = np.array(hashes, dtype=np.uint64)[None, :]
+            return tuple(int(v) for v in ((self._a * values + self._b) % _PRIME).min(axis=1))
+        return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in zip(self.a, self.b))
+
+
+def similarity(sig_a: Sequence[int], sig_b: Sequence[int]) -> float:
+    """Hinnanguline Jaccardi sarnasus (ühtivate signatuurikohtade osakaal)."""
+    if not sig_a:
+        return 0.0
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+def cluster_signatures(
+    signatures: Sequence[Tuple[str, Tuple[int, ...]]],
+    threshold: float = DEFAULT_THRESHOLD,
+    bands: int = BANDS,
+) -> List[List[str]]:
+    """Vähemalt kahe liikmega klastrid (esindaja esimesena), sisendi järjekorras."""
+    count = len(signatures)
+    parent = list(range(count))
+
+    def find(pos: int) -> int:
+        while parent[pos] != pos:
+            parent[pos] = parent[parent[pos]]
+            pos = parent[pos]
+        return pos
+
+    if count:
+        rows = max(1, len(signatures[0][1]) // bands)
+        for band in range(bands):
+            buckets: Dict[Tuple[int, ...], List[int]] = {}
+            for pos, (_, sig) in enumerate(signatures):
+                buckets.setdefault(tuple(sig[band * rows:(band + 1) * rows]), []).append(pos)
+            for members in buckets.values():
+                if len(members) < 2:
+                    continue
+                first = members[0]
+                for other in members[1:]:
+                    root_a, root_b = find(first), find(other)
+                    if root_a == root_b:
+                        continue
+                    if similarity(signatures[first][1], signatures[other][1]) >= threshold:
+                        # Väiksem indeks juureks, et esindaja oleks sisendis esimene.
+                        parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    groups: Dict[int, List[str]] = {}
+    for pos, (key, _) in enumerate(signatures):
+        groups.setdefault(find(pos), []).append(key)
+    return [members for root, members in sorted(groups.items()) if len(members) > 1]
+
+
+def size_histogram(clusters: Iterable[Sequence[str]]) -> str:
+    """``"2×14, 3×5"`` – klastri suurus × klastrite arv."""
+    sizes = Counter(len(members) for members in clusters)
+    return ", ".join(f"{size}×{num}" for size, num in sorted(sizes.items())) or "-"
+
+
+def _token(value: str) -> str:
+    return value.strip(_EDGE_PUNCT)
+
+
+def name_differences(rep_name: str, member_name: str) -> Optional[List[Tuple[str, str]]]:
+    """Erinevad tokenid (esindaja -> variant), kui nimed erinevad vaid samadel positsioonidel."""
+    rep_tokens = [_token(t) for t in (rep_name or "").split()]
+    member_tokens = [_token(t) for t in (member_name or "").split()]
+    if len(rep_tokens) != len(member_tokens):
+        return None
+    return [(a, b) for a, b in zip(rep_tokens, member_tokens) if a != b]
+
+
+def _replacement_pattern(tokens: Iterable[str]) -> "re.Pattern[str]":
+    return re.compile(
+        r"(?<![\w.,])(" + "|".join(re.escape(token) for token in tokens) + r")(?![\w]|[.,]\d)",
+        re.IGNORECASE,
+    )
+
+
+def substitute_variant(
+    rep_name: str,
+    member_name: str,
+    rep_output: Mapping[str, str],
+    rep_description: str,
+    member_description: str,
+    title_key: str = "translated_title",
+) -> Optional[Dict[str, str]]:
+    """Esindaja valmis sisu variandile deterministliku asendusega; ohtlikul juhul None.
+
+    Ohutu, kui: nimed erinevad 1..``MAX_SUBSTITUTIONS`` tokeni poolest, kõik
+    erinevad tokenid on keelest sõltumatud (arvud/mõõdud), iga esindaja token
+    esineb esindaja nimes ühe korra, väljundi pealkirjas vähemalt korra ja
+    igas väljundväljas ülimalt korra ning samad asendused teevad esindaja
+    algsest kirjeldusest (``plain_text``) täpselt variandi algse kirjelduse.
+    """
+    diffs = name_differences(rep_name, member_name)
+    if not diffs or len(diffs) > MAX_SUBSTITUTIONS:
+        return None
+    rep_tokens = [_token(t) for t in rep_name.split()]
+    replacements: Dict[str, str] = {}
+    for old, new in diffs:
+        if not (_LANGUAGE_NEUTRAL_RE.fullmatch(old) and _LANGUAGE_NEUTRAL_RE.fullmatch(new)):
+            return None
+        if rep_tokens.count(old) != 1:
+            return None
+        replacements[old.lower()] = new
+    singles = [_replacement_pattern([old]) for old in replacements]
+    title = str(rep_output.get(title_key) or "")
+    if any(not pattern.search(title) for pattern in singles):
+        return None
+    # Kõik asendused ühe läbimisega, et "100 x 140" -> "140 x 100" ei asendaks juba asendatut.
+    combined = _replacement_pattern(replacements)
+    # Kirjelduse muud erinevused (kaal, koormus, lisamõõdud) pole nimes näha.
+    source = combined.sub(lambda m: replacements[m.group(1).lower()], plain_text(rep_description))
+    if source != plain_text(member_description):
+        return None
+    out: Dict[str, str] = {}
+    for key, value in rep_output.items():
+        text = str(value or "")
+        if any(len(pattern.findall(text)) > 1 for pattern in singles):
+            return None
+        out[key] = combined.sub(lambda m: replacements[m.group(1).lower()], text)
+    return out
+
+
+def _attribute_map(attributes: Any) -> Dict[str, str]:
+    values: Dict[str, str] = {}
+    for attr in attributes or []:
+        if not isinstance(attr, dict):
+            continue
+        name = str(attr.get("name") or "").strip()
+        if not name:
+            continue
+        # 2. samm: ``values``; WooCommerce kuju: ``options`` / ``value``.
+        listed = attr.get("values")
+        if not isinstance(listed, list):
+            listed = attr.get("options")
+        if isinstance(listed, list):
+            values[name] = ", ".join(str(v) for v in listed)
+        else:
+            values[name] = str(attr.get("value") or "")
+    return values
+
+
+def attribute_differences(rep_attributes: Any, member_attributes: Any) -> Dict[str, Dict[str, str]]:
+    """Atribuudid, mille väärtus esindajal ja variandil erineb (``{"esindaja": .., "variant": ..}``)."""
+    rep = _attribute_map(rep_attributes)
+    member = _attribute_map(member_attributes)
+    return {
+        name: {"esindaja": rep.get(name, ""), "variant": member.get(name, "")}
+        for name in list(rep) + [n for n in member if n not in rep]
+        if rep.get(name, "") != member.get(name, "")
+    }
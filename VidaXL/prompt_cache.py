@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Teenusepakkuja prompti vahemälu (prefix caching) jälgimine 4. sammus.
+
+OpenAI kasutab päringu algust (tööriistad, ``instructions``, vastuse skeem)
+uuesti, kui see on eelmise päringuga baiditi sama; vahemälust loetud
+sisendtokenid on odavamad ja kiiremad. Selleks peab iga sammu prefiks olema
+kõigi toodete puhul identne ja tootepõhine info olema ainult ``input``-is.
+
+- ``PrefixGuard`` – jätab meelde iga sammu esimese prefiksi räsi (mudel,
+  ``instructions``, ``tools``, ``text``) ja tõstab ``PromptPrefixDrift``,
+  kui mõne järgmise toote prefiks erineb.
+- ``PromptCacheStats`` – kogub sammu kaupa sisendtokenid ja vahemälust loetud
+  tokenid (``usage.input_tokens_details.cached_tokens``) ning annab
+  tabamuste osakaalu ja säästetud sisendtokenid.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from typing import Any, Dict, List, Mapping, Tuple
+
+PREFIX_FIELDS = ("model", "instructions", "tools", "text")
+
+
+class PromptPrefixDrift(RuntimeError):
+    """Sammu prompti prefiks erineb varasemate toodete omast."""
+
+
+def prefix_hash(kwargs: Mapping[str, Any]) -> str:
+    fields = {name: kwargs.get(name) for name in PREFIX_FIELDS if kwargs.get(name) is not None}
+    payload = json.dumps(fields, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PrefixGuard:
+    """Kontrollib, et sama sammu prefiks ei muutu toodete vahel (lõimekindel)."""
+
+    def __init__(self) -> None:
+        self._seen: Dict[str, Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def check(self, step_key: str, kwargs: Mapping[str, Any], sku: str = "") -> str:
+        digest = prefix_hash(kwargs)
+        with self._lock:
+            first = self._seen.setdefault(step_key, (digest, sku))
+        if first[0] != digest:
+            raise PromptPrefixDrift(
+                f"{step_key}: prompti prefiks erineb ({first[1] or '-'} {first[0][:12]} vs {sku or '-'} {digest[:12]})"
+            )
+        return digest
+
+
+def _get(obj: Any, key: str) -> Any:
+    if obj is None:
+        return None
+    if isinstance(obj, Mapping):
+        return obj.get(key)
+    return getattr(obj, key, None)
+
+
+def _int(value: Any) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def cached_input_tokens(usage: Any) -> int:
+    """Vahemälust loetud sisendtokenid (``input_tokens_details.cached_tokens`` või vana ``cached_tokens``)."""
+    details = _get(usage, "input_tokens_details") or _get(usage, "prompt_tokens_details")
+    return _int(_get(details, "cached_tokens")) or _int(_get(usage, "cached_tokens"))
+
+
+class PromptCacheStats:
+    """Sammu kaupa: kutsed, sisendtokenid ja vahemälust loetud sisendtokenid."""
+
+    def __init__(self) -> None:
+        self.steps: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, step_key: str, response: Any) -> None:
+        usage = _get(response, "usage")
+        if not usage:
+            return
+        input_tokens = _int(_get(usage, "input_tokens"))
+        cached = cached_input_tokens(usage)
+        with self._lock:
+            step = self.steps.setdefault(step_key, {"calls": 0, "input_tokens": 0, "cached_tokens": 0})
+            step["calls"] += 1
+            step["input_tokens"] += input_tokens
+            step["cached_tokens"] += cached
+
+    def report(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = sorted(self.steps.items())
+        for step_key, step in items:
+            ratio = step["cached_tokens"] / step["input_tokens"] if step["input_tokens"] else 0.0
+            lines.append(
+                f"{step_key}: kutseid {step['calls']}, sisendtokeneid {step['input_tokens']}, "
+                f"vahemälust {ratio:.0%} (säästetud sisendtokeneid {step['cached_tokens']})"
+            )
+        return lines
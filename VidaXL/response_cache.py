@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""Sisupõhine (content-addressed) vastuste vahemälu OpenAI ``responses.create`` kutsetele.
+
+Sama päring (``--only-sku`` kordusjooks, katkenud jooksu jätk, värvivariantide
+identne kirjeldus) saadetakse muidu uuesti. Võti on SHA-256 päringu sisust:
+mudel, ``instructions``, ``input``, ``text`` (vastuse skeem + verbosity),
+``reasoning``, ``tools`` ja ``previous_response_id``. Väärtus on vastuse keha
+JSON-ina failis ``<kaust>/<võtme 2 esimest märki>/<võti>.json``.
+
+- ``get()`` tagastab ``StoredResponse``-i (``id``, ``output_text``, ``usage``);
+  vahemälust tulnud vastuse ``usage`` on tühi, algne kulu on ``saved_usage``-is.
+- ``put()`` salvestab ainult lõpetatud (``status == "completed"``) tekstiga vastused.
+- Kui kausta maht ületab ``max_bytes``, kustutatakse vanimad (viimati kasutatud)
+  failid, kuni maht on alla 90% piirist. Tabamus uuendab faili muutmisaega.
+- ``read=False`` (``--no-cache``) jätab lugemise vahele, kuid uued vastused
+  salvestatakse (vahemälu värskendamiseks).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional
+
+from json_codec import write_json
+
+KEY_FIELDS = ("model", "instructions", "input", "text", "reasoning", "tools", "previous_response_id")
+EVICT_TARGET = 0.9
+
+
+class StoredResponse:
+    """Salvestatud vastuse keha ``responses.create`` tulemuse kujul (``id``, ``output_text``, ``usage``)."""
+
+    def __init__(self, body: Mapping[str, Any], from_cache: bool = False) -> None:
+        self.body = dict(body)
+        self.id = self.body.get("id")
+        self.status = self.body.get("status")
+        self.from_cache = from_cache
+        self.saved_usage = self.body.get("usage") or {}
+        self.usage = {} if from_cache else self.saved_usage
+
+    @property
+    def output_text(self) -> str:
+        if isinstance(self.body.get("output_text"), str):
+            return self.body["output_text"]
+        parts = []
+        for item in self.body.get("output") or []:
+            if not isinstance(item, dict) or item.get("type") != "message":
+                continue
+            for content in item.get("content") or []:
+                if isinstance(content, dict) and content.get("type") == "output_text":
+                    parts.append(str(content.get("text") or ""))
+        return "".join(parts)
+
+
+def cache_key(kwargs: Mapping[str, Any]) -> str:
+    fields = {name: kwargs.get(name) for name in KEY_FIELDS if kwargs.get(name) is not None}
+    payload = json.dumps(fields, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def response_body(response: Any) -> Optional[Dict[str, Any]]:
+    """SDK vastus või ``StoredResponse`` -> JSON-iks sobiv dict (muu -> None)."""
+    if isinstance(response, StoredResponse):
+        return dict(response.body)
+    dump = getattr(response, "model_dump", None)
+    if dump is None:
+        return None
+    try:
+        body = dump(mode="json")
+    except Exception:
+        return None
+    return body if isinstance(body, dict) else None
+
+
+class ResponseCache:
+    """Kettal hoitav vastuste vahemälu mahupõhise väljatõrjumisega (lõimekindel)."""
+
+    def __init__(self, root: Path, max_bytes: int, read: bool = True) -> None:
+        self.root = root
+        self.max_bytes = max(0, int(max_bytes))
+        self.read = read
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evicted = 0
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        if not self.read:
+            return None
+        path = self._path(key)
+        try:
+            with path.open("r", encoding="utf-8") as fh:
+                record = json.load(fh)
+            body = record.get("body") if isinstance(record, dict) else None
+        except (OSError, ValueError):
+            body = None
+        with self._lock:
+            if not isinstance(body, dict):
+                self.misses += 1
+                return None
+            self.hits += 1
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return StoredResponse(body, from_cache=True)
+
+    def put(self, key: str, response: Any, step: str = "") -> bool:
+        if not self.max_bytes:
+            return False
+        body = response_body(response)
+        if not body or body.get("status") not in (None, "completed"):
+            return False
+        if not StoredResponse(body).output_text:
+            return False
+        path = self._path(key)
+        write_json(path, {"step": step, "stored_at": int(time.time()), "body": body}, pretty=False)
+        try:
+            size = path.stat().st_size
+        except OSError:
+            return False
+        with self._lock:
+            self.stores += 1
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += size
+            if self._size > self.max_bytes:
+                self._evict()
+        return True
+
+    def _files(self):
+        if not self.root.exists():
+            return []
+        return [p for p in self.root.glob("??/*.json") if p.is_file()]
+
+    def _scan_size(self) -> int:
+        total = 0
+        for path in self._files():
+            try:
+                total += path.stat().st_size
+            except OSError:
+                pass
+        return total
+
+    def _evict(self) -> None:
+        entries = []
+        for path in self._files():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * EVICT_TARGET)
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            self.evicted += 1
+        self._size = total
+
+    def summary(self) -> str:
+        return f"tabamusi {self.hits}, möödalaske {self.misses}, salvestatud {self.stores}, välja tõrjutud {self.evicted}"
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+
+"""Abi-skript: kohalik Batch API stub 4. sammu partiitöö (``--batch``) proovimiseks.
+
+Toetab OpenAI kliendi kasutatavaid otspunkte:
+
+- ``POST /v1/files`` (multipart, ``purpose=batch``) ja ``GET /v1/files/<id>/content``;
+- ``POST /v1/batches`` ja ``GET /v1/batches/<id>``.
+
+Iga ``/v1/responses`` päringu kohta koostatakse vastus, mille ``output_text`` on
+päringu JSON-skeemi järgi täidetud JSON (stringiväljad ``[stub] <väli> (<sku>)``).
+Partii on ``in_progress`` olekus ``--delay`` sekundit; ``--fail-every N`` märgib
+iga N-nda päringu veaks (läheb veafaili).
+
+Kasutus:
+    python tools/batch_stub_server.py --port 8790 --delay 5
+    python 4_samm_CHATGPT_katsetus.py --batch --batch-base-url http://127.0.0.1:8790/v1 --batch-poll 2
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+FILES: Dict[str, Dict[str, Any]] = {}
+BATCHES: Dict[str, Dict[str, Any]] = {}
+LOCK = threading.Lock()
+OPTIONS = {"delay": 0.0, "fail_every": 0}
+
+
+def log(msg: str) -> None:
+    print(msg, flush=True)
+
+
+def _new_id(prefix: str, store: Dict[str, Any]) -> str:
+    return f"{prefix}_stub_{len(store) + 1}"
+
+
+def _file_object(file_id: str) -> Dict[str, Any]:
+    entry = FILES[file_id]
+    return {
+        "id": file_id,
+        "object": "file",
+        "bytes": len(entry["data"]),
+        "created_at": entry["created_at"],
+        "filename": entry["filename"],
+        "purpose": entry["purpose"],
+        "status": "processed",
+    }
+
+
+def _store_file(data: bytes, filename: str, purpose: str) -> str:
+    with LOCK:
+        file_id = _new_id("file", FILES)
+        FILES[file_id] = {"data": data, "filename": filename, "purpose": purpose, "created_at": int(time.time())}
+    return file_id
+
+
+def _fake_value(name: str, schema: Dict[str, Any], sku: str) -> Any:
+    kind = schema.get("type")
+    if kind == "string":
+        return f"[stub] {name} ({sku})"
+    if kind == "array":
+        return []
+    if kind == "object":
+        return _fake_object(schema, sku)
+    if kind in ("integer", "number"):
+        return 0
+    if kind == "boolean":
+        return False
+    return None
+
+
+def _fake_object(schema: Dict[str, Any], sku: str) -> Dict[str, Any]:
+    props = schema.get("properties") or {}
+    return {name: _fake_value(name, props.get(name) or {}, sku) for name in schema.get("required") or props}
+
+
+def _response_body(pos: int, request: Dict[str, Any]) -> Dict[str, Any]:
+    body = request.get("body") or {}
+    sku = str(request.get("custom_id") or "").split("::", 1)[0]
+    schema = (((body.get("text") or {}).get("format") or {}).get("schema")) or {}
+    text = json.dumps(_fake_object(schema, sku) if schema else {"text": f"[stub] {sku}"}, ensure_ascii=False)
+    return {
+        "id": f"resp_stub_{pos}",
+        "object": "response",
+        "status": "completed",
+        "model": body.get("model"),
+        "output": [
+            {
+                "type": "message",
+                "role": "assistant",
+                "content": [{"type": "output_text", "text": text}],
+            }
+        ],
+        "usage": {"input_tokens": len(json.dumps(body)) // 4, "output_tokens": len(text) // 4, "total_tokens": (len(json.dumps(body)) + len(text)) // 4},
+    }
+
+
+def _run_batch(batch_id: str) -> None:
+    batch = BATCHES[batch_id]
+    lines = FILES[batch["input_file_id"]]["data"].decode("utf-8").splitlines()
+    outputs: List[str] = []
+    errors: List[str] = []
+    for pos, line in enumerate((ln for ln in lines if ln.strip()), start=1):
+        request = json.loads(line)
+        cid = request.get("custom_id")
+        if OPTIONS["fail_every"] and pos % OPTIONS["fail_every"] == 0:
+            errors.append(json.dumps({
+                "id": f"batch_req_{pos}",
+                "custom_id": cid,
+                "response": {"status_code": 400, "body": {"error": {"message": "stub error", "type": "invalid_request_error"}}},
+                "error": None,
+            }))
+            continue
+        outputs.append(json.dumps({
+            "id": f"batch_req_{pos}",
+            "custom_id": cid,
+            "response": {"status_code": 200, "request_id": f"req_{pos}", "body": _response_body(pos, request)},
+            "error": None,
+        }, ensure_ascii=False))
+    time.sleep(OPTIONS["delay"])
+    with LOCK:
+        batch["request_counts"] = {"total": len(outputs) + len(errors), "completed": len(outputs), "failed": len(errors)}
+    output_id = _store_file(("\n".join(outputs) + "\n").encode("utf-8"), "batch_output.jsonl", "batch_output") if outputs else None
+    error_id = _store_file(("\n".join(errors) + "\n").encode("utf-8"), "batch_errors.jsonl", "batch_output") if errors else None
+    with LOCK:
+        batch.update({"status": "completed", "output_file_id": output_id, "error_file_id": error_id, "completed_at": int(time.time())})
+    log(f"✔ {batch_id}: valmis ({len(outputs)} vastust, {len(errors)} viga)")
+
+
+def _parse_multipart(content_type: str, body: bytes) -> Tuple[Optional[bytes], str, str]:
+    message = BytesParser(policy=HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body)
+    data: Optional[bytes] = None
+    filename = "upload.jsonl"
+    purpose = ""
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        if name == "file":
+            data = part.get_payload(decode=True)
+            filename = part.get_filename() or filename
+        elif name == "purpose":
+            purpose = (part.get_payload(decode=True) or b"").decode("utf-8").strip()
+    return data, filename, purpose
+
+
+class Handler(BaseHTTPRequestHandler):
+    def _send(self, status: int, payload: Any, raw: bool = False) -> None:
+        data = payload if raw else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream" if raw else "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def do_POST(self) -> None:  # noqa: N802
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path == "/v1/files":
+            data, filename, purpose = _parse_multipart(self.headers.get("Content-Type") or "", self._body())
+            if data is None:
+                self._send(400, {"error": {"message": "file puudub"}})
+                return
+            file_id = _store_file(data, filename, purpose or "batch")
+            log(f"✔ Fail {file_id}: {filename} ({len(data)} baiti)")
+            self._send(200, _file_object(file_id))
+            return
+        if path == "/v1/batches":
+            params = json.loads(self._body() or b"{}")
+            input_id = params.get("input_file_id")
+            if input_id not in FILES:
+                self._send(404, {"error": {"message": f"fail puudub: {input_id}"}})
+                return
+            with LOCK:
+                batch_id = _new_id("batch", BATCHES)
+                BATCHES[batch_id] = {
+                    "id": batch_id,
+                    "object": "batch",
+                    "endpoint": params.get("endpoint"),
+                    "input_file_id": input_id,
+                    "completion_window": params.get("completion_window"),
+                    "status": "in_progress",
+                    "created_at": int(time.time()),
+                    "output_file_id": None,
+                    "error_file_id": None,
+                    "request_counts": {"total": 0, "completed": 0, "failed": 0},
+                }
+            threading.Thread(target=_run_batch, args=(batch_id,), daemon=True).start()
+            log(f"↻ Partii {batch_id} loodud (sisend {input_id})")
+            self._send(200, BATCHES[batch_id])
+            return
+        self._send(404, {"error": {"message": f"tundmatu otspunkt: {path}"}})
+
+    def do_GET(self) -> None:  # noqa: N802
+        parts = [p for p in self.path.split("?", 1)[0].split("/") if p]
+        if parts[:2] == ["v1", "batches"] and len(parts) == 3 and parts[2] in BATCHES:
+            with LOCK:
+                self._send(200, dict(BATCHES[parts[2]]))
+            return
+        if parts[:2] == ["v1", "files"] and len(parts) == 4 and parts[3] == "content" and parts[2] in FILES:
+            self._send(200, FILES[parts[2]]["data"], raw=True)
+            return
+        if parts[:2] == ["v1", "files"] and len(parts) == 3 and parts[2] in FILES:
+            self._send(200, _file_object(parts[2]))
+            return
+        self._send(404, {"error": {"message": f"ei leitud: {self.path}"}})
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        return
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Kohalik Batch API stub 4. sammu partiitöö jaoks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--delay", type=float, default=0.0, help="Sekundid enne partii valmimist")
+    parser.add_argument("--fail-every", type=int, default=0, help="Iga N-s päring veaks (0 = ei ühtegi)")
+    args = parser.parse_args()
+
+    OPTIONS.update({"delay": max(0.0, args.delay), "fail_every": max(0, args.fail_every)})
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    log(f"Batch API stub: http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+"""Abi-skript: võrdle atribuutide eraldamise kiirust feedi näidisel.
+
+Võrreldakse 2. sammu varasemat ``_parse_properties``/``_add_attr`` teostust
+(regex iga rea ja iga nime/väärtuse kohta) ``AttributeExtractor``-iga
+(eelkompileeritud mustrid, tabelid ja internitud vahemälu). Näidis loetakse
+main feedi vahemälust (``feed_store.py``); tulemuste kokkulangevus
+kontrollitakse enne mõõtmist.
+
+Kasutus:
+    python tools/bench_attribute_extraction.py --rows 50000
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+import sys
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from attribute_extractor import FIELD_COLUMNS, AttributeExtractor  # noqa: E402
+from feed_store import open_feed_store  # noqa: E402
+
+LEGACY_VIDAXL_PATTERN = re.compile(r"\bvida\s*x[l]?\b", re.IGNORECASE)
+
+
+def log(msg: str) -> None:
+    print(msg)
+
+
+def _legacy_clean_vidaxl(text: str) -> str:
+    cleaned = LEGACY_VIDAXL_PATTERN.sub("", text)
+    cleaned = re.sub(r"\s{2,}", " ", cleaned)
+    return cleaned.strip()
+
+
+def _legacy_add_attr(attr_map: Dict[str, List[str]], name: str, value: str) -> None:
+    raw_name = name.strip()
+    raw_value = value.strip()
+    name_key = raw_name.lower().replace(" ", "_")
+    name_map = {
+        "size": "Suurus",
+        "parcel_or_pallet": "Pakkimise tüüp",
+    }
+    if name_key == "parcel_or_pallet":
+        val_key = raw_value.lower()
+        if val_key == "parcel":
+            raw_value = "pakk"
+        elif val_key == "pallet":
+            raw_value = "alus"
+    name = _legacy_clean_vidaxl(name_map.get(name_key, raw_name))
+    value = _legacy_clean_vidaxl(raw_value)
+    if value.lower() == "yes":
+        value = "Jah"
+    elif value.lower() == "no":
+        value = "Ei"
+    if not name or not value:
+        return
+    bucket = attr_map.setdefault(name, [])
+    if value not in bucket:
+        bucket.append(value)
+
+
+def legacy_parse_properties(row: Dict[str, str]) -> List[Dict[str, Any]]:
+    attr_map: Dict[str, List[str]] = {}
+    props = str(row.get("Properties") or "").strip()
+    if props:
+        for item in re.findall(r"<li>(.*?)</li>", props, flags=re.I | re.S):
+            clean = re.sub(r"<[^>]+>", "", item).strip()
+            if not clean:
+                continue
+            if ":" in clean:
+                key, val = clean.split(":", 1)
+                _legacy_add_attr(attr_map, key, val)
+            else:
+                _legacy_add_attr(attr_map, clean, "Yes")
+    for field in FIELD_COLUMNS:
+        value = str(row.get(field) or "").strip()
+        if value:
+            _legacy_add_attr(attr_map, field, value)
+    return [{"name": name, "values": values} for name, values in attr_map.items() if values]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Atribuutide eraldamise mikrovõrdlus")
+    parser.add_argument("--rows", type=int, default=20000, help="Mitu feedi rida näidisesse võtta")
+    args = parser.parse_args()
+
+    try:
+        with open_feed_store() as store:
+            rows = list(islice(store.iter_rows(("Properties",) + FIELD_COLUMNS), max(1, args.rows)))
+    except FileNotFoundError as exc:
+        log(f"⚠️ {exc}")
+        return 1
+    if not rows:
+        log("⚠️ Feed on tühi")
+        return 1
+
+    extractor = AttributeExtractor()
+    mismatches = [i for i, row in enumerate(rows) if legacy_parse_properties(row) != extractor.extract(row)]
+    if mismatches:
+        log(f"❌ Tulemused erinevad {len(mismatches)} real, nt reas {mismatches[0]}")
+        return 1
+
+    start = time.perf_counter()
+    for row in rows:
+        legacy_parse_properties(row)
+    legacy_s = time.perf_counter() - start
+
+    extractor = AttributeExtractor()
+    start = time.perf_counter()
+    for row in rows:
+        extractor.extract(row)
+    fast_s = time.perf_counter() - start
+
+    log(f"Ridu: {len(rows)} | vahemälu: {extractor.cache_stats()}")
+    log(f"enne:  {len(rows) / legacy_s:,.0f} rida/s ({legacy_s:.2f}s)")
+    log(f"pärast: {len(rows) / fast_s:,.0f} rida/s ({fast_s:.2f}s)")
+    if fast_s > 0:
+        log(f"kiirendus: {legacy_s / fast_s:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
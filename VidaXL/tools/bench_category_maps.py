@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+"""Abi-skript: võrdle kategooriate ümbermappimise kiirust.
+
+Võrreldakse varasemat lineaarset ``apply_maps_to_path`` teostust (sorteerib
+mapid igal kutsel ja proovib iga mapi järjest) kompileeritud
+``CategoryMapper``-iga (segmendipuu). Sisendiks on ``category_translation.json``
+võtmed ja väärtused ning ``data/category_catalog.json`` rajad; tulemuste
+kokkulangevus kontrollitakse enne mõõtmist.
+
+Kasutus:
+    python tools/bench_category_maps.py --repeat 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from category_change_runner import DEFAULT_MAPS, CategoryMapper, replace_prefix  # noqa: E402
+
+
+def log(msg: str) -> None:
+    print(msg)
+
+
+def legacy_apply_maps_to_path(path: str, maps: List[Tuple[str, str]]) -> str:
+    sorted_maps = sorted(maps, key=lambda m: len(m[0]), reverse=True)
+    updated = path
+    for old, new in sorted_maps:
+        updated = replace_prefix(updated, old, new)
+    return updated
+
+
+def load_sample_paths() -> List[str]:
+    paths: List[str] = []
+    translation_path = ROOT / "category_translation.json"
+    if translation_path.exists():
+        data = json.loads(translation_path.read_text(encoding="utf-8"))
+        if isinstance(data, dict):
+            paths.extend(str(k) for k in data)
+            paths.extend(str(v) for v in data.values() if v)
+    catalog_path = ROOT / "data" / "category_catalog.json"
+    if catalog_path.exists():
+        data = json.loads(catalog_path.read_text(encoding="utf-8"))
+        if isinstance(data, list):
+            paths.extend(str(item.get("path") or "") for item in data if isinstance(item, dict))
+    return [p for p in paths if p]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Kategooriate mappimise mikrovõrdlus")
+    parser.add_argument("--repeat", type=int, default=10, help="Mitu korda kogu valim läbi käia")
+    args = parser.parse_args()
+
+    paths = load_sample_paths()
+    if not paths:
+        log("⚠️ Näidisradu ei leitud (category_translation.json / data/category_catalog.json)")
+        return 1
+    mapper = CategoryMapper(DEFAULT_MAPS)
+
+    mismatches = [p for p in paths if legacy_apply_maps_to_path(p, DEFAULT_MAPS) != mapper.apply(p)]
+    if mismatches:
+        log(f"❌ Tulemused erinevad {len(mismatches)} rajal, nt: {mismatches[0]}")
+        return 1
+
+    repeat = max(1, args.repeat)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for p in paths:
+            legacy_apply_maps_to_path(p, DEFAULT_MAPS)
+    legacy_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for p in paths:
+            mapper.apply(p)
+    compiled_s = time.perf_counter() - start
+
+    calls = len(paths) * repeat
+    log(f"Radu: {len(paths)} | mappe: {len(DEFAULT_MAPS)} | kutseid: {calls}")
+    log(f"lineaarne:     {legacy_s:.3f}s ({legacy_s / calls * 1e6:.2f} µs/kutse)")
+    log(f"kompileeritud: {compiled_s:.3f}s ({compiled_s / calls * 1e6:.2f} µs/kutse)")
+    if compiled_s > 0:
+        log(f"kiirendus: {legacy_s / compiled_s:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+"""Abi-skript: võrdle grupeeritud tõlgete faili serialiseerimise kiirust ja mahtu.
+
+Loeb ``data/tõlgitud/products_translated_grouped.json`` (või ``--input``) ja
+mõõdab:
+
+- varasemat kirjutamist (``json.dumps(..., indent=2)`` kogu failile);
+- ``json_codec.dumps`` loetavat ja kompaktset kuju (``orjson``, kui olemas);
+- ``write_grouped_artifact`` kirjutamist (koos SKU indeksiga) mõlemas kujus.
+
+Failid kirjutatakse ajutisse kausta; sisendfaili ei muudeta.
+
+Kasutus:
+    python tools/bench_json_serialization.py --repeat 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from artifact_io import write_grouped_artifact  # noqa: E402
+from json_codec import backend, dumps_bytes  # noqa: E402
+
+DEFAULT_INPUT = ROOT / "data" / "tõlgitud" / "products_translated_grouped.json"
+
+
+def log(msg: str) -> None:
+    print(msg)
+
+
+def _best(repeat: int, fn: Callable[[], Any]) -> float:
+    best = float("inf")
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="JSON serialiseerimise võrdlus grupeeritud tõlgete failil")
+    parser.add_argument("--input", type=Path, default=DEFAULT_INPUT, help="Grupeeritud tõlgete JSON")
+    parser.add_argument("--repeat", type=int, default=3, help="Korduste arv (arvesse läheb kiireim)")
+    args = parser.parse_args()
+
+    if not args.input.exists():
+        log(f"⚠️ Faili ei leitud: {args.input}")
+        return 1
+    with args.input.open("r", encoding="utf-8") as fh:
+        grouped: Dict[str, Any] = json.load(fh)
+    if not isinstance(grouped, dict):
+        log("⚠️ Sisend pole grupeeritud (dict) fail")
+        return 1
+    products = sum(len(items) for items in grouped.values() if isinstance(items, list))
+
+    legacy_bytes = json.dumps(grouped, ensure_ascii=False, indent=2).encode("utf-8")
+    if dumps_bytes(grouped, pretty=True) != legacy_bytes:
+        log("❌ json_codec loetav kuju erineb json.dumps(indent=2) väljundist")
+        return 1
+
+    results = []
+    results.append(("json.dumps indent=2 (enne)", _best(args.repeat, lambda: json.dumps(grouped, ensure_ascii=False, indent=2).encode("utf-8")), len(legacy_bytes)))
+    results.append((f"json_codec loetav ({backend()})", _best(args.repeat, lambda: dumps_bytes(grouped, pretty=True)), len(legacy_bytes)))
+    compact = dumps_bytes(grouped)
+    results.append((f"json_codec kompaktne ({backend()})", _best(args.repeat, lambda: dumps_bytes(grouped)), len(compact)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, pretty in (("write_grouped_artifact loetav", True), ("write_grouped_artifact kompaktne", False)):
+            target = Path(tmp) / f"grouped_{int(pretty)}.json"
+            elapsed = _best(args.repeat, lambda: write_grouped_artifact(target, grouped, pretty=pretty))
+            with target.open("r", encoding="utf-8") as fh:
+                if json.load(fh) != grouped:
+                    log(f"❌ {label}: tagasi loetud andmed erinevad")
+                    return 1
+            results.append((label, elapsed, target.stat().st_size))
+
+    base_s = results[0][1]
+    log(f"Fail: {args.input} | tooteid: {products} | gruppe: {len(grouped)} | backend: {backend()}")
+    for label, elapsed, size in results:
+        speedup = f"{base_s / elapsed:.1f}x" if elapsed > 0 else "-"
+        log(f"{label:40s} {elapsed:7.3f}s  {size / 1e6:8.1f} MB  {speedup}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
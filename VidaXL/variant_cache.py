@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""Variatsioonide kraapimise püsiv vahemälu (üle jooksude).
+
+``data/variant_cache.json`` hoiab kolme tüüpi kirjeid:
+
+- ``pages``: toote link -> tootelehelt leitud swatch'id (atribuut, väärtus,
+  Product-Variation URL) ja lugemise aeg;
+- ``variations``: Product-Variation URL -> lahendatud SKU ja lugemise aeg;
+- ``families``: variatsioonide perekond (perekonna id -> atribuut -> väärtus
+  -> SKU-d). Mälus hoitakse lisaks indeksit SKU -> perekonna id, nii et kui
+  perekonna liige tuleb hiljem ette, ei ole tema tootelehte vaja enam lugeda.
+  Ainult ühe atribuudiga perekonnad: mitme atribuudi (nt värv × suurus)
+  korral on swatch'id iga lehe enda variandi suhtes ja teise liikme kaart
+  oleks vale, seega neid ei salvestata ega kasutata.
+
+Kirjed kehtivad ``ttl_hours`` tundi; aegunud kirjed loetakse möödalaskmiseks
+ja kirjutatakse uue vastusega üle. Tabamuste/möödalaskmiste arv on
+``stats()`` kaudu nähtav. Faili kirjutatakse atomaarselt iga
+``SAVE_EVERY`` muudatuse järel ja ``close()`` käigus.
+
+Kasutab ``variant_scraper.py`` (2. samm).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent
+CACHE_PATH = ROOT / "data" / "variant_cache.json"
+
+DEFAULT_TTL_HOURS = 168.0
+SAVE_EVERY = 200
+
+
+class VariantCache:
+    """Lingi- ja URL-põhine vahemälu; ``path=None`` hoiab kirjeid ainult mälus."""
+
+    def __init__(self, path: Optional[Path] = CACHE_PATH, ttl_hours: float = DEFAULT_TTL_HOURS) -> None:
+        self.path = path
+        self.ttl_seconds = max(0.0, float(ttl_hours)) * 3600
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = 0
+        self.pages: Dict[str, Dict[str, Any]] = {}
+        self.variations: Dict[str, Dict[str, Any]] = {}
+        self.families: Dict[str, Dict[str, Any]] = {}
+        self._family_by_sku: Dict[str, str] = {}
+        self.counters: Dict[str, Dict[str, int]] = {
+            "pages": {"hits": 0, "misses": 0, "expired": 0},
+            "variations": {"hits": 0, "misses": 0, "expired": 0},
+            "families": {"hits": 0, "misses": 0, "expired": 0},
+        }
+        self._load()
+
+    def __enter__(self) -> "VariantCache":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def _load(self) -> None:
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except Exception:
+            return
+        if not isinstance(data, dict):
+            return
+        now = time.time()
+        for name, target in (("pages", self.pages), ("variations", self.variations), ("families", self.families)):
+            entries = data.get(name)
+            if not isinstance(entries, dict):
+                continue
+            for key, entry in entries.items():
+                if isinstance(entry, dict) and not self._expired(entry, now):
+                    target[str(key)] = entry
+        # Uuemad perekonnad kirjutavad kattuvate SKU-de indeksi üle.
+        ordered = sorted(self.families.items(), key=lambda kv: float(kv[1].get("fetched_at") or 0))
+        for family_id, entry in ordered:
+            for sku in entry.get("members") or []:
+                self._family_by_sku[str(sku)] = family_id
+
+    def _expired(self, entry: Dict[str, Any], now: float) -> bool:
+        try:
+            fetched_at = float(entry.get("fetched_at") or 0)
+        except (TypeError, ValueError):
+            return True
+        return now - fetched_at > self.ttl_seconds
+
+    def _lookup(self, kind: str, table: Dict[str, Dict[str, Any]], key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = table.get(key)
+            counters = self.counters[kind]
+            if entry is None:
+                counters["misses"] += 1
+                return None
+            if self._expired(entry, time.time()):
+                counters["expired"] += 1
+                counters["misses"] += 1
+                return None
+            counters["hits"] += 1
+            return entry
+
+    def _store(self, table: Dict[str, Dict[str, Any]], key: str, entry: Dict[str, Any]) -> None:
+        entry["fetched_at"] = int(time.time())
+        with self._lock:
+            table[key] = entry
+            self._dirty += 1
+            flush = self._dirty >= SAVE_EVERY
+        if flush:
+            self.save()
+
+    def get_page(self, link: str) -> Optional[List[Dict[str, str]]]:
+        """Tootelehe swatch'id vahemälust (või None, kui puudub/aegunud)."""
+        entry = self._lookup("pages", self.pages, link)
+        if entry is None:
+            return None
+        swatches = entry.get("swatches")
+        return list(swatches) if isinstance(swatches, list) else None
+
+    def put_page(self, link: str, swatches: List[Dict[str, str]]) -> None:
+        self._store(self.pages, link, {"swatches": swatches})
+
+    def get_variation(self, url: str) -> Optional[str]:
+        entry = self._lookup("variations", self.variations, url)
+        if entry is None:
+            return None
+        return str(entry.get("sku") or "") or None
+
+    def put_variation(self, url: str, sku: str) -> None:
+        self._store(self.variations, url, {"sku": sku})
+
+    def get_family(self, sku: str) -> Optional[Dict[str, Dict[str, List[str]]]]:
+        """SKU perekonna variatsioonid (atribuut -> väärtus -> SKU-d) või None."""
+        with self._lock:
+            family_id = self._family_by_sku.get(sku)
+        if family_id is None:
+            with self._lock:
+                self.counters["families"]["misses"] += 1
+            return None
+        entry = self._lookup("families", self.families, family_id)
+        if entry is None:
+            return None
+        variant_skus = entry.get("variant_skus")
+        if not isinstance(variant_skus, dict) or len(variant_skus) != 1:
+            return None
+        return {attr: {val: list(skus) for val, skus in values.items()} for attr, values in variant_skus.items()}
+
+    def put_family(self, variant_skus: Dict[str, Dict[str, List[str]]], sku: str = "") -> str:
+        """Salvesta ühe atribuudiga perekond; kõik selle liikmed (ja ``sku``) viitavad sellele.
+
+        Mitme atribuudiga perekonda ei salvestata (tagastab ``""``).
+        """
+        if len(variant_skus) != 1:
+            return ""
+        members = sorted(
+            {s for values in variant_skus.values() for skus in values.values() for s in skus} | ({sku} if sku else set())
+        )
+        family_id = hashlib.sha1("\x1f".join(members).encode("utf-8")).hexdigest()[:16]
+        self._store(self.families, family_id, {"members": members, "variant_skus": variant_skus})
+        with self._lock:
+            for member in members:
+                self._family_by_sku[member] = family_id
+        return family_id
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with self._save_lock:
+            with self._lock:
+                payload = {
+                    "pages": dict(self.pages),
+                    "variations": dict(self.variations),
+                    "families": dict(self.families),
+                }
+                self._dirty = 0
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(payload, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+            tmp.replace(self.path)
+
+    def close(self) -> None:
+        if self._dirty:
+            self.save()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = {}
+            for kind, counters in self.counters.items():
+                lookups = counters["hits"] + counters["misses"]
+                out[kind] = {
+                    **counters,
+                    "hit_rate": round(counters["hits"] / lookups, 3) if lookups else 0.0,
+                }
+            out["families"]["count"] = len(self.families)
+            return out
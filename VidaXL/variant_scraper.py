@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""VidaXL tootelehtede variatsioonide kraapimine paralleelselt.
+
+Iga toote jaoks loetakse tooteleht, sellelt swatch'ide Product-Variation
+URL-id ja nende JSON vastustest variatsioonide SKU-d. Päringud käivad ühe
+``requests.Session`` kaudu (ühenduste kogum) mitmes lõimes, kuid iga hosti
+kohta kehtib token-bucket kiirusepiirang (``rate`` päringut sekundis,
+``burst`` korraga). Kui server vastab 429, poolitatakse selle hosti kiirus,
+arvestatakse ``Retry-After`` päisega ja kiirus taastub edukate päringutega
+järk-järgult seadistatud väärtuseni. Tootelehtede swatch'id ja variatsioonide
+SKU-d võetakse võimalusel ``VariantCache`` vahemälust (``variant_cache.py``);
+juba leitud ühe atribuudiga variatsioonide perekonna liikmete tootelehti ei
+loeta üldse.
+
+Kasutab ``2_Samm_tooteinfo_from_feed.py``:
+    with VariantScraper(rate=1.0, workers=8) as scraper:
+        future = scraper.submit(link)
+        ...
+        variant_skus = future.result()
+"""
+
+from __future__ import annotations
+
+import html
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from variant_cache import VariantCache
+
+DEFAULT_RATE = 1.0  # vana kraapija eelarve (~1 päring sekundis, 1,05 s paus lehe kohta)
+DEFAULT_BURST = 1
+DEFAULT_WORKERS = 8
+MIN_RATE = 0.1
+RATE_RECOVERY = 0.1  # mitu protsenti seadistatud kiirusest taastub iga eduka päringuga
+MAX_429_RETRIES = 3
+TIMEOUT = 30
+
+SWATCH_PATTERN = re.compile(r'aria-label="([^"]+)"[^>]*data-url="([^"]+)"')
+
+
+@dataclass
+class _Bucket:
+    rate: float
+    tokens: float
+    updated: float
+    paused_until: float = 0.0
+    throttled: int = 0
+
+
+class HostRateLimiter:
+    """Token-bucket kiirusepiirang hosti kohta, 429 vastustele kohanduv."""
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST) -> None:
+        self.rate = max(MIN_RATE, float(rate))
+        self.burst = max(1, int(burst))
+        self._buckets: Dict[str, _Bucket] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, host: str, now: float) -> _Bucket:
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = _Bucket(rate=self.rate, tokens=float(self.burst), updated=now)
+            self._buckets[host] = bucket
+        return bucket
+
+    def acquire(self, host: str) -> None:
+        """Oota, kuni hostile tohib järgmise päringu saata."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                bucket = self._bucket(host, now)
+                bucket.tokens = min(float(self.burst), bucket.tokens + (now - bucket.updated) * bucket.rate)
+                bucket.updated = now
+                if bucket.paused_until > now:
+                    wait = bucket.paused_until - now
+                elif bucket.tokens >= 1.0:
+                    bucket.tokens -= 1.0
+                    return
+                else:
+                    wait = (1.0 - bucket.tokens) / bucket.rate
+            time.sleep(wait)
+
+    def throttle(self, host: str, retry_after: Optional[float] = None) -> None:
+        """429 vastus: poolita hosti kiirus ja peata päringud ``Retry-After`` ajaks."""
+        with self._lock:
+            now = time.monotonic()
+            bucket = self._bucket(host, now)
+            bucket.rate = max(MIN_RATE, bucket.rate / 2)
+            bucket.tokens = 0.0
+            bucket.updated = now
+            pause = retry_after if retry_after is not None else 1.0 / bucket.rate
+            bucket.paused_until = max(bucket.paused_until, now + pause)
+            bucket.throttled += 1
+
+    def success(self, host: str) -> None:
+        with self._lock:
+            bucket = self._bucket(host, time.monotonic())
+            if bucket.rate < self.rate:
+                bucket.rate = min(self.rate, bucket.rate + self.rate * RATE_RECOVERY)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                host: {"rate": round(bucket.rate, 3), "throttled": bucket.throttled}
+                for host, bucket in self._buckets.items()
+            }
+
+
+def _retry_after(resp: requests.Response) -> Optional[float]:
+    value = (resp.headers.get("Retry-After") or "").strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def extract_swatch_urls(page_html: str) -> List[Dict[str, str]]:
+    results: List[Dict[str, str]] = []
+    for label, url in SWATCH_PATTERN.findall(page_html):
+        label = html.unescape(str(label).strip())
+        url = html.unescape(str(url).strip())
+        if not url or not label:
+            continue
+        if "Product-Variation" not in url:
+            continue
+        if " " in label:
+            attr_name, attr_value = label.split(" ", 1)
+        else:
+            attr_name, attr_value = "Variant", label
+        results.append({"attr_name": attr_name.strip(), "attr_value": attr_value.strip(), "url": url})
+    return results
+
+
+def _variation_sku(data: Any) -> str:
+    if isinstance(data, dict):
+        product = data.get("product")
+        if isinstance(product, dict):
+            return str(product.get("SKU") or "").strip()
+    return ""
+
+
+class VariantScraper:
+    """Variatsioonide SKU-de kraapija: lõimede kogum + hostipõhine piirang."""
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE,
+        burst: int = DEFAULT_BURST,
+        workers: int = DEFAULT_WORKERS,
+        timeout: int = TIMEOUT,
+        cache: Optional[VariantCache] = None,
+    ) -> None:
+        self.workers = max(1, int(workers))
+        self.timeout = timeout
+        self.limiter = HostRateLimiter(rate, burst)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="variants")
+        self.cache = cache if cache is not None else VariantCache(path=None)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def __enter__(self) -> "VariantScraper":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self.session.close()
+        self.cache.close()
+
+    def _count(self, error: bool = False) -> None:
+        with self._lock:
+            self.requests += 1
+            if error:
+                self.errors += 1
+
+    def _get(self, url: str) -> Optional[requests.Response]:
+        host = urlparse(url).netloc
+        for _ in range(MAX_429_RETRIES + 1):
+            self.limiter.acquire(host)
+            try:
+                resp = self.session.get(url, timeout=self.timeout)
+            except Exception:
+                self._count(error=True)
+                return None
+            if resp.status_code == 429:
+                self._count(error=True)
+                self.limiter.throttle(host, _retry_after(resp))
+                continue
+            if resp.status_code >= 400:
+                self._count(error=True)
+                return None
+            self._count()
+            self.limiter.success(host)
+            return resp
+        return None
+
+    def fetch_variation_sku(self, url: str) -> Optional[str]:
+        cached = self.cache.get_variation(url)
+        if cached:
+            return cached
+        resp = self._get(url)
+        if resp is None:
+            return None
+        try:
+            sku = _variation_sku(resp.json())
+        except Exception:
+            return None
+        if sku:
+            self.cache.put_variation(url, sku)
+        return sku or None
+
+    def variant_skus(self, link: str, sku: str = "") -> Dict[str, Dict[str, List[str]]]:
+        """Tootelehe variatsioonid: atribuut -> väärtus -> SKU-d.
+
+        Kui ``sku`` kuulub juba teadaolevasse ühe atribuudiga perekonda,
+        tagastatakse see perekond ilma tootelehte ja variatsioone uuesti
+        lugemata. Mitme atribuudi korral loetakse alati liikme enda leht.
+        """
+        if sku:
+            family = self.cache.get_family(sku)
+            if family is not None:
+                return family
+        if not link:
+            return {}
+        swatches = self.cache.get_page(link)
+        if swatches is None:
+            resp = self._get(link)
+            if resp is None:
+                return {}
+            swatches = extract_swatch_urls(resp.text)
+            self.cache.put_page(link, swatches)
+        variant_skus: Dict[str, Dict[str, List[str]]] = {}
+        for item in swatches:
+            variant_sku = self.fetch_variation_sku(item["url"])
+            if not variant_sku:
+                continue
+            bucket = variant_skus.setdefault(item["attr_name"], {})
+            skus = bucket.setdefault(item["attr_value"], [])
+            if variant_sku not in skus:
+                skus.append(variant_sku)
+        if variant_skus:
+            self.cache.put_family(variant_skus, sku)
+        return variant_skus
+
+    def submit(self, link: str, sku: str = "") -> "Future[Dict[str, Dict[str, List[str]]]]":
+        return self._executor.submit(self.variant_skus, link, sku)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "hosts": self.limiter.stats(),
+            "cache": self.cache.stats(),
+        }